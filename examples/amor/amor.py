@@ -1,13 +1,17 @@
+import json
 import numpy as np
-import pandas as pd
-from tqdm import trange
-from nexusutils.nexusbuilder import NexusBuilder
-from nexusjson.nexus_to_json import NexusToDictConverter, object_to_json_file
-import nexusformat.nexus as nexus
-from contextlib import contextmanager
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import h5py
 
+from examples.utils.mesh_topology import cell_winding_order, detector_faces, \
+    face_starts, grid_quad_winding_order, off_faces
+from examples.utils.off_file import write_off_file
+from examples.utils.transformations import apply_transform, \
+    compose_transforms, rotation_transform, translation_transform
+
+if TYPE_CHECKING:
+    from nexusutils.nexusbuilder import NexusBuilder
+
 """
 Generates example file with geometry for AMOR instrument with multiblade detector
 
@@ -72,75 +76,12 @@ def _wire_positions_radial_direction() -> np.ndarray:
     return np.linspace((WIRES_PER_BLADE - 1) * WIRE_PITCH_m, 0.0, WIRES_PER_BLADE)
 
 
-def rotate_around_x(angle_degrees: float, vertex: np.ndarray) -> np.ndarray:
-    angle = np.deg2rad(angle_degrees)
-    rotation_matrix = np.array(
-        [
-            [1, 0, 0],
-            [0, np.cos(angle), -np.sin(angle)],
-            [0, np.sin(angle), np.cos(angle)],
-        ]
-    )
-    return rotation_matrix.dot(vertex)
-
-
 def create_winding_order() -> np.ndarray:
-    vertices_per_pixel = 4
-    winding_order = np.zeros(
-        (WIRES_PER_BLADE * STRIPS_PER_BLADE, vertices_per_pixel), dtype=np.int32
-    )
-    for strip_number in range(STRIPS_PER_BLADE):
-        for wire_number in range(WIRES_PER_BLADE):
-            pixel_number = wire_number + strip_number * WIRES_PER_BLADE
-            winding_order[pixel_number][0] = (
-                strip_number * (WIRES_PER_BLADE + 1) + wire_number
-            )
-            winding_order[pixel_number][1] = (strip_number + 1) * (
-                WIRES_PER_BLADE + 1
-            ) + wire_number
-            winding_order[pixel_number][2] = (
-                (strip_number + 1) * (WIRES_PER_BLADE + 1) + wire_number + 1
-            )
-            winding_order[pixel_number][3] = (
-                strip_number * (WIRES_PER_BLADE + 1) + wire_number + 1
-            )
-    return winding_order
+    # Pixel number is wire_number + strip_number * WIRES_PER_BLADE
+    return grid_quad_winding_order(STRIPS_PER_BLADE, WIRES_PER_BLADE)
 
 
-def write_to_off_file(
-    filename: str,
-    vertices: np.ndarray,
-    faces: np.ndarray,
-):
-    """
-    Write mesh geometry to a file in the OFF format
-    https://en.wikipedia.org/wiki/OFF_(file_format)
-
-    Viewable in geomview, meshlab etc.
-    """
-    number_of_vertices = vertices.shape[0]
-    number_of_faces = faces.shape[0]
-    vertices_per_face = faces.shape[1]
-    with open(filename, "w") as f:
-        f.writelines(
-            (
-                "OFF\n",
-                f"# {INSTRUMENT_NAME}\n",
-                f"{number_of_vertices} {number_of_faces} 0\n",
-            )
-        )
-    with open(filename, "a") as f:
-        pd.DataFrame(vertices).to_csv(f, sep=" ", header=None, index=False)
-
-    # Prepend winding order with number of vertices in face
-    off_faces = np.hstack(
-        (vertices_per_face * np.ones((number_of_faces, 1), dtype=np.int32), faces)
-    )
-    with open(filename, "a") as f:
-        pd.DataFrame(off_faces).to_csv(f, sep=" ", header=None, index=False)
-
-
-def construct_blade(blade_number: int) -> (np.ndarray, np.ndarray, np.ndarray):
+def _construct_blade_vertices() -> np.ndarray:
     # The detector pixels are squares on a plane that corresponds to the front surface of the substrate
 
     # Create vertices for pixel corners as if the blade was in the YZ plane
@@ -151,29 +92,11 @@ def construct_blade(blade_number: int) -> (np.ndarray, np.ndarray, np.ndarray):
     vertices = np.stack((xx, yy, zz))
     # reshape to a flat list of vertices
     vertices = np.reshape(vertices, (3, (WIRES_PER_BLADE + 1) * (STRIPS_PER_BLADE + 1)))
-    vertices = vertices.T
-
-    winding_order = create_winding_order() + blade_number * vertices.shape[0]
-
-    pixels_per_blade = WIRES_PER_BLADE * STRIPS_PER_BLADE
-    start_face_index = pixels_per_blade * blade_number
-    end_face_index = pixels_per_blade * (blade_number + 1)
-    start_pixel_id = start_face_index + 1  # Pixel IDs are 1-indexed
-    end_pixel_id = end_face_index + 1
-    pixel_ids = np.column_stack(
-        (
-            np.arange(start_face_index, end_face_index),
-            np.arange(start_pixel_id, end_pixel_id),
-        )
-    )
-
-    transformed_vertices = _position_blade(blade_number, vertices)
-
-    return transformed_vertices, winding_order, pixel_ids
+    return vertices.T
 
 
-def _construct_pixel_offsets_for_blade(blade_number: int):
-    # Create vertices for pixel corners as if the blade was in the YZ plane
+def _construct_blade_pixel_offsets() -> np.ndarray:
+    # Create vertices for pixel centres as if the blade was in the YZ plane
     x = _get_centre_of_each_strip()
     z = _wire_positions_radial_direction()
     xx, zz = np.meshgrid(x, z)
@@ -183,30 +106,29 @@ def _construct_pixel_offsets_for_blade(blade_number: int):
     constructed_offsets = np.reshape(
         constructed_offsets, (3, WIRES_PER_BLADE * STRIPS_PER_BLADE)
     )
-    constructed_offsets = constructed_offsets.T
-    offsets = _position_blade(blade_number, constructed_offsets)
-
-    x_offsets = offsets[:, 0]
-    y_offsets = offsets[:, 1]
-    z_offsets = offsets[:, 2]
-    return x_offsets, y_offsets, z_offsets
+    return constructed_offsets.T
 
 
-def _position_blade(blade_number, vertices):
-    transformed_vertices = np.zeros_like(vertices)
-    idx = 2
+def _blade_transforms() -> np.ndarray:
+    """
+    Affine transforms positioning each blade, with shape (NUMBER_OF_BLADES, 4, 4)
+    """
     # This ensures we create the blades in the order that matches the detector IDs output by the EFU
-    blade_index = abs(blade_number - NUMBER_OF_BLADES) - 1
-    for index, vertex in enumerate(vertices):
-        vertex = rotate_around_x(-5.0, vertex)
+    blade_indices = abs(np.arange(NUMBER_OF_BLADES) - NUMBER_OF_BLADES) - 1
+    return compose_transforms(
+        rotation_transform("x", -ANGLE_BETWEEN_SUBSTRATE_AND_NEUTRON_deg),
         # Translation from sample position so we can rotate the blade a small angle on a wide arc
-        vertex[2] += SAMPLE_TO_CLOSEST_SUBSTRATE_EDGE_m
-        transformed_vertices[index, :] = rotate_around_x(
-            -ANGLE_BETWEEN_BLADES_deg * blade_index, vertex
-        )
-        # Shift blade back so that its front edge is at z=0 again
-        vertex[2] -= SAMPLE_TO_CLOSEST_SUBSTRATE_EDGE_m
-    return transformed_vertices
+        translation_transform([0.0, 0.0, SAMPLE_TO_CLOSEST_SUBSTRATE_EDGE_m]),
+        rotation_transform("x", -ANGLE_BETWEEN_BLADES_deg * blade_indices),
+    )
+
+
+def _position_blades(vertices: np.ndarray) -> np.ndarray:
+    """
+    Positions the (N, 3) vertices of a blade in the YZ plane as every blade,
+    returns them with shape (NUMBER_OF_BLADES * N, 3) in blade order
+    """
+    return apply_transform(_blade_transforms(), vertices).reshape((-1, 3))
 
 
 def __add_attributes_to_group(group: h5py.Group, attributes: Dict):
@@ -227,7 +149,22 @@ def write_to_nexus_file(
     voxels: np.ndarray,
     detector_ids: np.ndarray,
     offsets: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    json_filename: Optional[str] = None,
 ):
+    """
+    Writes the NeXus file and, if json_filename is given, the file-writer
+    JSON structure of the same tree. The JSON is built by walking the tree
+    while the file is still open. The detector geometry datasets take their
+    values from the arrays in memory, the other, small, datasets are read
+    back from the file.
+    """
+    # nexusutils is only needed to write the file, so the geometry and JSON
+    # helpers can be imported without it
+    from nexusutils.nexusbuilder import NexusBuilder
+
+    shape_datasets = create_detector_shape_datasets(
+        detector_ids, voxels, vertices, offsets
+    )
     with NexusBuilder(
         filename, compress_type="gzip", compress_opts=1, nx_entry_name="entry"
     ) as builder:
@@ -237,7 +174,13 @@ def write_to_nexus_file(
         )
 
         transforms_group = add_shape_to_detector(
-            builder, detector_group, detector_ids, voxels, vertices, offsets
+            builder,
+            detector_group,
+            detector_ids,
+            voxels,
+            vertices,
+            offsets,
+            shape_datasets,
         )
         detector_height = builder.add_nx_group(
             transforms_group,
@@ -315,35 +258,76 @@ def write_to_nexus_file(
         # Remove link to event data in the NXentry
         del builder.root["event_data_multiblade_detector"]
 
+        if json_filename is not None:
+            entry_group = detector_group.file["/entry"]
+            add_entry_placeholders(entry_group)
+            in_memory_values = {
+                f"{detector_group.name}/{name}": values
+                for name, values in shape_datasets.items()
+            }
+            write_to_json_file(
+                entry_group, json_filename, create_streams(), in_memory_values
+            )
+
+
+def add_entry_placeholders(entry_group: h5py.Group):
+    """
+    Writes the start_time and title placeholders that NICOS replaces,
+    overwriting any start_time or title already in the entry
+    """
+    for name, value in (("start_time", "8601TIME"), ("title", "TITLE")):
+        if name in entry_group:
+            del entry_group[name]
+        entry_group.create_dataset(
+            name, data=np.array(value, dtype=np.dtype(f"S{len(value) + 1}"))
+        )
+
+
+def create_detector_shape_datasets(
+    detector_ids: np.ndarray,
+    voxels: np.ndarray,
+    vertices: np.ndarray,
+    offsets: Tuple[np.ndarray, np.ndarray, np.ndarray],
+) -> Dict[str, np.ndarray]:
+    """
+    Detector geometry datasets by their path relative to the detector group
+    """
+    return {
+        "x_pixel_offset": offsets[0],
+        "y_pixel_offset": offsets[1],
+        "z_pixel_offset": offsets[2],
+        "detector_shape/vertices": vertices.astype(np.float64),
+        "detector_shape/winding_order": voxels.flatten().astype(np.int32),
+        "detector_shape/faces": face_starts(voxels),
+        "detector_shape/detector_faces": detector_ids.astype(np.int32),
+        "detector_number": np.unique(detector_ids[:, 1]).astype(np.int32),
+    }
+
 
 def add_shape_to_detector(
-    builder: NexusBuilder,
+    builder: "NexusBuilder",
     detector_group: h5py.Group,
     detector_ids: np.ndarray,
     voxels: np.ndarray,
     vertices: np.ndarray,
     offsets: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    shape_datasets: Optional[Dict[str, np.ndarray]] = None,
 ):
-    builder.add_dataset(detector_group, "x_pixel_offset", offsets[0], {"units": "m"})
-    builder.add_dataset(detector_group, "y_pixel_offset", offsets[1], {"units": "m"})
-    builder.add_dataset(detector_group, "z_pixel_offset", offsets[2], {"units": "m"})
-
-    winding_order = voxels.flatten().astype(np.int32)
-
-    vertices_in_face = 4
-    faces = np.arange(0, winding_order.size, vertices_in_face)
+    if shape_datasets is None:
+        shape_datasets = create_detector_shape_datasets(
+            detector_ids, voxels, vertices, offsets
+        )
+    for axis in ("x", "y", "z"):
+        name = f"{axis}_pixel_offset"
+        builder.add_dataset(detector_group, name, shape_datasets[name], {"units": "m"})
 
     shape_group = builder.add_nx_group(
         detector_group, "detector_shape", "NXoff_geometry"
     )
-    builder.add_dataset(shape_group, "vertices", vertices.astype(np.float64))
-    builder.add_dataset(shape_group, "winding_order", winding_order)
-    builder.add_dataset(shape_group, "faces", faces.astype(np.int32))
-    builder.add_dataset(shape_group, "detector_faces", detector_ids.astype(np.int32))
+    for name in ("vertices", "winding_order", "faces", "detector_faces"):
+        builder.add_dataset(shape_group, name, shape_datasets[f"detector_shape/{name}"])
     builder.add_dataset(
-        detector_group,
-        "detector_number",
-        np.unique(detector_ids[:, 1]).astype(np.int32),
+        detector_group, "detector_number", shape_datasets["detector_number"]
     )
     transforms_group = builder.add_nx_group(
         detector_group, "transformations", "NXtransformations"
@@ -360,119 +344,168 @@ def add_shape_to_detector(
 
 
 def __add_data_stream(streams, topic, source, path, module, value_type=None):
-    options = {"topic": topic, "source": source, "module": module}
+    config = {"topic": topic, "source": source}
     if value_type is not None:
-        options["type"] = value_type
-    streams[path] = options
-
-
-@contextmanager
-def nexus_file(nexus_filename: str):
-    open_file = nexus.nxload(nexus_filename, mode="r+")
-    try:
-        yield open_file
-    finally:
-        open_file.close()
-
-
-def write_to_json_file(nexus_filename: str, json_filename: str):
-    converter = NexusToDictConverter()
-
-    with nexus_file(nexus_filename) as nxs_file:
-        nxs_file.entry.start_time = np.array(
-            "8601TIME", dtype=np.dtype("S9")
-        )  # NICOS replaces 8601TIME
-        nxs_file.entry.title = np.array(
-            "TITLE", dtype=np.dtype("S6")
-        )  # NICOS replaces TITLE
-
-        streams = {}
-        __add_data_stream(
-            streams,
-            EVENT_TOPIC,
-            EVENT_SOURCE_NAME,
-            "/entry/instrument/multiblade_detector/event_data",
-            "ev42",
-        )
-        __add_data_stream(
-            streams,
-            FORWARDER_TOPIC,
-            "COM",
-            "/entry/instrument/multiblade_detector/transformations/COM",
-            "f142",
-            "double"
-        )
-        __add_data_stream(
-            streams,
-            FORWARDER_TOPIC,
-            "COZ",
-            "/entry/instrument/multiblade_detector/transformations/COZ",
-            "f142",
-            "double"
-        )
-        __add_data_stream(
-            streams,
-            FORWARDER_TOPIC,
-            "SOM",
-            "/entry/sample/transformations/SOM",
-            "f142",
-            "double"
-        )
-        __add_data_stream(
-            streams,
-            FORWARDER_TOPIC,
-            "SOZ",
-            "/entry/sample/transformations/SOZ",
-            "f142",
-            "double"
-        )
-        links = {}
-        nexus_structure = converter.convert(nxs_file, streams, links)
-        object_to_json_file(nexus_structure, json_filename)
+        config["dtype"] = value_type
+    streams[path] = {"module": module, "config": config}
 
 
-def create_detector_shape_info():
-    total_vertices = None
-    total_faces = None
-    total_ids = None
-    for blade_number in trange(NUMBER_OF_BLADES):
-        vertices, faces, detector_ids = construct_blade(blade_number)
-        if total_vertices is None:
-            total_vertices = vertices
-            total_faces = faces
-            total_ids = detector_ids
-        else:
-            total_vertices = np.vstack((total_vertices, vertices))
-            total_faces = np.vstack((total_faces, faces))
-            total_ids = np.vstack((total_ids, detector_ids))
+def create_streams() -> Dict[str, Dict]:
+    """
+    File-writer stream modules by the path of the group they are written to
+    """
+    streams = {}
+    __add_data_stream(
+        streams,
+        EVENT_TOPIC,
+        EVENT_SOURCE_NAME,
+        "/entry/instrument/multiblade_detector/event_data",
+        "ev42",
+    )
+    __add_data_stream(
+        streams,
+        FORWARDER_TOPIC,
+        "COM",
+        "/entry/instrument/multiblade_detector/transformations/COM",
+        "f142",
+        "double"
+    )
+    __add_data_stream(
+        streams,
+        FORWARDER_TOPIC,
+        "COZ",
+        "/entry/instrument/multiblade_detector/transformations/COZ",
+        "f142",
+        "double"
+    )
+    __add_data_stream(
+        streams,
+        FORWARDER_TOPIC,
+        "SOM",
+        "/entry/sample/transformations/SOM",
+        "f142",
+        "double"
+    )
+    __add_data_stream(
+        streams,
+        FORWARDER_TOPIC,
+        "SOZ",
+        "/entry/sample/transformations/SOZ",
+        "f142",
+        "double"
+    )
+    return streams
 
-    return total_vertices, total_faces, total_ids
 
+def _file_writer_type(dtype: np.dtype) -> str:
+    if dtype.kind in "SUO":
+        return "string"
+    if dtype == np.float64:
+        return "double"
+    if dtype == np.float32:
+        return "float"
+    return dtype.name
 
-def create_pixel_offsets():
-    total_x_offsets = None
-    total_y_offsets = None
-    total_z_offsets = None
-    for blade_number in trange(NUMBER_OF_BLADES):
-        x_offsets, y_offsets, z_offsets = _construct_pixel_offsets_for_blade(
-            blade_number
-        )
-        if total_x_offsets is None:
-            total_x_offsets = x_offsets
-            total_y_offsets = y_offsets
-            total_z_offsets = z_offsets
+
+def _to_json_value(value):
+    value = np.asarray(value)
+    if value.dtype.kind == "S":
+        value = np.char.decode(value, "utf-8")
+    elif value.dtype.kind == "O":
+        value = np.vectorize(
+            lambda item: item.decode("utf-8") if isinstance(item, bytes) else item,
+            otypes=[object],
+        )(value)
+    return value.tolist()
+
+
+def _attributes_to_json(attributes: h5py.AttributeManager) -> List[Dict]:
+    return [
+        {"name": name, "values": _to_json_value(value)}
+        for name, value in attributes.items()
+    ]
+
+
+def create_nexus_structure(
+    node, streams: Dict[str, Dict], in_memory_values: Dict[str, np.ndarray]
+) -> Dict:
+    """
+    File-writer JSON description of an open HDF5 group or dataset. Groups
+    with a stream get the stream module as their only child. Datasets found
+    in in_memory_values by their path take their values from there instead
+    of being read back from the file.
+    """
+    name = node.name.split("/")[-1]
+    if isinstance(node, h5py.Dataset):
+        if node.name in in_memory_values:
+            values = np.asarray(in_memory_values[node.name])
+        else:
+            values = np.asarray(node[()])
+        structure = {
+            "module": "dataset",
+            "config": {
+                "name": name,
+                "values": _to_json_value(values),
+                "type": _file_writer_type(values.dtype),
+            },
+        }
+    else:
+        if node.name in streams:
+            children = [streams[node.name]]
         else:
-            total_x_offsets = np.hstack((total_x_offsets, x_offsets))
-            total_y_offsets = np.hstack((total_y_offsets, y_offsets))
-            total_z_offsets = np.hstack((total_z_offsets, z_offsets))
+            children = [
+                create_nexus_structure(child, streams, in_memory_values)
+                for child in node.values()
+            ]
+        structure = {"name": name, "type": "group", "children": children}
+    attributes = _attributes_to_json(node.attrs)
+    if attributes:
+        structure["attributes"] = attributes
+    return structure
+
+
+def write_to_json_file(
+    entry_group: h5py.Group,
+    json_filename: str,
+    streams: Dict[str, Dict],
+    in_memory_values: Dict[str, np.ndarray],
+):
+    nexus_structure = {
+        "children": [create_nexus_structure(entry_group, streams, in_memory_values)]
+    }
+    with open(json_filename, "w") as json_file:
+        json.dump(nexus_structure, json_file, indent=2)
+
+
+def create_detector_shape_info():
+    blade_vertices = _construct_blade_vertices()
+    vertices = _position_blades(blade_vertices)
+    winding_order = cell_winding_order(
+        NUMBER_OF_BLADES, create_winding_order(), blade_vertices.shape[0]
+    )
+    # Pixel IDs are 1-indexed
+    number_of_pixels = NUMBER_OF_BLADES * WIRES_PER_BLADE * STRIPS_PER_BLADE
+    pixel_ids = detector_faces(
+        number_of_pixels, 1, detector_numbers=np.arange(1, number_of_pixels + 1)
+    )
+    return vertices, winding_order, pixel_ids
 
-    return total_x_offsets, total_y_offsets, total_z_offsets
+
+def create_pixel_offsets():
+    offsets = _position_blades(_construct_blade_pixel_offsets())
+    x_offsets, y_offsets, z_offsets = np.ascontiguousarray(offsets.T)
+    return x_offsets, y_offsets, z_offsets
 
 
 def run_create_geometry(json_file_path="AMOR_nexus_structure.json"):
     total_vertices, total_faces, total_ids = create_detector_shape_info()
 
-    write_to_off_file(f"{INSTRUMENT_NAME}_multiblade.off", total_vertices, total_faces)
+    write_off_file(
+        f"{INSTRUMENT_NAME}_multiblade.off",
+        total_vertices,
+        off_faces(total_faces),
+        comment=INSTRUMENT_NAME,
+    )
 
     offsets = create_pixel_offsets()
     nexus_filename = f"{INSTRUMENT_NAME}_multiblade.nxs"
@@ -482,10 +515,9 @@ def run_create_geometry(json_file_path="AMOR_nexus_structure.json"):
         total_faces,
         total_ids,
         offsets,
+        json_file_path,
     )
 
-    write_to_json_file(nexus_filename, json_file_path)
-
 
 if __name__ == "__main__":
     run_create_geometry()
@@ -1,6 +1,5 @@
 import json
 from collections import OrderedDict
-from typing import List
 
 import numpy as np
 
@@ -8,6 +7,7 @@ from examples.bifrost.triplet_specifications import TUBE_RADIUS, PIXEL_LENGTH, \
     NUMBER_OF_TUBES_PER_BANK, DIST_BETWEEN_TUBES, \
     PIXEL_RESOLUTION_PER_TUBE, INSTRUMENT_NAME, COLUMNS, ROWS, RADIAL_OFFSETS, \
     MIN_ANGLE_ROTATION, MAX_ANGLE_ROTATION, NOMINAL_RADIAL_DISTANCE, CURVATURE
+from examples.utils.transformations import rotate, rotation_matrix
 
 CHILDREN = 'children'
 NAME = 'name'
@@ -150,39 +150,38 @@ def generate_detector_pixel_shape():
 
 
 def local_bank_offsets():
-    offsets: List[np.array] = []
-    for i in range(NUMBER_OF_TUBES_PER_BANK):
-        dist_y_direction = i * (TUBE_RADIUS * 2 + DIST_BETWEEN_TUBES)
-        for j in range(PIXEL_RESOLUTION_PER_TUBE):
-            dist_x_direction = PIXEL_LENGTH * j
-            offsets.append(np.array([dist_x_direction, dist_y_direction, 0]))
-    return offsets
-
-
-def rotation_x_axis(theta):
-    return np.array(
-        [[1, 0, 0],
-         [0, np.cos(theta), -np.sin(theta)],
-         [0, np.sin(theta), np.cos(theta)]])
-
-
-def rotation_y_axis(theta):
-    return np.array(
-        [[np.cos(theta), 0, np.sin(theta)],
-         [0, 1, 0],
-         [-np.sin(theta), 0, np.cos(theta)]])
-
-
-def add_global_rotation_and_offset(local_offsets, bank_specs):
-    rotation_matrix_x = rotation_x_axis(np.deg2rad(90))
-    rotation_matrix_y = rotation_y_axis(bank_specs['rotation'])
-    position = np.array(bank_specs['position'])
-    xyz_offsets = []
-    for offset in local_offsets:
-        rotated_offset = np.dot(rotation_matrix_x, offset)
-        global_position = np.dot(rotation_matrix_y, rotated_offset + position)
-        xyz_offsets.append(global_position.tolist())
-    return list(zip(*xyz_offsets))
+    """
+    (tubes x pixels, 3) offsets of the pixels in a bank, tube by tube.
+    """
+    dist_y_direction = np.arange(NUMBER_OF_TUBES_PER_BANK) * \
+        (TUBE_RADIUS * 2 + DIST_BETWEEN_TUBES)
+    dist_x_direction = PIXEL_LENGTH * np.arange(PIXEL_RESOLUTION_PER_TUBE)
+    offsets = np.zeros((NUMBER_OF_TUBES_PER_BANK, PIXEL_RESOLUTION_PER_TUBE, 3))
+    offsets[:, :, 0] = dist_x_direction[np.newaxis, :]
+    offsets[:, :, 1] = dist_y_direction[:, np.newaxis]
+    return offsets.reshape((-1, 3))
+
+
+def triplet_rotation_matrices(triplet_specs):
+    """
+    Stacked (triplets, 3, 3) rotation matrices of the triplets around y.
+    """
+    angles = np.array([specs['rotation'] for specs in triplet_specs.values()])
+    return rotation_matrix('y', angles, degrees=False)
+
+
+def add_global_rotation_and_offset(local_offsets, triplet_specs):
+    """
+    (triplets x local offsets, 3) offsets of the pixels of all triplets,
+    positioned in one broadcast over the triplets.
+    """
+    positions = np.array([specs['position']
+                          for specs in triplet_specs.values()], dtype=float)
+    rotated_offsets = rotate(local_offsets, rotation_matrix('x', 90))
+    global_offsets = rotate(rotated_offsets[np.newaxis, :, :] +
+                            positions[:, np.newaxis, :],
+                            triplet_rotation_matrices(triplet_specs))
+    return global_offsets.reshape((-1, 3))
 
 
 def add_detector_to_baseline_json(file_name, nexus_dict, target_file):
@@ -203,9 +202,17 @@ def add_detector_to_baseline_json(file_name, nexus_dict, target_file):
 def save_to_json(file_name, dict_to_save, compress=False):
     with open(file_name, 'w', encoding='utf-8') as file:
         if compress:
-            json.dump(dict_to_save, file, separators=(',', ':'))
+            json.dump(dict_to_save, file, separators=(',', ':'),
+                      default=_array_to_list)
         else:
-            json.dump(dict_to_save, file, indent=4)
+            json.dump(dict_to_save, file, indent=4, default=_array_to_list)
+
+
+def _array_to_list(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} '
+                    f'is not JSON serializable')
 
 
 def generate_triplet_specs():
@@ -229,21 +236,15 @@ def generate_triplet_specs():
 if __name__ == "__main__":
     create_new_json = False
     cylinder_ids, cylinder_vertices = generate_detector_pixel_shape()
-    loc_offsets = local_bank_offsets()
-    x_offset_total, y_offset_total, z_offset_total = [], [], []
     triplet_specifications = generate_triplet_specs()
-    for triplet_specification in triplet_specifications.values():
-        x_offset, y_offset, z_offset = \
-            add_global_rotation_and_offset(loc_offsets, triplet_specification)
-        x_offset_total += x_offset
-        y_offset_total += y_offset
-        z_offset_total += z_offset
-    pixel_ids = list(range(len(x_offset_total)))
+    offsets = add_global_rotation_and_offset(local_bank_offsets(),
+                                             triplet_specifications)
+    pixel_ids = np.arange(len(offsets))
     nexus_detector_dict = get_nexus_detector_dict(pixel_ids, cylinder_ids,
                                                   cylinder_vertices,
-                                                  x_offset_total,
-                                                  y_offset_total,
-                                                  z_offset_total)
+                                                  offsets[:, 0],
+                                                  offsets[:, 1],
+                                                  offsets[:, 2])
     if create_new_json:
         nexus_entry_dict = create_entry_and_instrument(nexus_detector_dict)
         save_to_json("bifrost_detector_baseline.json", nexus_entry_dict)
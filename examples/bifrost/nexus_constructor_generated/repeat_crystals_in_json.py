@@ -1,6 +1,5 @@
 import json
 import numpy as np
-import re
 
 from os import path
 
@@ -8,12 +7,31 @@ from examples.bifrost.detector_geometry import CHILDREN, NAME, save_to_json
 from examples.bifrost.triplet_specifications import INSTRUMENT_NAME, ROWS, \
     COLUMNS, MIN_ANGLE_ROTATION, MAX_ANGLE_ROTATION, RADIAL_OFFSETS, \
     NOMINAL_RADIAL_DISTANCE
+from examples.utils.json_subtree import SubtreeTemplate
+
+
+def crystal_templates(crystals, n_crystals):
+    templates = {}
+    for crystal_number in range(1, n_crystals + 1):
+        crystal_key = f'focusing_analyzer_{crystal_number}'
+        dependency_key = f'focusing_analyzer_{crystal_number - 1}'
+        values = {'rotation': -30.0, 'distance': 0.8} \
+            if crystal_number == 1 else {}
+        templates[crystal_number] = SubtreeTemplate(
+            crystals[crystal_key],
+            substrings={
+                'path': f'/entry/instrument/{crystal_key}',
+                'depends_on':
+                    f'/entry/instrument/{dependency_key}/transformations'},
+            values=values)
+    return templates
 
 
 def repeat_crystals(crystals):
     repeated_crystals = []
     counter = 1
     n_crystals = 5
+    templates = crystal_templates(crystals, n_crystals)
     angles = np.linspace(MIN_ANGLE_ROTATION,MAX_ANGLE_ROTATION, COLUMNS)
     for col, angle in enumerate(angles):
         distances = np.linspace(RADIAL_OFFSETS[col],
@@ -22,25 +40,18 @@ def repeat_crystals(crystals):
         for row, distance in enumerate(distances):
             rotation = angle
             for crystal_number in range(1, n_crystals + 1):
-                crystal_key = f'focusing_analyzer_{crystal_number}'
                 crystal_new_name = f'focusing_analyzer_{counter}'
-                crystals[crystal_key][NAME] = crystal_new_name
-                crystal_str = json.dumps(crystals[crystal_key])
-                crystal_str = crystal_str.replace(f'/entry/instrument/{crystal_key}',
-                                                  f'/entry/instrument/{crystal_new_name}')
-                if counter - 1:
-                    crystal_dependecy_name = f'focusing_analyzer_{crystal_number - 1}'
-                    crystal_new_dependecy_name = f'focusing_analyzer_{counter - 1}'
-                    depends_on = f'/entry/instrument/{crystal_dependecy_name}/transformations'
-                    depends_on_new = f'/entry/instrument/{crystal_new_dependecy_name}/transformations'
-                    crystal_str = crystal_str.replace(depends_on, depends_on_new)
+                crystal_new_dependecy_name = f'focusing_analyzer_{counter - 1}'
+                parameters = {
+                    'path': f'/entry/instrument/{crystal_new_name}',
+                    'depends_on': f'/entry/instrument/'
+                                  f'{crystal_new_dependecy_name}/transformations'}
                 if crystal_number == 1:
-                    crystal_str = crystal_str.replace('"values": -30.0',
-                                                      f'"values": {rotation}')
-                    crystal_str = crystal_str.replace('"values": 0.8',
-                                                      f'"values": {distance}')
-                tmp_dict = eval(crystal_str)
-                repeated_crystals.append(tmp_dict)
+                    parameters['rotation'] = float(rotation)
+                    parameters['distance'] = float(distance)
+                crystal = templates[crystal_number].clone(**parameters)
+                crystal[NAME] = crystal_new_name
+                repeated_crystals.append(crystal)
                 counter += 1
     return repeated_crystals
 
@@ -0,0 +1,177 @@
+"""
+Read the samples of NXlogs that fall in time windows, without loading the
+whole time and value datasets.
+
+The range of samples that can hold a window is found from the cues of the
+log (cue_timestamp_zero and cue_index), which are small and read once per
+log. Logs without cues fall back to a binary search on the time dataset,
+over the first samples of its chunks and then within a single chunk. Only
+the candidate ranges of time and value are then read, a whole HDF5 chunk
+at a time. Chunks are kept only while later windows of the batch can still
+use them, so every chunk is read and decompressed once while memory stays
+bounded by the windows, not the log.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+Window = Tuple[str, float, float]
+
+# Samples read at a time from time and value datasets that are not chunked
+CONTIGUOUS_READ_SIZE = 2**16
+
+
+def _block_size(time_dataset: h5py.Dataset) -> int:
+    """
+    Number of samples read at a time, a whole chunk for chunked datasets.
+    """
+    if time_dataset.chunks:
+        return time_dataset.chunks[0]
+    return CONTIGUOUS_READ_SIZE
+
+
+def _gather(blocks: Dict[int, Tuple[np.ndarray, np.ndarray]], dataset: int,
+            first: int, stop: int, block_size: int) -> np.ndarray:
+    """
+    Samples [first, stop) of the time (0) or value (1) dataset, copied from
+    the blocks read so that the result does not keep whole blocks alive.
+    """
+    first_block = first // block_size
+    stop_block = max(-(-stop // block_size), first_block + 1)
+    return np.concatenate([
+        blocks[block][dataset][max(first - block * block_size, 0):
+                               stop - block * block_size]
+        for block in range(first_block, stop_block)])
+
+
+class NXlogQuery:
+    def __init__(self, nexus_file: h5py.File):
+        self._file = nexus_file
+        self._cues: Dict[str, Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._block_first_samples: Dict[str, Dict[int, float]] = \
+            defaultdict(dict)
+
+    def cues(self, log_path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Cue timestamps and indices of the log, or None if it has no cues.
+        They are read from the file once per log.
+        """
+        if log_path not in self._cues:
+            log = self._file[log_path]
+            if 'cue_timestamp_zero' in log and 'cue_index' in log:
+                self._cues[log_path] = (log['cue_timestamp_zero'][...],
+                                        log['cue_index'][...])
+            else:
+                self._cues[log_path] = None
+        return self._cues[log_path]
+
+    def candidate_range(self, log_path: str, start: float,
+                        end: float) -> Tuple[int, int]:
+        """
+        Range [first, stop) of sample indices that contains every sample of
+        the log with start <= time <= end. Timestamps are compared with the
+        samples exactly, in double precision.
+        """
+        time_dataset = self._file[log_path]['time']
+        start, end = np.float64(start), np.float64(end)
+        number_of_samples = time_dataset.shape[0]
+        cues = self.cues(log_path)
+        if cues is None:
+            first = self._search_time(log_path, start, right=False)
+            return first, max(first, self._search_time(log_path, end,
+                                                       right=True))
+        cue_timestamps, cue_indices = cues
+        # Samples at the end of a cue can round to the timestamp of the next
+        # cue, so a window starting on a cue timestamp starts in the cue before
+        first_cue = max(np.searchsorted(cue_timestamps, start, 'left') - 1, 0)
+        stop_cue = np.searchsorted(cue_timestamps, end, 'right')
+        first = int(cue_indices[first_cue]) if len(cue_indices) else 0
+        stop = int(cue_indices[stop_cue]) if stop_cue < len(cue_indices) \
+            else number_of_samples
+        return first, max(first, stop)
+
+    def _search_time(self, log_path: str, timestamp: np.float64,
+                     right: bool) -> int:
+        """
+        Index to insert timestamp at in the sorted time dataset of a log
+        without cues, as np.searchsorted. Bisects the first samples of the
+        blocks, which are remembered for later searches in the log, then
+        searches the single block that holds the index.
+        """
+        time_dataset = self._file[log_path]['time']
+        block_size = _block_size(time_dataset)
+        first_samples = self._block_first_samples[log_path]
+        low, high = 0, -(-time_dataset.shape[0] // block_size)
+        while low < high:
+            middle = (low + high) // 2
+            if middle not in first_samples:
+                first_samples[middle] = time_dataset[middle * block_size]
+            sample = first_samples[middle]
+            if sample < timestamp or (right and sample == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return 0
+        block_first = (low - 1) * block_size
+        block = time_dataset[block_first:block_first + block_size]
+        return block_first + int(np.searchsorted(
+            block, timestamp, 'right' if right else 'left'))
+
+    def read_windows(self, windows: Iterable[Window]) \
+            -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Times and values of the samples in each (log path, start, end)
+        window, in the order of the windows. The windows of each log are
+        read together, with the chunks they share read once.
+        """
+        windows = list(windows)
+        results: List[Optional[Tuple[np.ndarray, np.ndarray]]] = \
+            [None] * len(windows)
+        windows_per_log = defaultdict(list)
+        for window_number, (log_path, start, end) in enumerate(windows):
+            windows_per_log[log_path].append((window_number, start, end))
+        for log_path, log_windows in windows_per_log.items():
+            self._read_log_windows(log_path, log_windows, results)
+        return results
+
+    def read_window(self, log_path: str, start: float,
+                    end: float) -> Tuple[np.ndarray, np.ndarray]:
+        return self.read_windows([(log_path, start, end)])[0]
+
+    def _read_log_windows(self, log_path: str,
+                          log_windows: List[Tuple[int, float, float]],
+                          results: list):
+        log = self._file[log_path]
+        time_dataset, value_dataset = log['time'], log['value']
+        number_of_samples = time_dataset.shape[0]
+        block_size = _block_size(time_dataset)
+
+        # Windows in order of their candidate ranges, so that a block read
+        # for one window is only kept while later windows can still use it
+        candidates = sorted(
+            (self.candidate_range(log_path, start, end), window_number,
+             np.float64(start), np.float64(end))
+            for window_number, start, end in log_windows)
+        blocks: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for (first, stop), window_number, start, end in candidates:
+            first_block = first // block_size
+            stop_block = max(-(-stop // block_size), first_block + 1)
+            for block in [block for block in blocks if block < first_block]:
+                del blocks[block]
+            for block in range(first_block, stop_block):
+                if block not in blocks:
+                    block_slice = slice(block * block_size,
+                                        min((block + 1) * block_size,
+                                            number_of_samples))
+                    blocks[block] = (time_dataset[block_slice],
+                                     value_dataset[block_slice])
+            times = _gather(blocks, 0, first, stop, block_size)
+            window_first = first + np.searchsorted(times, start, 'left')
+            window_stop = max(window_first,
+                              first + np.searchsorted(times, end, 'right'))
+            results[window_number] = (
+                times[window_first - first:window_stop - first],
+                _gather(blocks, 1, window_first, window_stop, block_size))
@@ -1,38 +1,107 @@
 import numpy as np
 from datetime import datetime
 
+NXLOG_BLOCK_SIZE = 2**20
 
-def add_example_nxlog(builder, parent_path='/raw_data_1/sample/', number_of_cues=1000):
+
+def __add_string_attribute(dataset, name, value):
+    dataset.attrs.create(name, np.array(value).astype("|S" + str(len(value))))
+
+
+def generate_example_cues(number_of_cues, rng):
+    """
+    Draws the number of samples and the time span of every cue up front.
+    Returns the sample counts, the cue timestamps, the end time of each cue
+    and the index of the first sample of each cue.
+    """
+    samples_per_cue = rng.integers(number_of_cues * 10, number_of_cues * 20,
+                                   size=number_of_cues)
+    cue_end_times = np.cumsum(0.2 * number_of_cues + rng.random(number_of_cues) * 20)
+    cue_timestamps = np.concatenate(([0.0], cue_end_times[:-1]))
+    cue_indices = np.concatenate(([0], np.cumsum(samples_per_cue)[:-1]))
+    return samples_per_cue, cue_timestamps, cue_end_times, cue_indices
+
+
+def write_example_nxlog(data_group, number_of_cues=1000, units='cubits',
+                        factor=1, seed=None, start=None,
+                        block_size=NXLOG_BLOCK_SIZE, compression=None,
+                        compression_opts=None):
+    """
+    Fills an NXlog group with a synthetic, monotonically increasing log.
+    Samples are generated cue by cue from seeded random streams and written
+    to chunked, resizable time and value datasets a block of block_size
+    samples at a time, so memory use does not grow with the log.
+    """
+    if start is None:
+        start = datetime.now().isoformat()
+    cue_rng, value_rng, time_rng = [
+        np.random.default_rng(seed_sequence)
+        for seed_sequence in np.random.SeedSequence(seed).spawn(3)]
+    samples_per_cue, cue_timestamps, cue_end_times, cue_indices = \
+        generate_example_cues(number_of_cues, cue_rng)
+
+    chunk_size = int(max(1, min(block_size, samples_per_cue.sum())))
+    datasets = {
+        name: data_group.create_dataset(
+            name, (0,), maxshape=(None,), dtype='float32',
+            chunks=(chunk_size,), compression=compression,
+            compression_opts=compression_opts)
+        for name in ('time', 'value')}
+    __add_string_attribute(datasets['time'], 'units', 's')
+    __add_string_attribute(datasets['time'], 'start', start)
+    __add_string_attribute(datasets['value'], 'units', units)
+
+    blocks = {name: np.empty(block_size) for name in datasets}
+    written = 0
+    filled = 0
+
+    def write_block():
+        nonlocal written, filled
+        for name, dataset in datasets.items():
+            dataset.resize((written + filled,))
+            dataset[written:written + filled] = blocks[name][:filled]
+        written += filled
+        filled = 0
+
+    last_value = 0.21
+    for cue_number, number_of_samples in enumerate(samples_per_cue):
+        cue_factor = factor if cue_number == 0 else 1
+        cue_samples = {
+            'value': np.sort(value_rng.random(number_of_samples) *
+                             (1 / number_of_cues) * cue_factor) + last_value,
+            'time': cue_timestamps[cue_number] +
+            np.sort(time_rng.random(number_of_samples)) *
+            (cue_end_times[cue_number] - cue_timestamps[cue_number])}
+        last_value = cue_samples['value'][-1]
+        copied = 0
+        while copied < number_of_samples:
+            count = min(number_of_samples - copied, block_size - filled)
+            for name, samples in cue_samples.items():
+                blocks[name][filled:filled + count] = \
+                    samples[copied:copied + count]
+            filled += count
+            copied += count
+            if filled == block_size:
+                write_block()
+    if filled:
+        write_block()
+
+    cue_timestamp_zero = data_group.create_dataset(
+        'cue_timestamp_zero', data=cue_timestamps.astype('float32'))
+    __add_string_attribute(cue_timestamp_zero, 'units', 's')
+    __add_string_attribute(cue_timestamp_zero, 'start', start)
+    data_group.create_dataset('cue_index', data=cue_indices.astype('int32'))
+    return data_group
+
+
+def add_example_nxlog(builder, parent_path='/raw_data_1/sample/', number_of_cues=1000,
+                      nxlog_name='auxanometer_1', units='cubits', factor=1,
+                      seed=None, start=None):
     """
     Adds example NXlog class to the file
     """
-    time = 0.0
-    index = 0
-    cue_timestamps = []
-    cue_indices = []
-    times = np.array([])
-    values = np.array([])
-    for cue_number in range(number_of_cues):
-        number_of_samples = np.random.randint(number_of_cues * 10, number_of_cues * 20)
-        cue_timestamps.append(time)
-        cue_indices.append(index)
-        time += 0.2 * number_of_cues + (np.random.rand() * 20)
-        if cue_number > 0:
-            values = np.hstack([values, np.sort(np.random.rand(number_of_samples) * (1/number_of_cues)) + values[-1]])
-            times = np.hstack(
-                (
-                    times,
-                    cue_timestamps[-1] + (np.sort(np.random.rand(number_of_samples)) * (time - cue_timestamps[-1]))))
-        else:
-            values = np.sort(np.random.rand(number_of_samples) * (1/number_of_cues)) + 0.21
-            times = np.sort(np.random.rand(number_of_samples)) * time
-        index += number_of_samples
-
-    # Create an NXlog group in the sample group
-    iso_timestamp = datetime.now().isoformat()
-    data_group = builder.add_nx_group(parent_path, 'auxanometer_1', 'NXlog')
-    builder.add_dataset(data_group, 'time', times.astype('float32'), {'units': 's', 'start': iso_timestamp})
-    builder.add_dataset(data_group, 'value', values.astype('float32'), {'units': 'cubits'})
-    builder.add_dataset(data_group, 'cue_timestamp_zero', np.array(cue_timestamps).astype('float32'),
-                        {'units': 's', 'start': iso_timestamp})
-    builder.add_dataset(data_group, 'cue_index', np.array(cue_indices).astype('int32'))
+    data_group = builder.add_nx_group(parent_path, nxlog_name, 'NXlog')
+    return write_example_nxlog(data_group, number_of_cues, units=units,
+                               factor=factor, seed=seed, start=start,
+                               compression=builder.compress_type,
+                               compression_opts=builder.compress_opts)
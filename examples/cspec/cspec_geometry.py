@@ -0,0 +1,175 @@
+"""
+CSPEC detector geometry from the voxel table in CSPEC_LET_Geometry.csv/.xlsx.
+
+The table is parsed once into arrays. The voxels of its first grid are
+repeated for every grid by broadcasting, and the OFF mesh, the
+NXoff_geometry datasets and the pixel offsets are all written from the same
+arrays.
+"""
+import csv
+import os
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from examples.utils.mesh_topology import cell_winding_order, \
+    detector_faces, face_starts, off_faces
+from examples.utils.off_file import write_off_file
+
+GEOMETRY_FILE = os.path.join(os.path.dirname(__file__),
+                             'CSPEC_LET_Geometry.csv')
+TABLE_COLUMNS = ['Grid', 'Row', 'Voxel', 'X', 'Y', 'Z']
+
+NUMBER_OF_GRIDS = 51
+X_SIZE = 25 / 1000
+Y_SIZE = 25 / 1000
+Z_SIZE = 10 / 1000
+
+# Vertices of a voxel relative to its location, which is its corner with the
+# largest x and the smallest y and z
+VOXEL_VERTEX_OFFSETS = np.array([[-X_SIZE, 0, Z_SIZE],
+                                 [0, 0, Z_SIZE],
+                                 [-X_SIZE, Y_SIZE, Z_SIZE],
+                                 [0, Y_SIZE, Z_SIZE],
+                                 [-X_SIZE, Y_SIZE, 0],
+                                 [0, Y_SIZE, 0],
+                                 [-X_SIZE, 0, 0],
+                                 [0, 0, 0]])
+
+# Vertex indices of the faces of a voxel, in the order of
+# VOXEL_VERTEX_OFFSETS
+VOXEL_FACES = np.array([[0, 1, 3, 2],
+                        [2, 3, 5, 4],
+                        [4, 5, 7, 6],
+                        [6, 7, 1, 0],
+                        [1, 7, 5, 3],
+                        [6, 0, 2, 4]])
+
+
+class VoxelTable(NamedTuple):
+    """
+    Voxels of the geometry table, with locations converted to metres and
+    from the (x, y, z) of the table to (y, z, x).
+    """
+    origin: np.ndarray
+    grid: np.ndarray
+    row: np.ndarray
+    voxel: np.ndarray
+    location: np.ndarray
+
+
+class CSPECGeometry(NamedTuple):
+    pixel_ids: np.ndarray
+    locations: np.ndarray
+    vertices: np.ndarray
+    winding_order: np.ndarray
+
+
+def _read_csv_rows(file_path: str) -> List[list]:
+    with open(file_path, 'r') as csv_file:
+        reader = csv.DictReader(csv_file, delimiter=';')
+        return [[row[column] for column in TABLE_COLUMNS] for row in reader]
+
+
+def _read_xlsx_rows(file_path: str) -> List[list]:
+    import pandas as pd
+    sheet = pd.read_excel(file_path, header=None, dtype=str)
+    # The table does not start in the first cell of the sheet
+    header_row, first_column = np.argwhere(sheet.to_numpy() == 'Grid')[0]
+    table = sheet.iloc[header_row + 1:,
+                       first_column:first_column + len(TABLE_COLUMNS)]
+    return table.dropna(how='all').to_numpy().tolist()
+
+
+def _table_from_rows(rows: List[list]) -> VoxelTable:
+    columns = np.array(rows, dtype=object).T
+    is_origin = columns[0] == 'Origin'
+    # (x, y, z) -> (y, z, x)
+    location = columns[[4, 5, 3]].astype(float).T / 1000
+    return VoxelTable(origin=location[is_origin][0],
+                      grid=columns[0][~is_origin].astype(str),
+                      row=columns[1][~is_origin].astype(str),
+                      voxel=columns[2][~is_origin].astype(str),
+                      location=location[~is_origin])
+
+
+@lru_cache(maxsize=None)
+def _load_voxel_table(file_path: str, modification_time: float,
+                      cache_dir: Optional[str]) -> VoxelTable:
+    if not file_path.endswith('.xlsx'):
+        return _table_from_rows(_read_csv_rows(file_path))
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(
+            cache_dir, f'{os.path.basename(file_path)}.{modification_time}.npz')
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as cached:
+                return VoxelTable(**{field: cached[field]
+                                     for field in VoxelTable._fields})
+    table = _table_from_rows(_read_xlsx_rows(file_path))
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(cache_file, **table._asdict())
+    return table
+
+
+def load_voxel_table(file_path: str = GEOMETRY_FILE,
+                     cache_dir: Optional[str] = None) -> VoxelTable:
+    """
+    Load the voxel table from the .csv or .xlsx source. Tables are kept in
+    memory for the process, and parsed .xlsx sheets are also kept as .npz
+    files in cache_dir, if given, until the source changes.
+    """
+    file_path = os.path.abspath(file_path)
+    return _load_voxel_table(file_path, os.path.getmtime(file_path),
+                             cache_dir)
+
+
+def create_geometry(table: VoxelTable,
+                    number_of_grids: int = NUMBER_OF_GRIDS) -> CSPECGeometry:
+    """
+    Repeat the voxels of the first grid in the table number_of_grids times,
+    Y_SIZE apart along y, numbering the pixels from 1 grid by grid.
+    """
+    first_grid = table.location[table.grid == table.grid[0]]
+    grid_offsets = np.zeros((number_of_grids, 1, 3))
+    grid_offsets[:, 0, 1] = Y_SIZE * np.arange(number_of_grids)
+    locations = (first_grid[np.newaxis, :, :] + grid_offsets).reshape((-1, 3))
+    vertices = locations[:, np.newaxis, :] + VOXEL_VERTEX_OFFSETS
+    number_of_voxels = len(locations)
+    return CSPECGeometry(
+        pixel_ids=np.arange(1, number_of_voxels + 1),
+        locations=locations,
+        vertices=vertices.reshape((-1, 3)),
+        winding_order=cell_winding_order(number_of_voxels, VOXEL_FACES))
+
+
+def write_geometry_off_file(file_name: str, geometry: CSPECGeometry):
+    write_off_file(file_name, geometry.vertices,
+                   off_faces(geometry.winding_order), comment='CSPEC geometry')
+
+
+def write_geometry_to_nexus(detector_group, geometry: CSPECGeometry):
+    """
+    Write the pixel offsets, detector numbers and NXoff_geometry to an open
+    h5py NXdetector group.
+    """
+    for axis, name in enumerate(['x_pixel_offset', 'y_pixel_offset',
+                                 'z_pixel_offset']):
+        dataset = detector_group.create_dataset(
+            name, data=geometry.locations[:, axis])
+        dataset.attrs['units'] = 'm'
+    detector_group.create_dataset('detector_number', data=geometry.pixel_ids)
+    shape_group = detector_group.create_group('detector_shape')
+    shape_group.attrs['NX_class'] = 'NXoff_geometry'
+    vertices = shape_group.create_dataset('vertices', data=geometry.vertices)
+    vertices.attrs['units'] = 'm'
+    shape_group.create_dataset('winding_order',
+                               data=geometry.winding_order.ravel())
+    shape_group.create_dataset('faces',
+                               data=face_starts(geometry.winding_order))
+    shape_group.create_dataset(
+        'detector_faces',
+        data=detector_faces(len(geometry.pixel_ids), len(VOXEL_FACES),
+                            detector_numbers=geometry.pixel_ids))
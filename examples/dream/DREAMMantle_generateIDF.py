@@ -18,36 +18,19 @@ def read_off(filename):
     """
     with open(filename) as f:
         # first line [0] has only the word OFF
-        lines = f.readlines()
-        if lines[0].find('OFF') < 0:
-            print('not an OFF file')
-            return None, None
-        # second line [1] has counts for ....
-        counts = lines[2].split()
-        vertex_count = int(counts[0])
-        vox_count = int(counts[1])
-        # then follows vertices from lines[3] to lines[3+vertex_count]
-        vertices = np.asarray([float(s) for s in lines[3].split()])
-
-        for line in lines[4:3 + vertex_count]:
-            vertices = np.vstack(
-                (
-                    vertices,
-                    np.asarray([float(s) for s in line.split()])
-                )
-            )
-        # now extract the centers lines[2+vertex_count] to lines(-1)
-        centers = np.asarray([float(s)
-                              for s in lines[3 + vertex_count].split()])
-        for line in lines[3 + vertex_count + 1:3 + vertex_count + vox_count]:
-            if len(line) > 0:
-                centers = np.vstack(
-                    (
-                        centers,
-                        np.asarray([float(s) for s in line.split()])
-                    )
-                )
-        return vertices, centers
+        lines = f.read().splitlines()
+    if lines[0].find('OFF') < 0:
+        print('not an OFF file')
+        return None, None
+    # second line [1] has counts for ....
+    counts = lines[2].split()
+    vertex_count = int(counts[0])
+    vox_count = int(counts[1])
+    # then follows vertices from lines[3] to lines[3+vertex_count]
+    # and the centers from there on, each block is parsed in one go
+    vertices = np.loadtxt(lines[3:3 + vertex_count])
+    centers = np.loadtxt(lines[3 + vertex_count:3 + vertex_count + vox_count])
+    return vertices, centers
 
 
 class GenerateDREAMIDF(object):
@@ -174,111 +157,76 @@ class GenerateDREAMIDF(object):
         self.fileHandle.write("\t</component>\n")
         self.fileHandle.write("</type>\n\n")
 
-    def _write_segment(self):
-        num_vert = 8
-        shp = (self.vertices.size // 3)
-        xi = np.zeros(shp, dtype=float, order='C')
-        yi = np.zeros(shp, dtype=float, order='C')
-        zi = np.zeros(shp, dtype=float, order='C')
-        for i in range(self.vertices.size // 3 // num_vert):
-            for j in range(num_vert):
-                xi[num_vert * i + j] = \
-                    round(self.vertices[num_vert * i + j, 0], 3)
-                yi[num_vert * i + j] = \
-                    round(self.vertices[num_vert * i + j, 1], 3)
-                zi[num_vert * i + j] = \
-                    round(self.vertices[num_vert * i + j, 2], 3)
-
-        count_vox = 1
-
-        for ii in range(0, self.vertices.size // 3, num_vert):
-            name_vox = "Voxel" + str(count_vox)
-            self.fileHandle.write(
-                "<type name=\"" +
-                name_vox +
-                "\" is=\"detector\">\n"
-            )
-            count_vox += 1
-            self.fileHandle.write("\t<hexahedron id=\"shape\">\n")
-
-            self.fileHandle.write(
-                "\t\t<left-back-bottom-point x=\"" + str(xi[ii + 4]) +
-                "\" y=\"" + str(yi[ii + 4]) +
-                "\" z=\"" + str(zi[ii + 4]) + "\"  />\n")
-            self.fileHandle.write(
-                "\t\t<left-front-bottom-point  x=\"" + str(xi[ii + 0]) +
-                "\" y=\"" + str(yi[ii + 0]) +
-                "\" z=\"" + str(zi[ii + 0]) + "\"  />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<right-front-bottom-point  x=\"" + str(xi[ii + 1]) +
-                "\" y=\"" + str(yi[ii + 1]) +
-                "\" z=\"" + str(zi[ii + 1]) + "\"  />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<right-back-bottom-point  x=\"" + str(xi[ii + 5]) +
-                "\" y=\"" + str(yi[ii + 5]) +
-                "\" z=\"" + str(zi[ii + 5]) + "\"  />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<left-back-top-point x=\"" + str(xi[ii + 6]) +
-                "\" y=\"" + str(yi[ii + 6]) +
-                "\" z=\"" + str(zi[ii + 6]) + "\"  />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<left-front-top-point  x=\"" + str(xi[ii + 2]) +
-                "\" y=\"" + str(yi[ii + 2]) +
-                "\" z=\"" + str(zi[ii + 2]) + "\"  />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<right-front-top-point  x=\"" + str(xi[ii + 3]) +
-                "\" y=\"" + str(yi[ii + 3]) +
-                "\" z=\"" + str(zi[ii + 3]) + "\"  />\n"
-            )
+    # Vertices of a voxel in the order the hexahedron lists its points
+    _hexahedron_vertex_order = [4, 0, 1, 5, 6, 2, 3, 7]
+    _hexahedron_template = (
+        "<type name=\"Voxel%d\" is=\"detector\">\n"
+        "\t<hexahedron id=\"shape\">\n"
+        "\t\t<left-back-bottom-point x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<left-front-bottom-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<right-front-bottom-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<right-back-bottom-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<left-back-top-point x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<left-front-top-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<right-front-top-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t\t<right-back-top-point  x=\"%r\" y=\"%r\" z=\"%r\"  />\n"
+        "\t</hexahedron>\n"
+        "\t<algebra val=\"shape\" />\n"
+        "\t<bounding-box>\n"
+        "\t\t<x-min val=\"%r\" />\n"
+        "\t\t<x-max val=\"%r\" />\n"
+        "\t\t<y-min val=\"%r\" />\n"
+        "\t\t<y-max val=\"%r\" />\n"
+        "\t\t<z-min val=\"%r\" />\n"
+        "\t\t<z-max val=\"%r\" />\n"
+        "\t</bounding-box>\n"
+        "</type>\n\n"
+    )
+    _voxel_component_template = (
+        "\t<component type=\"Voxel%d\">\n"
+        "\t\t<location x=\"%r\" y=\"%r\" z=\"%r\" name=\"Voxel%d\" ></location>\n"
+        "\t</component>\n"
+    )
+    # Number of voxels rendered into one string before it is written
+    _voxels_per_write = 4096
+
+    def _write_blocks(self, template, rows):
+        """
+        Renders template once per row of values, in chunks of voxels
+        """
+        for start in range(0, len(rows), self._voxels_per_write):
+            chunk = rows[start:start + self._voxels_per_write]
             self.fileHandle.write(
-                "\t\t<right-back-top-point  x=\"" + str(xi[ii + 7]) +
-                "\" y=\"" + str(yi[ii + 7]) +
-                "\" z=\"" + str(zi[ii + 7]) + "\"  />\n"
+                (template * len(chunk)) % tuple(chunk.ravel().tolist())
             )
-            self.fileHandle.write("\t</hexahedron>\n")
-            self.fileHandle.write("\t<algebra val=\"shape\" />\n")
 
-            self.fileHandle.write("\t<bounding-box>\n")
-            self.fileHandle.write(
-                "\t\t<x-min val=\"" + str(np.min(xi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<x-max val=\"" + str(np.max(xi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<y-min val=\"" + str(np.min(yi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<y-max val=\"" + str(np.max(yi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<z-min val=\"" + str(np.min(zi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write(
-                "\t\t<z-max val=\"" + str(np.max(zi[ii:ii + 7])) + "\" />\n"
-            )
-            self.fileHandle.write("\t</bounding-box>\n")
-            self.fileHandle.write("</type>\n\n")
+    def _write_segment(self):
+        num_vert = 8
+        num_vox = self.vertices.size // 3 // num_vert
+        voxel_vertices = np.round(
+            self.vertices[:num_vert * num_vox], 3
+        ).reshape((num_vox, num_vert, 3))
+        # The bounding box is taken over the first 7 vertices of each voxel
+        bounding_box = np.stack(
+            (np.min(voxel_vertices[:, :7], axis=1),
+             np.max(voxel_vertices[:, :7], axis=1)),
+            axis=2
+        )
+        voxel_numbers = np.arange(1, num_vox + 1)
+        hexahedra = np.column_stack((
+            voxel_numbers,
+            voxel_vertices[:, self._hexahedron_vertex_order].reshape(
+                (num_vox, -1)),
+            bounding_box.reshape((num_vox, -1)),
+        ))
+        self._write_blocks(self._hexahedron_template, hexahedra)
 
         self.fileHandle.write("<type name=\"Segment\">\n")
-
-        for jj in range(len(self.centers)):
-            self.fileHandle.write(
-                "\t<component type=\"Voxel" + str(jj + 1) + "\">\n"
-            )
-            self.fileHandle.write(
-                "\t\t<location x=\"" + str(self.centers[jj, 0]) +
-                "\" y=\"" + str(self.centers[jj, 1]) +
-                "\" z=\"" + str(self.centers[jj, 2]) +
-                "\" name=\"Voxel" + str(jj + 1) + "\" ></location>\n"
-            )
-            self.fileHandle.write("\t</component>\n")
-
+        voxel_numbers = np.arange(1, len(self.centers) + 1)
+        components = np.column_stack(
+            (voxel_numbers, self.centers[:, :3], voxel_numbers)
+        )
+        self._write_blocks(self._voxel_component_template, components)
         self.fileHandle.write("</type>\n\n")
 
     def _write_id_list(self, id_name, start, end):
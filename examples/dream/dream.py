@@ -1,15 +1,19 @@
-from concurrent.futures import ProcessPoolExecutor
-from functools import partial
+import os
 from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd  # type:ignore
-from alive_progress import alive_bar
 
-from utils import write_to_nexus_file, write_to_off_file
+from examples.utils.block_assembly import BlockAssembler
+from examples.utils.mesh_topology import HEXAHEDRON_FACES, cell_winding_order, \
+    detector_faces
+from examples.utils.off_file import write_off_file
+from examples.utils.transformations import rotation_matrix
 
 """
 Generates mesh geometry for DREAM Endcap detector from information from a GEANT4 simulation
+
+Run from the repository root with: python -m examples.dream.dream
 """
 
 
@@ -78,93 +82,11 @@ def create_winding_order(
     vertices_in_each_face: int,
     vertex_start_index: int,
 ) -> np.ndarray:
-    index_0 = []
-    index_1 = []
-    index_2 = []
-    index_3 = []
-    for voxel in range(number_of_voxels):
-        start_index = (voxel * vertices_in_voxel) + vertex_start_index
-        index_0.extend(
-            [
-                start_index,
-                start_index,
-                start_index,
-                start_index + 1,
-                start_index + 2,
-                start_index + 4,
-            ]
-        )
-        index_1.extend(
-            [
-                start_index + 2,
-                start_index + 4,
-                start_index + 1,
-                start_index + 3,
-                start_index + 6,
-                start_index + 5,
-            ]
-        )
-        index_2.extend(
-            [
-                start_index + 3,
-                start_index + 6,
-                start_index + 5,
-                start_index + 7,
-                start_index + 7,
-                start_index + 7,
-            ]
-        )
-        index_3.extend(
-            [
-                start_index + 1,
-                start_index + 2,
-                start_index + 4,
-                start_index + 5,
-                start_index + 3,
-                start_index + 6,
-            ]
-        )
-
-    data = np.column_stack(
-        (vertices_in_each_face, index_0, index_1, index_2, index_3,)
-    ).astype(np.int32)
-    return data
-
-
-def rotate_around_x(angle_degrees: float, vertex: np.ndarray) -> np.ndarray:
-    angle = np.deg2rad(angle_degrees)
-    rotation_matrix = np.array(
-        [
-            [1, 0, 0],
-            [0, np.cos(angle), -np.sin(angle)],
-            [0, np.sin(angle), np.cos(angle)],
-        ]
+    winding_order = cell_winding_order(
+        number_of_voxels, HEXAHEDRON_FACES, vertices_in_voxel, vertex_start_index
     )
-    return rotation_matrix.dot(vertex)
-
-
-def rotate_around_y(angle_degrees: float, vertex: np.ndarray) -> np.ndarray:
-    angle = np.deg2rad(angle_degrees)
-    rotation_matrix = np.array(
-        [
-            [np.cos(angle), 0, np.sin(angle)],
-            [0, 1, 0],
-            [-np.sin(angle), 0, np.cos(angle)],
-        ]
-    )
-    return rotation_matrix.dot(vertex)
-
-
-def rotate_around_z(angle_degrees: float, vertex: np.ndarray) -> np.ndarray:
-    angle = np.deg2rad(angle_degrees)
-    rotation_matrix = np.array(
-        [
-            [np.cos(angle), -np.sin(angle), 0],
-            [np.sin(angle), np.cos(angle), 0],
-            [0, 0, 1],
-        ]
-    )
-    return rotation_matrix.dot(vertex)
+    data = np.column_stack((vertices_in_each_face, winding_order,)).astype(np.int32)
+    return data
 
 
 # TODO these numbers are approximate, check with Irina what they should be
@@ -177,23 +99,25 @@ sumo_number_to_translation: Dict[int, np.ndarray] = {
 }
 
 
+def _rotate_vertices(axis: str, angle_degrees: float, vertices: np.ndarray) -> np.ndarray:
+    # One matrix-vector product per vertex, rounded exactly as matrix.dot(vertex)
+    return np.matmul(rotation_matrix(axis, angle_degrees), vertices[..., np.newaxis])[..., 0]
+
+
 def create_voxelids_and_faces(geant_df: pd.DataFrame, max_face_index: int, max_vertex_index: int):
     number_of_voxels = len(geant_df.index)
     vertices_in_voxel = 8
     faces_in_voxel = 6
     number_of_faces = faces_in_voxel * number_of_voxels
 
-    voxel_ids = np.zeros((number_of_faces, 2))
+    # Map each face in the voxel to the voxel ID
     max_voxel_index = max_face_index / faces_in_voxel
-
-    for voxel in range(number_of_voxels):
-        # Map each face in the voxel to the voxel ID
-        for face_number_in_voxel in range(faces_in_voxel):
-            face = voxel * faces_in_voxel + face_number_in_voxel + max_face_index
-            voxel_ids[voxel * faces_in_voxel + face_number_in_voxel, 0] = face
-            voxel_ids[voxel * faces_in_voxel + face_number_in_voxel, 1] = (
-                voxel + max_voxel_index
-            )
+    voxel_ids = detector_faces(
+        number_of_voxels,
+        faces_in_voxel,
+        max_face_index,
+        np.arange(number_of_voxels) + max_voxel_index,
+    )
 
     # Vertices making up each face of each voxel
     vertices_in_each_face = 4 * np.ones(number_of_faces)
@@ -205,93 +129,71 @@ def create_voxelids_and_faces(geant_df: pd.DataFrame, max_face_index: int, max_v
 
 
 def create_sector(geant_df: pd.DataFrame, z_rotation_angle: float):
-    number_of_voxels = len(geant_df.index)
-    vertices_in_voxel = 8
-    number_of_vertices = vertices_in_voxel * number_of_voxels
-
-    x_coords = np.zeros(number_of_vertices)
-    y_coords = np.zeros(number_of_vertices)
-    z_coords = np.zeros(number_of_vertices)
-
-    x_centre_coords = np.zeros(number_of_voxels)
-    y_centre_coords = np.zeros(number_of_voxels)
-    z_centre_coords = np.zeros(number_of_voxels)
-
-    for voxel in range(number_of_voxels):
-        voxel_vertices = find_voxel_vertices(
-            geant_df["z"][voxel] / 2,
+    # Vertices of all voxels in the sector at once, with shape (voxels, 8, 3)
+    voxel_vertices = np.stack(
+        find_voxel_vertices(
+            geant_df["z"].to_numpy() / 2,
             0.0,
             0.0,
-            geant_df["y2"][voxel] / 2,
-            geant_df["x1"][voxel] / 2,
-            geant_df["x1"][voxel] / 2,
+            geant_df["y2"].to_numpy() / 2,
+            geant_df["x1"].to_numpy() / 2,
+            geant_df["x1"].to_numpy() / 2,
             0.0,
-            geant_df["y1"][voxel] / 2,
-            geant_df["x2"][voxel] / 2,
-            geant_df["x2"][voxel] / 2,
+            geant_df["y1"].to_numpy() / 2,
+            geant_df["x2"].to_numpy() / 2,
+            geant_df["x2"].to_numpy() / 2,
             0.0,
         )
+    ).transpose((2, 0, 1))
 
-        voxel_position = np.array(
-            [
-                geant_df["x_centre"][voxel],
-                geant_df["y_centre"][voxel],
-                geant_df["z_centre"][voxel],
-            ]
-        )
-
-        for vert_number, vertex in enumerate(voxel_vertices):
-            # Translate voxel to position in SUMO
-            vertex += voxel_position
-
-            # Rotate 10 degrees around y
-            # This means the SUMO doesn't face the sample, and is done to
-            # increase efficiency of the detector
-            vertex = rotate_around_y(-10, vertex)
-
-            sumo_number = geant_df["sumo"][voxel]
-            vertex = rotate_around_x(sumo_number_to_angle[sumo_number], vertex)
-            vertex += sumo_number_to_translation[sumo_number]
+    # Translate voxels to position in SUMO
+    voxel_positions = geant_df[["x_centre", "y_centre", "z_centre"]].to_numpy()
+    voxel_vertices += voxel_positions[:, np.newaxis, :]
 
-            # Rotate sector
-            vertex = rotate_around_z(z_rotation_angle, vertex)
+    # The rotations are applied one after the other, as for a single vertex,
+    # so that the vertices are identical to the per-vertex construction
 
-            x_coords[voxel * vertices_in_voxel + vert_number] = vertex[0]
-            y_coords[voxel * vertices_in_voxel + vert_number] = vertex[1]
-            z_coords[voxel * vertices_in_voxel + vert_number] = vertex[2]
+    # Rotate 10 degrees around y
+    # This means the SUMO doesn't face the sample, and is done to
+    # increase efficiency of the detector
+    voxel_vertices = _rotate_vertices("y", -10, voxel_vertices)
 
-        x_centre_coords[voxel] = np.mean(
-            x_coords[
-                voxel * vertices_in_voxel : voxel * vertices_in_voxel
-                + vertices_in_voxel
-            ]
-        )
-        y_centre_coords[voxel] = np.mean(
-            y_coords[
-                voxel * vertices_in_voxel : voxel * vertices_in_voxel
-                + vertices_in_voxel
-            ]
-        )
-        z_centre_coords[voxel] = np.mean(
-            z_coords[
-                voxel * vertices_in_voxel : voxel * vertices_in_voxel
-                + vertices_in_voxel
-            ]
+    sumo_numbers = geant_df["sumo"].to_numpy()
+    for sumo_number in np.unique(sumo_numbers):
+        in_sumo = sumo_numbers == sumo_number
+        voxel_vertices[in_sumo] = _rotate_vertices(
+            "x", sumo_number_to_angle[sumo_number], voxel_vertices[in_sumo]
         )
+        voxel_vertices[in_sumo] += sumo_number_to_translation[sumo_number]
 
-    vertex_coords = np.column_stack((x_coords, y_coords, z_coords))
+    # Rotate sector
+    voxel_vertices = _rotate_vertices("z", z_rotation_angle, voxel_vertices)
+
+    # Mean over contiguous vertex coordinates, summed in the same order as
+    # the mean of each voxel on its own
+    centre_coords = np.mean(
+        np.ascontiguousarray(voxel_vertices.transpose((0, 2, 1))), axis=-1
+    )
+    vertex_coords = voxel_vertices.reshape((-1, 3))
 
     return (
         vertex_coords,
-        x_centre_coords,
-        y_centre_coords,
-        z_centre_coords,
+        centre_coords[:, 0],
+        centre_coords[:, 1],
+        centre_coords[:, 2],
     )
 
 
 if __name__ == "__main__":
+    # Only needed to write the files, so the geometry can be imported without
+    # alive_progress and nexusutils installed
+    from alive_progress import alive_bar
+    from examples.dream.utils import write_to_nexus_file
+
     df = pd.read_csv(
-        "LookupTableDreamEndCap_noRRT.txt", delim_whitespace=True, header=None
+        os.path.join(os.path.dirname(__file__), "LookupTableDreamEndCap_noRRT.txt"),
+        sep=r"\s+",
+        header=None,
     )
     df.columns = [
         "sumo",
@@ -310,59 +212,63 @@ if __name__ == "__main__":
     ]
 
     faces_in_voxel = 6
-
-    total_vertices = None
-    total_faces = None
-    total_ids = None
-    x_offsets_total = None
-    y_offsets_total = None
-    z_offsets_total = None
-    max_vertex_index = 0
-    max_face_index = 0
+    vertices_in_voxel = 8
 
     # TODO start and stop angle are inferred from diagrams, need to check
     n_sectors = 23
     z_rotation_angles_degrees = np.linspace(-138.0, 138.0, num=n_sectors)
 
-    _create_sector = partial(create_sector, df)
-    _create_voxelids_and_faces = partial(create_voxelids_and_faces, df)
-
-    with ProcessPoolExecutor(max_workers=12) as executor:
-        with alive_bar(
-            len(z_rotation_angles_degrees), bar="blocks", spinner="triangles"
-        ) as bar:
-            for sector_vertices, x_offsets, y_offsets, z_offsets in executor.map(
-                _create_sector, z_rotation_angles_degrees
-            ):
-
-                sector_faces, sector_ids = _create_voxelids_and_faces(
-                    max_face_index, max_vertex_index
-                )
-                if total_vertices is None:
-                    total_vertices = sector_vertices
-                    total_faces = sector_faces
-                    total_ids = sector_ids
-                    x_offsets_total = x_offsets
-                    y_offsets_total = y_offsets
-                    z_offsets_total = z_offsets
-                else:
-                    total_vertices = np.vstack((total_vertices, sector_vertices))
-                    total_faces = np.vstack((total_faces, sector_faces))
-                    total_ids = np.vstack((total_ids, sector_ids))
-                    x_offsets_total = np.vstack((x_offsets_total, x_offsets))
-                    y_offsets_total = np.vstack((y_offsets_total, y_offsets))
-                    z_offsets_total = np.vstack((z_offsets_total, z_offsets))
-
-                max_vertex_index = total_vertices.shape[0]
-                max_face_index = total_ids.shape[0]
-                bar()
-
-    write_to_off_file(
+    number_of_voxels = len(df.index)
+    vertices_per_sector = vertices_in_voxel * number_of_voxels
+    faces_per_sector = faces_in_voxel * number_of_voxels
+
+    def build_sector(sector_index: int, z_rotation_angle: float):
+        sector_vertices, x_offsets, y_offsets, z_offsets = create_sector(
+            df, z_rotation_angle
+        )
+        sector_faces, sector_ids = create_voxelids_and_faces(
+            df, sector_index * faces_per_sector, sector_index * vertices_per_sector
+        )
+        return {
+            "vertices": sector_vertices,
+            "faces": sector_faces,
+            "ids": sector_ids,
+            "x_offsets": x_offsets,
+            "y_offsets": y_offsets,
+            "z_offsets": z_offsets,
+        }
+
+    # Each sector contributes one row of voxel centre offsets
+    sector_assembler = BlockAssembler(
+        n_sectors,
+        {
+            "vertices": (vertices_per_sector, 3),
+            "faces": (faces_per_sector, 5),
+            "ids": (faces_per_sector, 2),
+            "x_offsets": (1, number_of_voxels),
+            "y_offsets": (1, number_of_voxels),
+            "z_offsets": (1, number_of_voxels),
+        },
+        dtypes={"faces": np.int32},
+    )
+    with alive_bar(
+        len(z_rotation_angles_degrees), bar="blocks", spinner="triangles"
+    ) as bar:
+        sector_assembler.assemble(
+            build_sector, z_rotation_angles_degrees, max_workers=None, callback=bar
+        )
+    total_vertices = sector_assembler.arrays["vertices"]
+    total_faces = sector_assembler.arrays["faces"]
+    total_ids = sector_assembler.arrays["ids"]
+    x_offsets_total = sector_assembler.arrays["x_offsets"]
+    y_offsets_total = sector_assembler.arrays["y_offsets"]
+    z_offsets_total = sector_assembler.arrays["z_offsets"]
+
+    write_off_file(
         f"DREAM_endcap_{n_sectors}_sectors.off",
-        total_vertices.shape[0],
-        total_faces.shape[0],
         total_vertices,
         total_faces,
+        comment="DREAM End-Cap",
     )
 
     write_to_nexus_file(
@@ -1,6 +1,13 @@
 import fileinput
 import time
 
+import numpy as np
+
+try:
+    from DREAMMantle_generateIDF import read_off
+except ModuleNotFoundError:
+    from examples.dream.DREAMMantle_generateIDF import read_off
+
 
 def time_reading_file(read_function):
     # time at the start of program is noted
@@ -17,6 +24,31 @@ def time_reading_file(read_function):
     print("No. of lines printed: ", count)
 
 
+def read_off_with_vstack(filename):
+    """
+    The previous DREAMMantle_generateIDF.read_off, which grows the arrays
+    with np.vstack once per line
+    """
+    with open(filename) as f:
+        lines = f.readlines()
+        counts = lines[2].split()
+        vertex_count = int(counts[0])
+        vox_count = int(counts[1])
+        vertices = np.asarray([float(s) for s in lines[3].split()])
+        for line in lines[4:3 + vertex_count]:
+            vertices = np.vstack(
+                (vertices, np.asarray([float(s) for s in line.split()]))
+            )
+        centers = np.asarray([float(s)
+                              for s in lines[3 + vertex_count].split()])
+        for line in lines[3 + vertex_count + 1:3 + vertex_count + vox_count]:
+            if len(line) > 0:
+                centers = np.vstack(
+                    (centers, np.asarray([float(s) for s in line.split()]))
+                )
+        return vertices, centers
+
+
 if __name__ == '__main__':
     # time the read function using fileinput.
     file_name = 'DREAM_Mantel.off'
@@ -41,3 +73,10 @@ if __name__ == '__main__':
 
 
     time_reading_file(read_func_2)
+
+    # time the previous and the current read_off.
+    time_reading_file(lambda: sum(map(len, read_off_with_vstack(file_name))))
+    time_reading_file(lambda: sum(map(len, read_off(file_name))))
+
+    assert all(np.array_equal(previous, current) for previous, current in
+               zip(read_off_with_vstack(file_name), read_off(file_name)))
@@ -1,9 +1,10 @@
 import datetime
 
 import numpy as np
-import pandas as pd  # type: ignore
 from nexusutils.nexusbuilder import NexusBuilder  # type: ignore
 
+from examples.utils.mesh_topology import face_starts
+
 
 def write_to_nexus_file(
     filename: str,
@@ -16,10 +17,9 @@ def write_to_nexus_file(
 ):
     # Slice off first column of voxels as it contains number of vertices in the face (from OFF format)
     # in NeXus that information is carried by the "faces" dataset
-    winding_order = voxels[:, 1:].flatten().astype(np.int32)
-
-    vertices_in_face = 4
-    faces = np.arange(0, winding_order.size, vertices_in_face)
+    winding_order = voxels[:, 1:].astype(np.int32)
+    faces = face_starts(winding_order)
+    winding_order = winding_order.flatten()
 
     with NexusBuilder(
         filename, compress_type="gzip", compress_opts=1, nx_entry_name="entry"
@@ -69,27 +69,3 @@ def write_to_nexus_file(
         builder.add_fake_event_data(1, 100)
         builder.get_root()["start_time"] = datetime.datetime.now().isoformat()
 
-
-def write_to_off_file(
-    filename: str,
-    number_of_vertices: int,
-    number_of_faces: int,
-    vertices: np.ndarray,
-    voxels: np.ndarray,
-):
-    """
-    Write mesh geometry to a file in the OFF format
-    https://en.wikipedia.org/wiki/OFF_(file_format)
-    """
-    with open(filename, "w") as f:
-        f.writelines(
-            (
-                "OFF\n",
-                "# DREAM End-Cap\n",
-                f"{number_of_vertices} {number_of_faces} 0\n",
-            )
-        )
-    with open(filename, "a") as f:
-        pd.DataFrame(vertices).to_csv(f, sep=" ", header=None, index=False)
-    with open(filename, "a") as f:
-        pd.DataFrame(voxels).to_csv(f, sep=" ", header=None, index=False)
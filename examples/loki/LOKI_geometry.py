@@ -1,15 +1,26 @@
+import copy
 import csv
+import hashlib
 import json
+import os
 from abc import ABC
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from datetime import datetime
+from fnmatch import fnmatch
+from functools import lru_cache, partial
 import h5py
 import matplotlib.pyplot as plt
 import numpy as np
 import random
+import time
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, NamedTuple, \
+    Optional, Tuple
 from examples.loki.nurf_data import load_one_spectro_file, nurf_file_creator
+from examples.utils import transformations
+from examples.utils.transformations import rotate, rotation_matrix
 IMPORT_LARMOR = False  # Change depending on what data set should be used.
 DEBUG_LARMOR_DET = False  # Use larmor or loki full system.
 if IMPORT_LARMOR:
@@ -102,14 +113,172 @@ def reorder_straw_offsets_to_flip_upside_down(straw_offs_unsorted: List):
     straw_offs_sorted[6] = straw_offs_unsorted[6]
     return straw_offs_sorted
 
-def write_csv_file(csv_data):
-    column_names = ['bank id', 'tube id', 'straw id', 'local straw position',
+def compose_pixel_offsets(tube_offsets: np.ndarray, straw_offsets: np.ndarray,
+                          pixel_offsets: np.ndarray) -> np.ndarray:
+    """
+    Broadcasts the tube, straw and pixel offsets of a bank into a
+    (tubes, straws, pixels, 3) array of pixel offsets. The offsets are summed
+    in the same order as the straw -> pixel walk they replace.
+    """
+    return (straw_offsets[np.newaxis, :, np.newaxis, :] +
+            tube_offsets[:, np.newaxis, np.newaxis, :]) + \
+        pixel_offsets[np.newaxis, np.newaxis, :, :]
+
+
+# The compact fields are not part of the NeXus standard, so they are kept in
+# an NXcollection of this name in the detector group.
+COMPACT_GEOMETRY_GROUP = 'compact_pixel_geometry'
+COMPACT_GEOMETRY_FIELDS = ('tube_translations', 'straw_offsets',
+                           'pixel_offsets', 'first_detector_number')
+
+
+def expand_compact_pixel_geometry(detector_json: Dict) -> Dict:
+    """
+    Reconstructs the full detector_number and x/y/z_pixel_offset arrays of a
+    detector group from the file-writer JSON written in compact mode.
+    """
+    fields = {}
+    for group in detector_json[CHILDREN]:
+        if group.get(NAME) != COMPACT_GEOMETRY_GROUP:
+            continue
+        for child in group[CHILDREN]:
+            if child.get(MODULE) == DATASET and \
+                    child[CONFIG][NAME] in COMPACT_GEOMETRY_FIELDS:
+                fields[child[CONFIG][NAME]] = child[CONFIG][VALUES]
+    missing_fields = set(COMPACT_GEOMETRY_FIELDS) - set(fields)
+    if missing_fields:
+        raise ValueError(f'Detector group {detector_json.get(NAME)} is not in '
+                         f'compact mode, missing {sorted(missing_fields)}')
+    offsets = compose_pixel_offsets(
+        np.array(fields['tube_translations'], dtype=float),
+        np.array(fields['straw_offsets'], dtype=float),
+        np.array(fields['pixel_offsets'], dtype=float)).reshape(-1, 3)
+    first_detector_number = int(fields['first_detector_number'])
+    return {'detector_number': np.arange(first_detector_number,
+                                         first_detector_number + len(offsets)),
+            'x_pixel_offset': np.ascontiguousarray(offsets[:, 0]),
+            'y_pixel_offset': np.ascontiguousarray(offsets[:, 1]),
+            'z_pixel_offset': np.ascontiguousarray(offsets[:, 2])}
+
+
+# Source files of the code that computes the pixel geometry.
+GEOMETRY_CODE_FILES = (__file__, transformations.__file__)
+
+
+@lru_cache(maxsize=None)
+def get_geometry_code_hash() -> str:
+    code_hash = hashlib.sha256()
+    for code_file in GEOMETRY_CODE_FILES:
+        with open(code_file, 'rb') as file:
+            code_hash.update(file.read())
+    return code_hash.hexdigest()
+
+
+class GeometryCache:
+    """
+    Content-addressed on-disk cache of per-bank geometry arrays stored as
+    .npz files. The key of a bank is a hash of its specification in
+    det_banks_data, of the constants the geometry is derived from and of the
+    code that computes it, so any change to these invalidates the bank.
+    The least recently used files are evicted once the total size of the
+    cache exceeds max_size bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 2 ** 30):
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_key(bank_geo: Dict, bank_id: int) -> str:
+        spec = {'code': get_geometry_code_hash(),
+                'numpy': np.__version__,
+                'bank_id': bank_id,
+                'bank_geo': bank_geo,
+                'constants': [SCALE_FACTOR, IMAGING_TUBE_D, TUBE_DEPTH,
+                              NUM_STRAWS_PER_TUBE, STRAW_DIAMETER,
+                              STRAW_RESOLUTION, STRAW_ALIGNMENT_OFFSET_ANGLE,
+                              TUBE_OUTER_STRAW_DIST_FROM_CP]}
+        spec_json = json.dumps(spec, sort_keys=True, default=str)
+        return hashlib.sha256(spec_json.encode('utf-8')).hexdigest()
+
+    def _get_file_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f'{key}.npz')
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        file_path = self._get_file_path(key)
+        try:
+            with np.load(file_path) as cached:
+                arrays = {name: cached[name] for name in cached.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        os.utime(file_path)
+        return arrays
+
+    def store(self, key: str, arrays: Dict[str, np.ndarray]):
+        file_path = self._get_file_path(key)
+        tmp_file_path = f'{file_path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_file_path, **arrays)
+        os.replace(tmp_file_path, file_path)
+        self._evict()
+
+    def _evict(self):
+        cache_files = []
+        for entry_name in os.listdir(self._cache_dir):
+            file_path = os.path.join(self._cache_dir, entry_name)
+            if not entry_name.endswith('.npz') or '.tmp.' in entry_name:
+                continue
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            cache_files.append((file_stat.st_mtime, file_stat.st_size,
+                                file_path))
+        cache_size = sum(file_size for _, file_size, _ in cache_files)
+        for _, file_size, file_path in sorted(cache_files):
+            if cache_size <= self._max_size:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            cache_size -= file_size
+
+
+GEOMETRY_COLUMNS = ['bank id', 'tube id', 'straw id', 'local straw position',
                     'pixel id', 'x', 'y', 'z']
-    with open('detector_geometry.csv', 'w') as file:
-        csv_writer = csv.writer(file)
-        csv_writer.writerow(column_names)
-        for row in csv_data:
-            csv_writer.writerow(row)
+GEOMETRY_DTYPE = np.dtype([('bank_id', np.int32),
+                           ('tube_id', np.int32),
+                           ('straw_id', np.int32),
+                           ('local_straw_position', np.int32),
+                           ('pixel_id', np.int32),
+                           ('x', np.float64),
+                           ('y', np.float64),
+                           ('z', np.float64)])
+GEOMETRY_FILE_FORMATS = ('csv', 'npy')
+
+
+def write_geometry_files(geometry_data: np.ndarray,
+                         file_name: str = 'detector_geometry',
+                         file_formats=('csv',)):
+    """
+    Writes the structured pixel geometry array (see GEOMETRY_DTYPE) in one
+    bulk operation per requested file format.
+    """
+    for file_format in file_formats:
+        if file_format not in GEOMETRY_FILE_FORMATS:
+            raise ValueError(f'Unsupported geometry file format '
+                             f'{file_format}, expected one of '
+                             f'{GEOMETRY_FILE_FORMATS}')
+    file_names = {file_format: f'{file_name}.{file_format}'
+                  for file_format in file_formats}
+    if 'npy' in file_names:
+        np.save(file_names['npy'], geometry_data)
+    if 'csv' in file_names:
+        with open(file_names['csv'], 'w', newline='') as file:
+            csv_writer = csv.writer(file)
+            csv_writer.writerow(GEOMETRY_COLUMNS)
+            csv_writer.writerows(geometry_data.tolist())
 
 
 class IdIterator:
@@ -142,6 +311,51 @@ def reset_all_iterators():
     transform_id_iter = iter(IdIterator(1))
 
 
+def get_first_ids(banks_data: Dict) -> Dict[int, Tuple[int, int]]:
+    """
+    Returns the first pixel id and the first straw id of every bank, given
+    that the banks are numbered consecutively in the order of banks_data.
+    """
+    first_ids = {}
+    first_pixel_id, first_straw_id = det_pixel_id_start, 0
+    for bank_id, bank_geo in banks_data.items():
+        first_ids[bank_id] = (first_pixel_id, first_straw_id)
+        num_straws = bank_geo['num_tubes'] * NUM_STRAWS_PER_TUBE
+        first_straw_id += num_straws
+        first_pixel_id += num_straws * STRAW_RESOLUTION
+    return first_ids
+
+
+def imap_banks(function: Callable, banks: List, max_workers=None) -> Iterator:
+    """
+    Applies function to every bank in a process pool and yields the results
+    in the order of banks. At most max_workers banks are in flight,
+    including the one last yielded, so only that many results are held at a
+    time. With max_workers=1 the banks are processed in this process instead.
+    """
+    if max_workers == 1 or len(banks) < 2:
+        for bank in banks:
+            yield function(bank)
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for bank in banks:
+            pending.append(executor.submit(function, bank))
+            if len(pending) == max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def map_banks(function: Callable, banks: List, max_workers=None) -> List:
+    """
+    Applies function to every bank in a process pool and returns the results
+    in the order of banks, see imap_banks.
+    """
+    return list(imap_banks(function, banks, max_workers))
+
+
 # Static class.
 class NexusInfo:
 
@@ -172,6 +386,10 @@ class NexusInfo:
     def get_cylindrical_geo_class_attr():
         return {NX_CLASS: 'NXcylindrical_geometry'}
 
+    @staticmethod
+    def get_collection_class_attr():
+        return {NX_CLASS: 'NXcollection'}
+
     @staticmethod
     def _get_transformation_class_attr():
         return {NX_CLASS: 'NXtransformations'}
@@ -452,34 +670,6 @@ class Pixel(Cylinder):
                 tuple(point_a + pixel_offset + straw_offset)
         return data_dict
 
-    def compound_data_in_list(self, bank_id: int, tube_id: int,
-                              straw_id: int, straw_offset: np.array) -> List:
-        point_a = np.array(self.nominal_vertices_coordinates['Vertex A'])
-        point_a_offsets = point_a + straw_offset
-        data_list: List = []
-        loc_pixel_id_iter = iter(IdIterator())
-        for pixel_offset in self.pixel_xyz_offsets:
-            point_to_save = point_a + point_a_offsets + pixel_offset
-            data_list.append((bank_id,
-                              tube_id,
-                              straw_id,
-                              next(loc_pixel_id_iter),
-                              next(pixel_id_iter),
-                              point_to_save[0],
-                              point_to_save[1],
-                              point_to_save[2]))
-        # ret_val = data_list[:2] + data_list[-2:]
-        # return ret_val
-        return data_list
-
-    def get_pixel_data(self, straw_offset: np.array):
-        data_offsets: List = []
-        data_detector_num: List = []
-        for pixel_offset in self.pixel_xyz_offsets:
-            data_offsets.append(straw_offset + pixel_offset)
-            data_detector_num.append(next(pixel_id_iter))
-        return data_offsets, data_detector_num
-
     def get_cylinder_geo_data(self):
         return {'cylinders': NexusInfo.get_values_attrs_as_dict([(0, 1, 2)]),
                 'vertices': NexusInfo.get_values_attrs_as_dict(
@@ -506,30 +696,20 @@ class Straw:
 
     def set_straw_offsets(self, alignment: DetectorAlignment, base_vector,
                           upside_down: bool, plot_all: bool = False):
-        straw_offs = [np.array([0, 0, 0])]
+        rotation_angle = np.deg2rad(360 / (NUM_STRAWS_PER_TUBE - 1))
+        angles = rotation_angle * np.arange(NUM_STRAWS_PER_TUBE - 1) + \
+            (STRAW_ALIGNMENT_OFFSET_ANGLE if not upside_down else -STRAW_ALIGNMENT_OFFSET_ANGLE)
         if alignment is DetectorAlignment.HORIZONTAL:
-            def rotation(theta):
-                return np.array(
-                    [[1, 0, 0],
-                     [0, np.cos(theta), np.sin(theta)],
-                     [0, -np.sin(theta), np.cos(theta)]])
+            rotations = rotation_matrix('x', -angles, degrees=False)
         else:
-            def rotation(theta):
-                return np.array(
-                    [[np.cos(theta), 0, np.sin(theta)],
-                     [0, 1, 0],
-                     [-np.sin(theta), 0, np.cos(theta)]])
-        rotation_angle = np.deg2rad(360 / (NUM_STRAWS_PER_TUBE - 1))
-        for straw_idx in range(NUM_STRAWS_PER_TUBE - 1):
-            tmp_angle = rotation_angle * straw_idx + \
-                        (STRAW_ALIGNMENT_OFFSET_ANGLE if not upside_down else -STRAW_ALIGNMENT_OFFSET_ANGLE)
-            rotated_vector = np.dot(rotation(tmp_angle), base_vector)
+            rotations = rotation_matrix('y', angles, degrees=False)
+        rotated_vectors = rotate(base_vector, rotations)
+        straw_offs = [np.array([0, 0, 0])]
+        for rotated_vector in rotated_vectors:
             inter_res = \
                 (rotated_vector * TUBE_OUTER_STRAW_DIST_FROM_CP).tolist()
-            for count, _ in enumerate(inter_res):
-                inter_res[count] = round(inter_res[count], 5)
-            inter_res = np.array(inter_res)
-            straw_offs.append(inter_res)
+            straw_offs.append(np.array([round(value, 5)
+                                        for value in inter_res]))
         straw_offs = reorder_straw_offsets_in_list(straw_offs)
         if upside_down:
           straw_offs = reorder_straw_offsets_to_flip_upside_down(straw_offs)
@@ -557,8 +737,8 @@ class Straw:
         pixel_end_point = tuple(np.array(self._point_a) + vector_along_straw)
         vertices_first_pixel = [self._point_a, self._point_b, pixel_end_point]
         self._pixel = Pixel(vertices_first_pixel)
-        offsets_pixel = [vector_along_straw * (j+0.5)
-                         for j in range(STRAW_RESOLUTION)]
+        offsets_pixel = vector_along_straw * \
+            (np.arange(STRAW_RESOLUTION) + 0.5)[:, np.newaxis]
         if plot_all:
             ax_tmp = plt.axes(projection='3d')
             res = pixel_end_point
@@ -580,24 +760,27 @@ class Straw:
                 self._pixel.compound_data_in_dict(straw_offset + tube_offset)
         return data_dict
 
-    def compound_data_in_list(self, tube_id: int,
-                              tube_offset: np.array) -> List:
-        data_list: List = []
-        for straw_offset in self._straw_xyz_offsets:
-            data_list += self._pixel.compound_data_in_list(
-                self._detector_bank_id, tube_id,
-                next(straw_id_iter), straw_offset + tube_offset)
-        return data_list
-
-    def get_straw_data(self, tube_offset: np.array):
-        data_offsets: List = []
-        data_detector_num: List = []
-        for straw_offset in self._straw_xyz_offsets:
-            tmp_offsets, tmp_data_detector_num = \
-                self._pixel.get_pixel_data(straw_offset + tube_offset)
-            data_offsets += tmp_offsets
-            data_detector_num += tmp_data_detector_num
-        return data_offsets, data_detector_num
+    def get_straw_offsets(self) -> np.ndarray:
+        return np.array(self._straw_xyz_offsets, dtype=float)
+
+    def get_pixel_offsets(self) -> np.ndarray:
+        return self._pixel.pixel_xyz_offsets
+
+    def get_point_a(self) -> np.ndarray:
+        return np.array(self._pixel.nominal_vertices_coordinates['Vertex A'])
+
+    def get_pixel_vertices(self) -> np.ndarray:
+        return np.array(self._pixel.get_vertices_coordinates_as_list())
+
+    def restore_pixels(self, straw_offsets: np.ndarray,
+                       pixel_vertices: np.ndarray, pixel_offsets: np.ndarray):
+        """
+        Sets the straw offsets and pixels previously computed by
+        set_straw_offsets and populate_with_pixels for this straw.
+        """
+        self._straw_xyz_offsets = list(straw_offsets)
+        self._pixel = Pixel([tuple(vertex) for vertex in pixel_vertices])
+        self._pixel.set_pixel_xyz_offsets(pixel_offsets)
 
     def get_straw_pixel_geometry(self):
         return self._pixel.get_cylinder_geo_data()
@@ -611,6 +794,9 @@ class Tube:
     repeat the same tube geometry in a detector bank.
     This saves time and space when generating large number of detector banks
     with essentially the same tube geometry, albeit shifted.
+    In compact mode the geometry data keeps this form, in a non-standard
+    NXcollection, see expand_compact_pixel_geometry for reconstructing the
+    full pixel table.
     """
 
     def __init__(self, point_start: tuple, point_end: tuple,
@@ -655,6 +841,30 @@ class Tube:
                                       False)
         self._straw.populate_with_pixels()
 
+    def get_straw_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the arrays populate_with_uniform_straws computes, see
+        restore_uniform_straws.
+        """
+        return {'straw_offsets': self._straw.get_straw_offsets(),
+                'pixel_vertices': self._straw.get_pixel_vertices(),
+                'pixel_offsets': self._straw.get_pixel_offsets()}
+
+    def restore_uniform_straws(self, detector_bank_id: int,
+                               straw_offsets: np.ndarray,
+                               pixel_vertices: np.ndarray,
+                               pixel_offsets: np.ndarray):
+        """
+        Populates the tube with the straws described by the arrays of
+        get_straw_arrays instead of computing them again.
+        """
+        self._straw = Straw(self._point_start,
+                            tuple(pixel_vertices[1]),
+                            self._point_end,
+                            detector_bank_id)
+        self._straw.restore_pixels(straw_offsets, pixel_vertices,
+                                   pixel_offsets)
+
     def compound_data_in_dict(self) -> Dict:
         data_dict = {}
         tube_id_iterator = iter(IdIterator())
@@ -663,18 +873,55 @@ class Tube:
                 self._straw.compound_data_in_dict(tube_offset)
         return data_dict
 
-    def compound_data_in_list(self) -> List:
-        data_list: List = []
-        tube_id_iterator = iter(IdIterator())
-        for tube_offset in self._xyz_offsets:
-            data_list += self._straw.compound_data_in_list(
-                next(tube_id_iterator),
-                tube_offset)
-        return data_list
-
-    def get_geometry_data(self) -> Dict:
-        data_offsets: List = []
-        data_detector_num: List = []
+    def compound_data_in_array(self, bank_id: int, first_pixel_id: int,
+                               first_straw_id: int) -> np.ndarray:
+        """
+        Returns one GEOMETRY_DTYPE record per pixel in the bank, ordered by
+        tube, straw and local pixel position.
+        """
+        tube_offsets = np.array(self._xyz_offsets, dtype=float)
+        straw_offsets = self._straw.get_straw_offsets()
+        pixel_offsets = self._straw.get_pixel_offsets()
+        point_a = self._straw.get_point_a()
+        point_a_offsets = point_a + (straw_offsets[np.newaxis, :, :] +
+                                     tube_offsets[:, np.newaxis, :])
+        points = (point_a + point_a_offsets)[:, :, np.newaxis, :] + \
+            pixel_offsets[np.newaxis, np.newaxis, :, :]
+
+        num_tubes, num_straws, num_pixels = points.shape[:3]
+        data = np.empty(points.shape[:3], dtype=GEOMETRY_DTYPE)
+        data['bank_id'] = bank_id
+        data['tube_id'] = np.arange(num_tubes)[:, np.newaxis, np.newaxis]
+        data['straw_id'] = \
+            np.arange(first_straw_id, first_straw_id + num_tubes * num_straws)\
+            .reshape(num_tubes, num_straws, 1)
+        data['local_straw_position'] = np.arange(num_pixels)
+        data['pixel_id'] = \
+            np.arange(first_pixel_id, first_pixel_id + data.size)\
+            .reshape(data.shape)
+        data['x'] = points[..., 0]
+        data['y'] = points[..., 1]
+        data['z'] = points[..., 2]
+        return data.reshape(-1)
+
+    def get_pixel_offsets(self) -> np.ndarray:
+        """
+        Returns the offsets of every pixel in the bank as a
+        (tubes, straws, pixels, 3) array. The offsets are computed in one step
+        by broadcasting the tube, straw and pixel offsets against each other,
+        summed in the same order as the straw -> pixel walk they replace.
+        """
+        return compose_pixel_offsets(np.array(self._xyz_offsets, dtype=float),
+                                     self._straw.get_straw_offsets(),
+                                     self._straw.get_pixel_offsets())
+
+    def get_number_of_pixels(self) -> int:
+        return len(self._xyz_offsets) * \
+            len(self._straw.get_straw_offsets()) * \
+            len(self._straw.get_pixel_offsets())
+
+    def get_geometry_data(self, first_pixel_id: int,
+                          compact: bool = False) -> Dict:
         if not self._straw:
             empty_nexus_field = NexusInfo.get_values_attrs_as_dict([])
             return {'detector_number': empty_nexus_field,
@@ -683,15 +930,36 @@ class Tube:
                     'y_pixel_offset': empty_nexus_field,
                     'z_pixel_offset': empty_nexus_field}
 
-        for tube_offset in self._xyz_offsets:
-            tmp_offsets, tmp_data_detector_num = \
-                self._straw.get_straw_data(tube_offset)
-            data_offsets += tmp_offsets
-            data_detector_num += tmp_data_detector_num
-
         pixel_shape = self._straw.get_straw_pixel_geometry()
         unit_m = NexusInfo.get_units_attribute(LENGTH_UNIT)
 
+        if compact:
+            compact_geometry = {
+                'first_detector_number':
+                    NexusInfo.get_values_attrs_as_dict(first_pixel_id),
+                'tube_translations':
+                    NexusInfo.get_values_attrs_as_dict(
+                        np.array(self._xyz_offsets, dtype=float), unit_m),
+                'straw_offsets':
+                    NexusInfo.get_values_attrs_as_dict(
+                        self._straw.get_straw_offsets(), unit_m),
+                'pixel_offsets':
+                    NexusInfo.get_values_attrs_as_dict(
+                        self._straw.get_pixel_offsets(), unit_m)}
+            return {
+                'pixel_shape':
+                    NexusInfo.get_values_attrs_as_dict(
+                        pixel_shape,
+                        NexusInfo.get_cylindrical_geo_class_attr()),
+                COMPACT_GEOMETRY_GROUP:
+                    NexusInfo.get_values_attrs_as_dict(
+                        compact_geometry,
+                        NexusInfo.get_collection_class_attr())}
+
+        data_offsets = self.get_pixel_offsets().reshape(-1, 3)
+        data_detector_num = np.arange(first_pixel_id,
+                                      first_pixel_id + len(data_offsets))
+
         return {
             'detector_number':
                 NexusInfo.get_values_attrs_as_dict(data_detector_num),
@@ -701,22 +969,32 @@ class Tube:
                     NexusInfo.get_cylindrical_geo_class_attr()),
             'x_pixel_offset':
                 NexusInfo.get_values_attrs_as_dict(
-                    [x[0] for x in data_offsets], unit_m),
+                    np.ascontiguousarray(data_offsets[:, 0]), unit_m),
             'y_pixel_offset':
                 NexusInfo.get_values_attrs_as_dict(
-                    [y[1] for y in data_offsets], unit_m),
+                    np.ascontiguousarray(data_offsets[:, 1]), unit_m),
             'z_pixel_offset':
                 NexusInfo.get_values_attrs_as_dict(
-                    [z[2] for z in data_offsets], unit_m)}
+                    np.ascontiguousarray(data_offsets[:, 2]), unit_m)}
 
 
 class Bank:
     """
     Abstraction of a detector bank consisting of multiple tubes.
+    The pixel and straw ids of the bank start at first_pixel_id and
+    first_straw_id, see get_first_ids, so that banks can be generated
+    independently of each other.
     """
 
-    def __init__(self, bank_geo: Dict, bank_id: int):
+    def __init__(self, bank_geo: Dict, bank_id: int,
+                 first_pixel_id: int = det_pixel_id_start,
+                 first_straw_id: int = 0,
+                 geometry_cache: Optional[GeometryCache] = None):
         self._bank_id = bank_id
+        self._first_pixel_id = first_pixel_id
+        self._first_straw_id = first_straw_id
+        self._geometry_cache = geometry_cache
+        self._bank_geo = bank_geo
         self._nbr_of_tubes = bank_geo['num_tubes']
         self._bank_offset = np.array(bank_geo['bank_offset']) * SCALE_FACTOR
         self._bank_translation = np.array(bank_geo['A'][0]) * SCALE_FACTOR
@@ -747,6 +1025,7 @@ class Bank:
         self._nexus_dict = {}
 
     def _set_bank_geometry(self, bank_geo: Dict) -> Dict:
+        bank_geo = copy.deepcopy(bank_geo)
         for i in range(4):
             bank_geo['A'][i] = np.array(bank_geo['A'][i]) * SCALE_FACTOR \
                                - self._bank_translation
@@ -775,11 +1054,31 @@ class Bank:
         return xyz_offsets
 
     def build_detector_bank(self):
+        """
+        Populates the bank tube with straws and pixels. If a geometry cache is
+        set the tube is restored from it when it holds this bank, and stored
+        in it otherwise.
+        """
+        cache_key = None
+        if self._geometry_cache is not None:
+            cache_key = GeometryCache.get_key(self._bank_geo, self._bank_id)
+            cached = self._geometry_cache.load(cache_key)
+            if cached is not None:
+                self._detector_tube.set_xyz_offsets(
+                    list(cached.pop('tube_offsets')))
+                self._detector_tube.restore_uniform_straws(self._bank_id,
+                                                           **cached)
+                return self._detector_tube
         tube_point_offsets = self._get_tube_point_offsets()
         self._detector_tube.set_xyz_offsets(tube_point_offsets)
         self._detector_tube.populate_with_uniform_straws(self._bank_id,
                                                          self._base_vec_1,
                                                          self._base_vec_2)
+        if cache_key is not None:
+            self._geometry_cache.store(
+                cache_key,
+                {'tube_offsets': np.array(tube_point_offsets, dtype=float),
+                 **self._detector_tube.get_straw_arrays()})
         return self._detector_tube
 
     def _calculate_tube_length(self, index=0):
@@ -839,23 +1138,42 @@ class Bank:
     def compound_data_in_dict(self) -> Dict:
         return self._detector_tube.compound_data_in_dict()
 
-    def compound_data_in_list(self) -> List:
-        return self._detector_tube.compound_data_in_list()
+    def compound_data_in_array(self) -> np.ndarray:
+        return self._detector_tube.compound_data_in_array(
+            self._bank_id, self._first_pixel_id, self._first_straw_id)
+
+    def get_geometry_data(self, compact=False) -> Dict:
+        return self._detector_tube.get_geometry_data(self._first_pixel_id,
+                                                     compact)
+
+    def get_transformations(self, transform_path='', transform_as_nxlog=False):
+        """
+        Returns the transformations and depends_on of the bank, which are
+        numbered in the order they are created.
+        """
+        return NexusInfo.get_transformations_as_dict(
+            {}, self._bank_translation, transform_path,
+            as_nx_log=transform_as_nxlog)
 
     def compound_detector_geometry(self, transform_path='',
-                                   transform_as_nxlog=False):
+                                   transform_as_nxlog=False, compact=False,
+                                   detector_geo=None, transformations=None):
         """
         Creates a dictionary of the LoKI detector geometry suitable for
-        the NexusFileBuilder class.
+        the NexusFileBuilder class. In compact mode the pixel offsets are
+        given as tube translations and base straw and pixel offsets, in an
+        NXcollection, instead of one offset per pixel. detector_geo can be given if
+        get_geometry_data has already been called, e.g. in another process,
+        and transformations if get_transformations has.
         """
-        detector_geo = self._detector_tube.get_geometry_data()
-        geo_data = \
-            NexusInfo.get_transformations_as_dict(detector_geo,
-                                                  self._bank_translation,
-                                                  transform_path,
-                                                  as_nx_log=transform_as_nxlog)
+        if detector_geo is None:
+            detector_geo = self.get_geometry_data(compact)
+        if transformations is None:
+            transformations = self.get_transformations(transform_path,
+                                                       transform_as_nxlog)
+        detector_geo.update(transformations)
         self._nexus_dict = NexusInfo.get_values_attrs_as_dict(
-            geo_data,
+            detector_geo,
             NexusInfo.get_detector_class_attr())
         return self._nexus_dict
 
@@ -884,6 +1202,9 @@ class Bank:
     def get_nexus_dict(self):
         return self._nexus_dict
 
+    def clear_nexus_dict(self):
+        self._nexus_dict = {}
+
     def get_number_of_pixels(self):
         return self._nbr_of_tubes * STRAW_RESOLUTION * NUM_STRAWS_PER_TUBE
 
@@ -1129,18 +1450,129 @@ class EventData:
         return NexusInfo.get_event_data(self._nx_event_data, topic, source)
 
 
+class DatasetPolicy:
+    """
+    Storage settings for numeric array datasets whose full HDF5 path matches
+    the fnmatch pattern and that hold at least min_size elements.
+    Integer data is only narrowed to dtype if all values fit in it.
+    """
+
+    def __init__(self, pattern: str, min_size: int = 2, dtype=None,
+                 compression: Optional[str] = 'gzip', compression_opts=None,
+                 shuffle: bool = False, chunk_size: int = 2 ** 16):
+        self.pattern = pattern
+        self.min_size = min_size
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.chunk_size = chunk_size
+
+    def matches(self, path: str, values: np.ndarray) -> bool:
+        return values.size >= self.min_size and fnmatch(path, self.pattern)
+
+    def get_dtype(self, values: np.ndarray):
+        if self.dtype is None:
+            return values.dtype
+        if self.dtype.kind in 'iu':
+            if values.dtype.kind not in 'iu':
+                return values.dtype
+            limits = np.iinfo(self.dtype)
+            if values.min() < limits.min or values.max() > limits.max:
+                return values.dtype
+        return self.dtype
+
+    def get_dataset_kwargs(self, values: np.ndarray) -> Dict:
+        chunk_rows = max(1, min(len(values), self.chunk_size))
+        return {'dtype': self.get_dtype(values),
+                'chunks': (chunk_rows,) + values.shape[1:],
+                'compression': self.compression,
+                'compression_opts': self.compression_opts,
+                'shuffle': self.shuffle}
+
+
+class DatasetReport(NamedTuple):
+    path: str
+    dtype: str
+    raw_size: int
+    stored_size: int
+    write_time: float
+    plain_write_time: Optional[float] = None
+
+    @property
+    def saved_size(self):
+        return self.raw_size - self.stored_size
+
+    @property
+    def saved_write_time(self) -> Optional[float]:
+        if self.plain_write_time is None:
+            return None
+        return self.plain_write_time - self.write_time
+
+
+# Datasets without a matching policy keep their dtype and are not compressed.
+DEFAULT_DATASET_POLICIES: List[DatasetPolicy] = []
+# The pixel offsets are stored as float32 in the nexus file. The JSON
+# configuration keeps their float64 values in the text, but declares them as
+# type float, which the file-writer also stores as float32.
+LOKI_DATASET_POLICIES = [
+    DatasetPolicy('*_pixel_offset', dtype=np.float32, shuffle=True),
+    DatasetPolicy('*/detector_number', dtype=np.uint32, shuffle=True),
+    DatasetPolicy('*'),
+]
+
+
 class NexusFileBuilder:
     """
     Generates a nexus file based on data_struct which provides the overall
     definition and data content of the nexus that is supposed to be created.
+
+    Large groups, such as detector banks, can be streamed into the file with
+    write_group as soon as they are generated. construct_nxs_file skips the
+    StreamedGroups placeholders in data_struct, their groups are expected to
+    be written with write_group. Every group and dataset is created exactly
+    once, writing one that already exists raises a ValueError. The only
+    exception are the parent groups of the streamed groups, which
+    write_group creates ahead of construct_nxs_file. Streaming bounds the
+    memory use to the groups not yet written, when they are generated with
+    imap_banks that is up to max_workers banks at a time.
+
+    Numeric array datasets are stored according to the first matching
+    DatasetPolicy, which sets their chunking, filters and dtype. The effect
+    of each policy is recorded in dataset_reports. Datasets that match no
+    policy, all of them by default, are written as they are. With
+    time_plain_writes each policy dataset is also written as it is to an
+    in-memory file, to report the write time the policy saves or costs.
     """
 
-    def __init__(self, data_struct: Dict, filename: str = 'loki',
-                 file_format: str = 'nxs'):
-        self.data_struct = data_struct
+    def __init__(self, data_struct: Optional[Dict] = None,
+                 filename: str = 'loki', file_format: str = 'nxs',
+                 dataset_policies: Optional[List[DatasetPolicy]] = None,
+                 time_plain_writes: bool = False):
+        self.data_struct = data_struct if data_struct is not None else {}
         if '.' + file_format not in filename:
             filename = '.'.join([filename, file_format])
         self.hf5_file = h5py.File(filename, 'w')
+        if dataset_policies is None:
+            dataset_policies = DEFAULT_DATASET_POLICIES
+        self._dataset_policies = dataset_policies
+        self._time_plain_writes = time_plain_writes
+        self.dataset_reports: List[DatasetReport] = []
+        self._streamed_parent_paths = set()
+
+    def write_group(self, parent_path: str, name: str, nxs_data: Dict):
+        """
+        Writes the group nxs_data as parent_path/name straight into the file.
+        """
+        parent = self.hf5_file.require_group(parent_path)
+        path = parent.name
+        while path != '/':
+            self._streamed_parent_paths.add(path)
+            path = path.rsplit('/', 1)[0] or '/'
+        new_group = parent.create_group(name)
+        self._add_attributes(nxs_data, new_group)
+        self._construct_nxs_file(nxs_data[VALUES], new_group)
+        self.hf5_file.flush()
 
     def construct_nxs_file(self):
         self._construct_nxs_file(self.data_struct, self.hf5_file)
@@ -1148,21 +1580,87 @@ class NexusFileBuilder:
 
     def _construct_nxs_file(self, nxs_data, group):
         for element in nxs_data:
-            if element == MODULE:
+            if element == MODULE or \
+                    isinstance(nxs_data[element], StreamedGroups):
                 pass
             elif isinstance(nxs_data[element][VALUES], VALID_ARRAY_TYPES_NXS):
-                d_set = group.create_dataset(element,
-                                             data=nxs_data[element][VALUES])
+                d_set = self._create_array_dataset(
+                    group, element, nxs_data[element][VALUES])
                 self._add_attributes(nxs_data[element], d_set)
             elif isinstance(nxs_data[element][VALUES], VALID_DATA_TYPES_NXS):
                 d_set = group.create_dataset(element,
                                              data=nxs_data[element][VALUES])
                 self._add_attributes(nxs_data[element], d_set)
+            elif f'{group.name.rstrip("/")}/{element}' in \
+                    self._streamed_parent_paths:
+                new_group = group[element]
+                self._add_attributes(nxs_data[element], new_group)
+                self._construct_nxs_file(nxs_data[element][VALUES], new_group)
             else:
                 new_group = group.create_group(element)
                 self._add_attributes(nxs_data[element], new_group)
                 self._construct_nxs_file(nxs_data[element][VALUES], new_group)
 
+    def _get_dataset_policy(self, path, values) -> Optional[DatasetPolicy]:
+        if not isinstance(values, np.ndarray) or values.dtype.kind not in 'iuf':
+            return None
+        for policy in self._dataset_policies:
+            if policy.matches(path, values):
+                return policy
+        return None
+
+    def _create_array_dataset(self, group, name, values):
+        path = f'{group.name.rstrip("/")}/{name}'
+        policy = self._get_dataset_policy(path, values)
+        if policy is None:
+            return group.create_dataset(name, data=values)
+        start_time = time.perf_counter()
+        d_set = group.create_dataset(name, data=values,
+                                     **policy.get_dataset_kwargs(values))
+        write_time = time.perf_counter() - start_time
+        plain_write_time = self._get_plain_write_time(values) \
+            if self._time_plain_writes else None
+        self.dataset_reports.append(
+            DatasetReport(path, str(d_set.dtype), values.nbytes,
+                          d_set.id.get_storage_size(), write_time,
+                          plain_write_time))
+        return d_set
+
+    @staticmethod
+    def _get_plain_write_time(values) -> float:
+        with h5py.File(f'plain_write_{os.getpid()}.h5', 'w', driver='core',
+                       backing_store=False) as plain_file:
+            start_time = time.perf_counter()
+            plain_file.create_dataset('values', data=values)
+            return time.perf_counter() - start_time
+
+    def print_dataset_reports(self):
+        for report in self.dataset_reports:
+            write_time = f'written in {report.write_time:.3f} s'
+            if report.saved_write_time is not None:
+                write_time += self._compare_write_time(
+                    report.saved_write_time)
+            print(f'{report.path}: {report.dtype}, '
+                  f'{report.raw_size} -> {report.stored_size} bytes '
+                  f'({report.saved_size} saved), {write_time}')
+        raw_size = sum(report.raw_size for report in self.dataset_reports)
+        saved_size = sum(report.saved_size for report in self.dataset_reports)
+        print(f'Saved {saved_size} of {raw_size} bytes in '
+              f'{len(self.dataset_reports)} datasets.')
+        if self._time_plain_writes:
+            write_time = sum(report.write_time
+                             for report in self.dataset_reports)
+            saved_write_time = sum(report.saved_write_time
+                                   for report in self.dataset_reports)
+            print(f'Writing them took {write_time:.3f} s'
+                  f'{self._compare_write_time(saved_write_time)}.')
+
+    @staticmethod
+    def _compare_write_time(saved_write_time: float) -> str:
+        comparison = 'shorter' if saved_write_time >= 0 else 'longer'
+        return f' ({abs(saved_write_time):.3f} s {comparison} than ' \
+               f'written as they are)'
+
     @staticmethod
     def _add_attributes(data_, d_set):
         if data_[ATTR]:
@@ -1215,9 +1713,73 @@ class NexusFileLoader:
 
 
 FLOAT, INTEGER, STRING = "float", "int32", "string"
+JSON_SEPARATORS = (',', ':')
+JSON_CHUNK_SIZE = 2 ** 16
+
+
+class StreamedGroups:
+    """
+    Placeholder in the nexus dictionary for groups that are generated one at
+    a time after the rest of the dictionary and are not kept. The groups are
+    written with NexusFileBuilder.write_group and, in place of the
+    placeholder, with JsonConfigWriter.write_group.
+    """
+
+
+class JsonConfigWriter:
+    """
+    Writes a translated JSON configuration up to its first StreamedGroups
+    placeholder on creation. The groups of the placeholder are then written
+    one at a time with write_group, and close writes the rest of the
+    configuration. Any further placeholders are left empty.
+    """
+
+    def __init__(self, json_config: Dict, json_filename: str,
+                 translate: Callable[[str, Dict], Dict]):
+        self._translate = translate
+        self._file = open(json_filename, 'w', encoding='utf-8')
+        self._writer = JsonConfigTranslator._write_json(json_config, self._file)
+        self._separator = next(self._writer, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def write_group(self, name: str, nexus_dict: Dict):
+        if self._separator is None:
+            raise ValueError('The JSON configuration has no StreamedGroups '
+                             'placeholder left to write groups into.')
+        self._file.write(self._separator)
+        self._separator = ','
+        deque(JsonConfigTranslator._write_json(
+            self._translate(name, nexus_dict), self._file), maxlen=0)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._separator is not None:
+            try:
+                self._writer.send(self._separator)
+            except StopIteration:
+                pass
+            deque(self._writer, maxlen=0)
+        self._file.close()
 
 
 class JsonConfigTranslator:
+    """
+    Translates the nexus dictionary into a file-writer JSON configuration.
+    Numeric arrays are kept as they are in the configuration and are written
+    straight from their buffers by save_to_json, in chunks of JSON_CHUNK_SIZE
+    values, giving the same output as json.dump on the equivalent lists.
+    The groups of a StreamedGroups placeholder are written with the
+    JsonConfigWriter returned by open_json.
+    """
 
     def __init__(self, nexus_struct, json_filename='config.json'):
         self._nexus_struct = nexus_struct
@@ -1248,6 +1810,9 @@ class JsonConfigTranslator:
             return t, INTEGER
         elif isinstance(t, str):
             return t, STRING
+        elif isinstance(t, np.ndarray) and t.ndim == 1 and len(t) > 1 \
+                and t.dtype.kind in 'iuf':
+            return t, INTEGER if t.dtype.kind in 'iu' else FLOAT
         elif np.isscalar(t[0]) and len(t) == 1:
             return t[0], self._check_type(t[0])
         else:
@@ -1294,6 +1859,9 @@ class JsonConfigTranslator:
                 children.append(nexus_dict[VALUES][MODULE])
             else:
                 for name, value in nexus_dict[VALUES].items():
+                    if isinstance(value, StreamedGroups):
+                        children.append(value)
+                        continue
                     child = self._translate(name, value)
                     if child:
                         children.append(child)
@@ -1309,17 +1877,80 @@ class JsonConfigTranslator:
             output_dict[ATTR] = attributes
         return output_dict
 
+    def open_json(self) -> JsonConfigWriter:
+        return JsonConfigWriter(self._json_config, self._json_filename,
+                                self._translate)
+
     def save_to_json(self):
-        with open(self._json_filename, 'w', encoding='utf-8') as file:
-            # json.dump(self._json_config, file, indent=4)
-            json.dump(self._json_config, file, separators=(',', ':'))
+        with self.open_json():
+            pass
 
+    @staticmethod
+    def _write_json(value, file):
+        """
+        Generator writing value to file. At each StreamedGroups placeholder
+        it yields the separator for the next list item and continues with
+        the separator it is sent back, or the same one if it is sent None.
+        """
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'iuf':
+            JsonConfigTranslator._write_json_array(value, file)
+        elif isinstance(value, dict):
+            file.write('{')
+            for count, (key, item) in enumerate(value.items()):
+                if count:
+                    file.write(',')
+                file.write(json.dumps(str(key)) + ':')
+                yield from JsonConfigTranslator._write_json(item, file)
+            file.write('}')
+        elif isinstance(value, (list, tuple)):
+            file.write('[')
+            separator = ''
+            for item in value:
+                if isinstance(item, StreamedGroups):
+                    separator = (yield separator) or separator
+                    continue
+                file.write(separator)
+                separator = ','
+                yield from JsonConfigTranslator._write_json(item, file)
+            file.write(']')
+        else:
+            file.write(json.dumps(value, separators=JSON_SEPARATORS))
 
-def run_create_geometry():
+    @staticmethod
+    def _write_json_array(array, file):
+        if array.ndim == 0:
+            file.write(json.dumps(array.item()))
+            return
+        file.write('[')
+        if array.ndim > 1:
+            for count, row in enumerate(array):
+                if count:
+                    file.write(',')
+                JsonConfigTranslator._write_json_array(row, file)
+        else:
+            for start in range(0, len(array), JSON_CHUNK_SIZE):
+                if start:
+                    file.write(',')
+                chunk = array[start:start + JSON_CHUNK_SIZE]
+                if array.dtype.kind == 'f' and not np.isfinite(chunk).all():
+                    # Let json spell out NaN and Infinity.
+                    file.write(json.dumps(chunk.tolist(),
+                                          separators=JSON_SEPARATORS)[1:-1])
+                else:
+                    # The list repr uses the same number formatting as json.
+                    file.write(repr(chunk.tolist())[1:-1].replace(' ', ''))
+        file.write(']')
+
+
+def run_create_geometry(geometry_cache_dir: Optional[str] = None,
+                        verbose: bool = False):
     plot_tube_locations = False
     plot_endpoint_locations = False
     generate_nexus_content_into_nxs = True
     generate_nexus_content_into_csv = True
+    geometry_file_formats = ['csv']  # Any of GEOMETRY_FILE_FORMATS.
+    compact_pixel_geometry = False
+    max_bank_workers = None  # Process pool size, 1 builds banks serially.
     add_simulated_data_to_nxs = False
     add_larmor_isis_data_to_nxs = False
     add_nurf_to_nxs = False
@@ -1416,6 +2047,9 @@ def run_create_geometry():
                            event_time_offset,
                            event_time_zero)
 
+    first_ids = get_first_ids(det_banks_data)
+    geometry_cache = GeometryCache(geometry_cache_dir) \
+        if geometry_cache_dir else None
     for loki_bank_id in det_banks_data:
         if plot_endpoint_locations:
             for idx in range(4):
@@ -1430,7 +2064,8 @@ def run_create_geometry():
                         [start_point[2] * SCALE_FACTOR + offset,
                          end_point[2] * SCALE_FACTOR + offset],
                         color=color)
-        bank = Bank(det_banks_data[loki_bank_id], loki_bank_id)
+        bank = Bank(det_banks_data[loki_bank_id], loki_bank_id,
+                    *first_ids[loki_bank_id], geometry_cache)
         detector_tube = bank.build_detector_bank()
         bank_translation = bank.get_bank_translation()
         if plot_tube_locations:
@@ -1454,25 +2089,28 @@ def run_create_geometry():
     if plot_tube_locations or plot_endpoint_locations:
         plt.show()
 
-    data = {}
     if generate_nexus_content_into_csv:
-        for bank in detector_banks:
-            data[bank.get_bank_id()] = bank.compound_data_in_list()
-        if IMPORT_LARMOR:
-            write_csv_file(data[0])
-        else:
-            write_csv_file(data[0] + data[4])
-        reset_all_iterators()
+        csv_bank_ids = [0] if IMPORT_LARMOR else [0, 4]
+        csv_banks = [bank for bank in detector_banks
+                     if bank.get_bank_id() in csv_bank_ids]
+        data = map_banks(Bank.compound_data_in_array, csv_banks,
+                         max_bank_workers)
+        write_geometry_files(np.concatenate(data),
+                             file_formats=geometry_file_formats)
 
     nx_entry = Entry(experiment_id="p1234", title="My experiment",
                      experiment_desc="this is an experiment")
     data = nx_entry.get_nx_entry(start_time=datetime.now().isoformat())
 
-    start_index = 0
-    end_index = start_index
     if generate_nexus_content_into_nxs:
+        nexus_file_builder = NexusFileBuilder(
+            filename=file_name, dataset_policies=LOKI_DATASET_POLICIES,
+            time_plain_writes=verbose)
+
+        # The transformations are numbered in creation order, so they are
+        # created for every bank before the other components.
+        bank_names, bank_transformations = [], []
         for c, bank in enumerate(detector_banks):
-            end_index += bank.get_number_of_pixels()
             if NAME in det_banks_data[c]:
                 key_det = det_banks_data[c][NAME]
             else:
@@ -1480,14 +2118,13 @@ def run_create_geometry():
             trans_path = f'/{ENTRY}/{INSTRUMENT}/{key_det}/{TRANSFORMATIONS}/'
             transform_nxlog = True if bank.get_bank_id() \
                                       in bank_ids_transform_as_nxlog else False
-            bank.compound_detector_geometry(trans_path, transform_nxlog)
-            if add_simulated_data_to_nxs:
-                bank.add_static_data(detector_data[start_index:end_index],
-                                     tof_data)
-            item_det = bank.get_nexus_dict()
-            data[ENTRY][VALUES][INSTRUMENT][VALUES][key_det] = item_det
-            print(f'Detector {key_det} is done!')
-            start_index = end_index
+            bank_names.append(key_det)
+            bank_transformations.append(
+                bank.get_transformations(trans_path, transform_nxlog))
+
+        # The banks are generated after the rest of the entry, in its place.
+        data[ENTRY][VALUES][INSTRUMENT][VALUES]['detector_banks'] = \
+            StreamedGroups()
 
         # Create source.
         if data_source:
@@ -1551,11 +2188,6 @@ def run_create_geometry():
             print(f'NXuser {user_var} is done!')
 
         # Throw everything into event data.
-        for bank in det_banks_data:
-            data[ENTRY][VALUES][INSTRUMENT][VALUES][det_banks_data[bank][NAME]][
-                VALUES]['larmor_detector_events'] = \
-                event_data.get_nx_event_data(det_banks_data[bank][TOPIC],
-                                             det_banks_data[bank][SOURCE])
         for c, monitor in enumerate(data_monitors):
             data[ENTRY][VALUES][INSTRUMENT][VALUES][monitor[NAME]][VALUES][
                 f'monitor_{c + 1}_events'] = \
@@ -1563,11 +2195,41 @@ def run_create_geometry():
 
         translator = JsonConfigTranslator(data, json_filename=json_filename)
         translator.translate()
-        translator.save_to_json()
-
-        # Construct nexus file.
-        nexus_file_builder = NexusFileBuilder(data, filename=file_name)
+        with translator.open_json() as json_writer:
+            # Each bank is built, written to the nexus file and the JSON
+            # configuration, and is not kept after. Up to max_bank_workers
+            # banks are held at a time, see imap_banks.
+            bank_geometries = imap_banks(
+                partial(Bank.get_geometry_data,
+                        compact=compact_pixel_geometry),
+                detector_banks, max_bank_workers)
+            start_index = 0
+            for c, (bank, bank_geometry) in enumerate(zip(detector_banks,
+                                                          bank_geometries)):
+                end_index = start_index + bank.get_number_of_pixels()
+                key_det = bank_names[c]
+                bank.compound_detector_geometry(
+                    compact=compact_pixel_geometry, detector_geo=bank_geometry,
+                    transformations=bank_transformations[c])
+                if add_simulated_data_to_nxs:
+                    bank.add_static_data(detector_data[start_index:end_index],
+                                         tof_data)
+                item_det = bank.get_nexus_dict()
+                item_det[VALUES]['larmor_detector_events'] = \
+                    event_data.get_nx_event_data(det_banks_data[c][TOPIC],
+                                                 det_banks_data[c][SOURCE])
+                nexus_file_builder.write_group(f'/{ENTRY}/{INSTRUMENT}',
+                                               key_det, item_det)
+                json_writer.write_group(key_det, item_det)
+                bank.clear_nexus_dict()
+                print(f'Detector {key_det} is done!')
+                start_index = end_index
+
+        # Complete nexus file with everything but the detector banks.
+        nexus_file_builder.data_struct = data
         nexus_file_builder.construct_nxs_file()
+        if verbose:
+            nexus_file_builder.print_dataset_reports()
 
         # Add NURF Data.
         if add_nurf_to_nxs:
@@ -1581,4 +2243,4 @@ def run_create_geometry():
 
 
 if __name__ == '__main__':
-    run_create_geometry()
+    run_create_geometry(os.environ.get('LOKI_GEOMETRY_CACHE_DIR'), verbose=True)
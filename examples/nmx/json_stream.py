@@ -0,0 +1,87 @@
+"""
+Write a rendered JSON document with its large arrays serialised in chunks.
+
+Components render their templates with a short placeholder in place of each
+large array (see JSONArrays.placeholder), so the rendered skeleton of the
+whole instrument stays small. JSONArrays.write then writes the skeleton piece
+by piece to the file, formatting the arrays a chunk of rows at a time in
+between, and the full document is never held in memory.
+"""
+import json
+import re
+from typing import Dict, Iterator, TextIO, Tuple
+
+import numpy as np
+
+ARRAY_CHUNK_VALUES = 2**16
+
+_PLACEHOLDER = re.compile(r"(__j2_array_\d+__)")
+
+
+def iter_json_array(
+    values: np.ndarray, conversion: str = "%d", chunk_values: int = ARRAY_CHUNK_VALUES
+) -> Iterator[str]:
+    """
+    Format a 1D or 2D array as a JSON array, the same way Jinja2 renders a
+    (nested) list, in pieces of about chunk_values values each.
+    """
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values.reshape((-1, 1))
+        row_template = conversion
+    else:
+        row_template = "[" + ", ".join([conversion] * values.shape[1]) + "]"
+    chunk_rows = max(1, chunk_values // max(1, values.shape[1]))
+    yield "["
+    for start in range(0, values.shape[0], chunk_rows):
+        rows = values[start : start + chunk_rows]
+        separator = ", " if start else ""
+        yield separator + ", ".join([row_template] * rows.shape[0]) % tuple(
+            rows.ravel().tolist()
+        )
+    yield "]"
+
+
+def format_json_array(values: np.ndarray, conversion: str = "%d") -> str:
+    """
+    Format a 1D or 2D array as a JSON array, the same way Jinja2 renders a
+    (nested) list.
+    """
+    return "".join(iter_json_array(values, conversion))
+
+
+class JSONArrays:
+    """Arrays left out of a rendered template, keyed by their placeholder."""
+
+    def __init__(self):
+        self._arrays: Dict[str, Tuple[np.ndarray, str]] = {}
+
+    def placeholder(self, values: np.ndarray, conversion: str = "%d") -> str:
+        """Return the text to render in the template instead of the array."""
+        key = f"__j2_array_{len(self._arrays)}__"
+        self._arrays[key] = (np.asarray(values), conversion)
+        return key
+
+    def validate(self, skeleton: str):
+        """
+        Check the structure of the document without formatting the arrays.
+        Raises json.JSONDecodeError if the skeleton is not valid JSON with
+        every array in place, and ValueError if an array is missing or
+        rendered more than once.
+        """
+        placeholders = _PLACEHOLDER.findall(skeleton)
+        if sorted(placeholders) != sorted(self._arrays):
+            raise ValueError(
+                f"Expected each of {len(self._arrays)} arrays once in the "
+                f"document, found {len(placeholders)} placeholders"
+            )
+        json.loads(_PLACEHOLDER.sub("[]", skeleton))
+
+    def write(self, skeleton: str, file: TextIO):
+        for piece in _PLACEHOLDER.split(skeleton):
+            if piece in self._arrays:
+                values, conversion = self._arrays[piece]
+                for chunk in iter_json_array(values, conversion):
+                    file.write(chunk)
+            else:
+                file.write(piece)
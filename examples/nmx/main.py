@@ -1,17 +1,21 @@
 import argparse
-import json
 import os
+import sys
+import time
 from pathlib import PurePosixPath
 from operator import itemgetter
-
-import jinja2
+from typing import Optional
 
 try:
+    from json_stream import JSONArrays
     from nx_detector import BoxNXDetector
     from nx_sample import NXSample
+    from templates import render_template, set_bytecode_cache_dir
 except ModuleNotFoundError:
+    from examples.nmx.json_stream import JSONArrays
     from examples.nmx.nx_detector import BoxNXDetector
     from examples.nmx.nx_sample import NXSample
+    from examples.nmx.templates import render_template, set_bytecode_cache_dir
 
 
 FACTOR = 1  # used to reduce file size while testing. Set to 1 for actual numbers.
@@ -27,15 +31,12 @@ GAP_WIDTH_X = 0.2  # actual=0.2mm
 GAP_WIDTH_Y = GAP_WIDTH_X
 
 
-def render_template(template_dir, template_file_name, **context):
-    return (
-        jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir + "/"))
-        .get_template(template_file_name)
-        .render(context)
-    )
-
-
-def render(template_dir, template_file_name):
+def render(template_dir, template_file_name, arrays: Optional[JSONArrays] = None):
+    """
+    Render the instrument template. If arrays is given, the detector arrays
+    are collected in it and the returned document only holds their
+    placeholders (see json_stream).
+    """
     print("Creating sample and detectors...")
 
     # detector_0: seen from the incoming beam, the panel to the left and behind the sample
@@ -270,9 +271,9 @@ def render(template_dir, template_file_name):
     print(f"Rendering detectors...")
     context = {
         # "j2_instrument_name": instrument_name,
-        "j2_instrument_detector_panel_0": detector_panel_0.to_json(),
-        "j2_instrument_detector_panel_1": detector_panel_1.to_json(),
-        "j2_instrument_detector_panel_2": detector_panel_2.to_json(),
+        "j2_instrument_detector_panel_0": detector_panel_0.to_json(arrays),
+        "j2_instrument_detector_panel_1": detector_panel_1.to_json(arrays),
+        "j2_instrument_detector_panel_2": detector_panel_2.to_json(arrays),
     }
 
     print(f"Rendering sample...")
@@ -285,6 +286,19 @@ def render(template_dir, template_file_name):
     return output
 
 
+def _peak_memory_mib() -> Optional[float]:
+    """Peak resident memory of this process, or None where it is unavailable"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak_memory / 2**20
+    return peak_memory / 2**10
+
+
 def main():
     parser = argparse.ArgumentParser(description="Process output file name.")
     parser.add_argument(
@@ -294,14 +308,28 @@ def main():
         help="Baseline jinja2 template for the instrument",
     )
     parser.add_argument("-o", "--output-file", required=True, help="Output file name")
+    parser.add_argument(
+        "--template-cache-dir",
+        help="Directory to cache compiled templates in between runs",
+    )
     args = parser.parse_args()
+    set_bytecode_cache_dir(args.template_cache_dir)
     template_dir, template_file_name = os.path.split(args.template_file)
     output_file_name = args.output_file
 
-    output = render(template_dir, template_file_name)
+    start = time.perf_counter()
+    arrays = JSONArrays()
+    skeleton = render(template_dir, template_file_name, arrays)
+    arrays.validate(skeleton)  # raises json.JSONDecodeError if invalid JSON
+    print("Writing detector arrays...")
     with open(output_file_name, "w", encoding="utf-8") as file:
-        file.write(output)
-    json.loads(output)  # raises json.JSONDecodeError if invalid JSON
+        arrays.write(skeleton, file)
+    render_time = time.perf_counter() - start
+    peak_memory = _peak_memory_mib()
+    if peak_memory is None:
+        print(f"Rendered in {render_time:.2f} s")
+    else:
+        print(f"Rendered in {render_time:.2f} s, peak memory {peak_memory:.1f} MiB")
     # with open(output_file_name + ".sorted.json", "w", encoding="utf-8") as file_sorted:
     #     json.dump(custom_sort(output, CUSTOM_SORT_ORDER), file_sorted, indent=2, sort_keys=False)
     print(f"Written JSON file: {output_file_name}")
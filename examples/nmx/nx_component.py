@@ -2,7 +2,10 @@ from copy import deepcopy
 from typing import Any, Dict, List
 from pathlib import PurePosixPath
 
-import jinja2
+try:
+    from templates import render_template
+except ModuleNotFoundError:
+    from examples.nmx.templates import render_template
 
 
 class NXComponent:
@@ -32,12 +35,7 @@ class NXComponent:
         return output
 
     def _render(self, template_dir: str, template_file_name: str, **context):
-        def get_item(dictionary, key):
-            return dictionary.get(key)
-
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir + "/"))
-        env.filters["get_item"] = get_item
-        return env.get_template(template_file_name).render(context)
+        return render_template(template_dir, template_file_name, **context)
 
     def rotate(
         self,
@@ -1,10 +1,14 @@
-import itertools
-from typing import List
+import os
+from typing import List, Optional
 from pathlib import PurePosixPath
 
+import numpy as np
+
 try:
+    from json_stream import JSONArrays, format_json_array
     from nx_component import NXComponent
 except ModuleNotFoundError:
+    from examples.nmx.json_stream import JSONArrays, format_json_array
     from examples.nmx.nx_component import NXComponent
 
 
@@ -67,30 +71,45 @@ class BoxNXDetector(NXDetector):
         )
         self.size_z = size_z
 
-    def get_pixel_coordinates(self, pixel_id: int) -> List[float]:
-        assert self.is_valid_pixel_id(
-            pixel_id
-        ), f"Pixel {pixel_id} out of bounds (first={self.first_pixel_id} last={self.last_pixel_id})"
-        pixel_id -= self.first_pixel_id
-        column = pixel_id % self.number_of_pixels_x
-        row = pixel_id // self.number_of_pixels_x
+    def pixel_coordinates(self, pixel_ids: np.ndarray) -> np.ndarray:
+        """
+        Return the x, y and z coordinates of the given pixel IDs, including
+        the gaps between groups of pixels, along a trailing axis of length 3.
+        """
+        pixel_ids = np.asarray(pixel_ids)
+        valid = (self.first_pixel_id <= pixel_ids) & (pixel_ids <= self.last_pixel_id)
+        assert np.all(
+            valid
+        ), f"Pixels {pixel_ids[~valid]} out of bounds (first={self.first_pixel_id} last={self.last_pixel_id})"
+        pixel_ids = pixel_ids - self.first_pixel_id
+        coordinates = np.zeros(pixel_ids.shape + (3,))
+        coordinates[..., 0] = self._column_offsets(
+            pixel_ids % self.number_of_pixels_x
+        )
+        coordinates[..., 1] = self._row_offsets(pixel_ids // self.number_of_pixels_x)
+        return coordinates
+
+    def _column_offsets(self, columns: np.ndarray) -> np.ndarray:
         gaps_x = (
-            column // self.gap_every_x_pixels if self.gap_every_x_pixels != 0 else 0
+            columns // self.gap_every_x_pixels if self.gap_every_x_pixels != 0 else 0
         )
-        gaps_y = row // self.gap_every_y_pixels if self.gap_every_y_pixels != 0 else 0
-        x = (
-            column * self.channel_pitch_x
+        return (
+            columns * self.channel_pitch_x
             + gaps_x * self.gap_width_x
             - self.size_x / 2
             + self.channel_pitch_x / 2
         )
-        y = self.size_y / 2 - (
-            row * self.channel_pitch_y
+
+    def _row_offsets(self, rows: np.ndarray) -> np.ndarray:
+        gaps_y = rows // self.gap_every_y_pixels if self.gap_every_y_pixels != 0 else 0
+        return self.size_y / 2 - (
+            rows * self.channel_pitch_y
             + gaps_y * self.gap_width_y
             + self.channel_pitch_y / 2
         )
-        z = 0
-        return [x, y, z]
+
+    def get_pixel_coordinates(self, pixel_id: int) -> List[float]:
+        return self.pixel_coordinates(np.array(pixel_id)).tolist()
 
     @property
     def number_of_pixels(self):
@@ -101,47 +120,29 @@ class BoxNXDetector(NXDetector):
         return self.first_pixel_id + self.number_of_pixels - 1
 
     @property
-    def pixel_ids(self):
-        """Generator"""
-        for pixel_id in range(
-            self.first_pixel_id,
-            self.first_pixel_id + (self.number_of_pixels_x * self.number_of_pixels_y),
-        ):
-            yield pixel_id
-
-    def get_detector_numbers(self):
-        """Generator of detector (pixel) numbers. Returns one detector row at a time."""
-        pixel_ids_generator = self.pixel_ids
-        while True:
-            slice_gen = list(
-                itertools.islice(pixel_ids_generator, self.number_of_pixels_x)
-            )
-            if not slice_gen:
-                break
-            yield slice_gen
+    def pixel_ids(self) -> np.ndarray:
+        """Array of all pixel IDs in the detector"""
+        return np.arange(self.first_pixel_id, self.last_pixel_id + 1)
+
+    def get_detector_numbers(self) -> np.ndarray:
+        """Array of detector (pixel) numbers, with one detector row per row."""
+        return self.pixel_ids.reshape(
+            (self.number_of_pixels_y, self.number_of_pixels_x)
+        )
 
-    def get_x_pixel_offsets(self):
-        """Return list of x pixel offsets for the first row of the detector.
+    def get_x_pixel_offsets(self) -> np.ndarray:
+        """Return array of x pixel offsets for the first row of the detector.
         Assumes that all rows have identical offsets."""
-        row = next(self.get_detector_numbers(), [])
-        offsets = []
-        for pixel in row:
-            x, _, _ = self.get_pixel_coordinates(pixel)
-            offsets.append(x)
-        return offsets
+        return self._column_offsets(np.arange(self.number_of_pixels_x))
 
-    def get_y_pixel_offsets(self):
-        """Return list of y pixel offsets for the first column of the detector.
+    def get_y_pixel_offsets(self) -> np.ndarray:
+        """Return array of y pixel offsets for the first column of the detector.
         Assumes that all columns have identical offsets."""
-        offsets = []
-        for row in self.get_detector_numbers():
-            _, y, _ = self.get_pixel_coordinates(row[0])
-            offsets.append(y)
-        return offsets
+        return self._row_offsets(np.arange(self.number_of_pixels_y))
 
-    def get_z_pixel_offsets(self):
-        """Return a list of z pixel offsets, with a single item of value zero."""
-        return [0]
+    def get_z_pixel_offsets(self) -> np.ndarray:
+        """Return an array of z pixel offsets, with a single item of value zero."""
+        return np.zeros(1)
 
     def is_valid_pixel_id(self, pixel_id: int) -> bool:
         """
@@ -153,17 +154,23 @@ class BoxNXDetector(NXDetector):
             < self.first_pixel_id + self.number_of_pixels
         )
 
-    def to_json(self):
+    def to_json(self, arrays: Optional[JSONArrays] = None):
+        """
+        Render the detector. If arrays is given, the detector numbers and
+        pixel offsets are added to it and only their placeholders are
+        rendered, to be streamed by JSONArrays.write.
+        """
+        format_array = format_json_array if arrays is None else arrays.placeholder
         context = {
             "j2_detector_name": self.name,
             "j2_instrument_name": self.instrument_name,
             "j2_detector_sizes": [self.size_z, self.size_y, self.size_x],
-            "j2_detector_numbers": list(self.get_detector_numbers()),
-            "j2_x_pixel_offsets": self.get_x_pixel_offsets(),
-            "j2_y_pixel_offsets": self.get_y_pixel_offsets(),
-            "j2_z_pixel_offsets": self.get_z_pixel_offsets(),
+            "j2_detector_numbers": format_array(self.get_detector_numbers()),
+            "j2_x_pixel_offsets": format_array(self.get_x_pixel_offsets(), "%.6f"),
+            "j2_y_pixel_offsets": format_array(self.get_y_pixel_offsets(), "%.6f"),
+            "j2_z_pixel_offsets": format_array(self.get_z_pixel_offsets(), "%.6f"),
             "j2_detector_transformations": self.transformations,
         }
         return self._render(
-            "examples/nmx", "template_NXdetector_box.json.j2", **context
+            os.path.dirname(__file__), "template_NXdetector_box.json.j2", **context
         )
@@ -1,4 +1,5 @@
 import itertools
+import os
 from typing import List
 from pathlib import PurePosixPath
 
@@ -23,5 +24,5 @@ class NXSample(NXComponent):
             "j2_sample_transformations": self.transformations,
         }
         return self._render(
-            "examples/nmx", "template_NXsample.json.j2", **context
+            os.path.dirname(__file__), "template_NXsample.json.j2", **context
         )
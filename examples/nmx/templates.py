@@ -0,0 +1,48 @@
+"""
+Jinja2 environments shared by the NMX components and the baseline render.
+
+One environment is kept per template directory, so each template is loaded
+and compiled once per process. The compiled templates can also be cached on
+disk with set_bytecode_cache_dir, so later runs skip the compilation.
+"""
+import os
+from typing import Dict, Optional
+
+import jinja2
+
+_environments: Dict[str, jinja2.Environment] = {}
+_bytecode_cache: Optional[jinja2.BytecodeCache] = None
+
+
+def _get_item(dictionary, key):
+    return dictionary.get(key)
+
+
+def set_bytecode_cache_dir(directory: Optional[str]):
+    """
+    Cache compiled templates in the given directory, or only in memory if
+    directory is None.
+    """
+    global _bytecode_cache
+    if directory is None:
+        _bytecode_cache = None
+    else:
+        os.makedirs(directory, exist_ok=True)
+        _bytecode_cache = jinja2.FileSystemBytecodeCache(directory)
+    _environments.clear()
+
+
+def get_environment(template_dir: str) -> jinja2.Environment:
+    key = os.path.abspath(template_dir)
+    if key not in _environments:
+        environment = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(key),
+            bytecode_cache=_bytecode_cache,
+        )
+        environment.filters["get_item"] = _get_item
+        _environments[key] = environment
+    return _environments[key]
+
+
+def render_template(template_dir: str, template_file_name: str, **context) -> str:
+    return get_environment(template_dir).get_template(template_file_name).render(context)
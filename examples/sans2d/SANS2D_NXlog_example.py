@@ -1,6 +1,6 @@
-import numpy as np
 import h5py
-from examples.common.nxloghelper import create_nexus_file
+from examples.common.nxlog_query import NXlogQuery
+from examples.common.nxloghelper import write_example_nxlog
 try:
     import matplotlib.pyplot as pl
 except:
@@ -10,8 +10,18 @@ except:
 This script shows how one can use the new "cue" features of NXlog and NXevent_data to extract a subset of the data
 """
 
+
+def create_nexus_file(filename):
+    with h5py.File(filename, 'w') as nexus_file:
+        sample_group = nexus_file.create_group('raw_data_1/sample')
+        log_group = sample_group.create_group('auxanometer_1')
+        log_group.attrs['NX_class'] = 'NXlog'
+        write_example_nxlog(log_group, number_of_cues=1000, seed=0,
+                            compression='gzip', compression_opts=1)
+
+
 if __name__ == '__main__':
-    # Make an example file with a fabricated NXlog and some real neutron event data in it
+    # Make an example file with a fabricated NXlog in it
     filename = 'SANS2D_NXlog_example.hdf5'
     create_nexus_file(filename)
 
@@ -34,24 +44,13 @@ if __name__ == '__main__':
         # network stream, or be recorded for the start of each HDF5 compressed chunk to optimise read performance.
 
         # cue_timestamp_zero is a small subset of timestamps from the full timestamps dataset
-        # Since it is small we can load the whole dataset from file with [...]
-        cue_timestamps = plant_log['cue_timestamp_zero'][...]
-        # cue_index maps between indices in the cue timestamps and the full timestamps dataset
-        cue_indices = plant_log['cue_index'][...]
-
-        # We look up the positions in the full timestamp list where the cue timestamps are in our range of interest
+        # and cue_index maps between indices in the cue timestamps and the full timestamps dataset.
+        # NXlogQuery looks up the positions in the full timestamp list where the cue timestamps are
+        # in our range of interest, reads only that slice of the log and truncates it to the exact
+        # range. Logs without cues are searched with a binary search instead.
+        query = NXlogQuery(nexus_file)
         range_start, range_end = 832, 846
-        range_indices = cue_indices[np.append((range_start < cue_timestamps[1:]), [True]) &
-                                    np.append([True], (range_end > cue_timestamps[:-1]))][[0, -1]]
-
-        # Now we can extract a slice of the log which we know contains the time range we are interested in
-        times = plant_log['time'][range_indices[0]:range_indices[1]]
-        values = plant_log['value'][range_indices[0]:range_indices[1]]
-
-        # We can easily truncate them to the exact range if necessary
-        times_mask = (range_start <= times) & (times <= range_end)
-        times = times[times_mask]
-        values = values[times_mask]
+        times, values = query.read_window(plant_log.name, range_start, range_end)
         try:
             pl.plot(times, values)
             pl.show()
@@ -7,11 +7,15 @@
 # 2) Powerpoint sent by Francesco P.
 #    Multi-BladeGeom.pptx (May 9. 2022)
 
+import h5py
+import json
 import numpy as np
 import os
 import pytest
 
-from examples.amor.amor import run_create_geometry
+from examples.amor.amor import create_detector_shape_info, \
+    create_pixel_offsets, create_streams, run_create_geometry, \
+    write_to_nexus_file
 from examples.utils.detector_geometry_from_json import BaseDetectorGeometry
 
 NC = 11 # number of cassettes
@@ -186,3 +190,35 @@ def test_angle_between_blades(amor_geometry, cass):
     ang = amor_geometry.r2d(amor_geometry.angle(v1, v2))
     amor_geometry.mprint("cass {}-{} angle {} degrees".format(cass, cass + 1, ang))
     assert amor_geometry.expect(ang, blang, ang_precision)
+
+
+def test_json_structure_matches_nexus_file(tmp_path):
+    nexus_filename = str(tmp_path / 'AMOR_multiblade.nxs')
+    json_filename = str(tmp_path / 'AMOR_nexus_structure.json')
+    vertices, faces, ids = create_detector_shape_info()
+    write_to_nexus_file(nexus_filename, vertices, faces, ids,
+                        create_pixel_offsets(), json_filename)
+    with open(json_filename, 'r') as json_file:
+        entry = json.load(json_file)['children'][0]
+    streams = create_streams()
+
+    with h5py.File(nexus_filename, 'r') as nexus_file:
+        def compare(item, path):
+            if item.get('module') == 'dataset':
+                dataset = nexus_file[f"{path}/{item['config']['name']}"]
+                values = dataset[()]
+                if isinstance(values, bytes):
+                    values = values.decode()
+                assert np.array_equal(item['config']['values'], values)
+                return 1
+            if 'module' in item:
+                assert streams[path] == item
+                return 0
+            group_path = f"{path}/{item['name']}"
+            assert group_path in nexus_file
+            return sum(compare(child, group_path)
+                       for child in item['children'])
+
+        assert compare(entry, '') > 0
+        for path in streams:
+            assert path in nexus_file
@@ -0,0 +1,103 @@
+#
+# File-writer JSON written by the AMOR generator. These tests build small
+# in-memory HDF5 trees, so they run without nexusutils.
+
+import h5py
+import json
+import numpy as np
+import pytest
+
+from examples.amor.amor import add_entry_placeholders, \
+    create_nexus_structure, create_streams, write_to_json_file
+
+DETECTOR = '/entry/instrument/multiblade_detector'
+
+
+@pytest.fixture
+def h5_file():
+    with h5py.File('amor_json_test.nxs', 'w', driver='core',
+                   backing_store=False) as h5_file:
+        yield h5_file
+
+
+@pytest.fixture
+def entry(h5_file):
+    entry = h5_file.create_group('entry')
+    entry.attrs['NX_class'] = 'NXentry'
+    detector = h5_file.create_group(DETECTOR)
+    detector.attrs['NX_class'] = 'NXdetector'
+    detector.create_dataset('detector_number', data=np.zeros(3, np.int32))
+    event_data = detector.create_group('event_data')
+    event_data.attrs['NX_class'] = 'NXevent_data'
+    transformations = detector.create_group('transformations')
+    transformations.create_group('COZ')
+    transformations.create_group('COM')
+    h5_file.create_group('/entry/sample/transformations/SOZ')
+    h5_file.create_group('/entry/sample/transformations/SOM')
+    return entry
+
+
+def find_child(structure, name):
+    for child in structure['children']:
+        if child.get('name', child.get('config', {}).get('name')) == name:
+            return child
+    raise KeyError(name)
+
+
+def test_streams_follow_file_writer_module_layout():
+    # Same layout as the repo's other file-writer templates, e.g.
+    # examples/dream/DREAM_baseline_without_geometry.json
+    streams = create_streams()
+    event_stream = streams[f'{DETECTOR}/event_data']
+    assert event_stream == {'module': 'ev42',
+                            'config': {'topic': 'FREIA_detector',
+                                       'source': 'AMOR_EFU'}}
+    for path in (f'{DETECTOR}/transformations/COZ',
+                 f'{DETECTOR}/transformations/COM',
+                 '/entry/sample/transformations/SOZ',
+                 '/entry/sample/transformations/SOM'):
+        assert streams[path] == {
+            'module': 'f142',
+            'config': {'topic': 'AMOR_forwarderData',
+                       'source': path.split('/')[-1],
+                       'dtype': 'double'}}
+
+
+def test_nexus_structure_schema(entry):
+    detector_number = np.array([1, 2, 3], np.int32)
+    structure = create_nexus_structure(
+        entry, create_streams(),
+        {f'{DETECTOR}/detector_number': detector_number})
+
+    assert structure['name'] == 'entry'
+    assert structure['type'] == 'group'
+    assert structure['attributes'] == [{'name': 'NX_class',
+                                        'values': 'NXentry'}]
+    detector = find_child(find_child(structure, 'instrument'),
+                          'multiblade_detector')
+    # Values come from memory, not from the zeros in the file
+    assert find_child(detector, 'detector_number') == {
+        'module': 'dataset',
+        'config': {'name': 'detector_number', 'values': [1, 2, 3],
+                   'type': 'int32'}}
+    event_data = find_child(detector, 'event_data')
+    assert event_data['children'] == [create_streams()[f'{DETECTOR}/event_data']]
+    assert event_data['attributes'] == [{'name': 'NX_class',
+                                         'values': 'NXevent_data'}]
+
+
+def test_entry_placeholders_overwrite_existing_datasets(entry, tmp_path):
+    entry['start_time'] = 'yesterday'
+    add_entry_placeholders(entry)
+    add_entry_placeholders(entry)
+    assert entry['start_time'][()] == b'8601TIME'
+    assert entry['title'][()] == b'TITLE'
+
+    json_file = tmp_path / 'amor.json'
+    write_to_json_file(entry, str(json_file), create_streams(), {})
+    with open(json_file) as file:
+        structure = json.load(file)['children'][0]
+    assert find_child(structure, 'start_time')['config'] == {
+        'name': 'start_time', 'values': '8601TIME', 'type': 'string'}
+    assert find_child(structure, 'title')['config'] == {
+        'name': 'title', 'values': 'TITLE', 'type': 'string'}
@@ -0,0 +1,23 @@
+import numpy as np
+
+from examples.bifrost.detector_geometry import add_global_rotation_and_offset, \
+    generate_triplet_specs, local_bank_offsets
+from examples.bifrost.triplet_specifications import NUMBER_OF_TUBES_PER_BANK, \
+    PIXEL_RESOLUTION_PER_TUBE
+from examples.utils.transformations import rotate, rotation_matrix
+
+
+def test_batched_offsets_match_per_triplet_offsets():
+    local_offsets = local_bank_offsets()
+    assert local_offsets.shape == \
+        (NUMBER_OF_TUBES_PER_BANK * PIXEL_RESOLUTION_PER_TUBE, 3)
+    triplet_specs = generate_triplet_specs()
+    offsets = add_global_rotation_and_offset(local_offsets, triplet_specs)
+    assert offsets.shape == (len(triplet_specs) * len(local_offsets), 3)
+    for triplet_offsets, specs in zip(
+            np.split(offsets, len(triplet_specs)), triplet_specs.values()):
+        expected = rotate(rotate(local_offsets, rotation_matrix('x', 90)) +
+                          specs['position'],
+                          rotation_matrix('y', specs['rotation'],
+                                          degrees=False))
+        assert np.allclose(triplet_offsets, expected, rtol=0, atol=1e-15)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from examples.utils.block_assembly import BlockAssembler
+
+
+def build_block(block_index, value):
+    return {'vertices': np.full((4, 3), value),
+            'ids': np.arange(2) + 2 * block_index}
+
+
+@pytest.mark.parametrize('max_workers', [1, None])
+def test_blocks_match_vstack(max_workers, tmp_path):
+    values = [1.5, -2.0, 7.0]
+    assembler = BlockAssembler(len(values), {'vertices': (4, 3), 'ids': (2,)},
+                               dtypes={'ids': np.int32},
+                               directory=str(tmp_path))
+    arrays = assembler.assemble(build_block, values, max_workers=max_workers)
+    blocks = [build_block(index, value) for index, value in enumerate(values)]
+    assert np.array_equal(arrays['vertices'],
+                          np.vstack([block['vertices'] for block in blocks]))
+    assert np.array_equal(arrays['ids'],
+                          np.hstack([block['ids'] for block in blocks]))
+    assert arrays['ids'].dtype == np.int32
+    assert np.array_equal(np.load(tmp_path / 'ids.npy'), arrays['ids'])
+
+
+def test_wrong_number_of_blocks():
+    assembler = BlockAssembler(2, {'vertices': (4, 3)})
+    with pytest.raises(ValueError):
+        assembler.assemble(build_block, [1.0])
@@ -0,0 +1,71 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from examples.cspec.cspec_geometry import NUMBER_OF_GRIDS, VOXEL_FACES, \
+    VOXEL_VERTEX_OFFSETS, X_SIZE, Y_SIZE, Z_SIZE, create_geometry, \
+    load_voxel_table, write_geometry_to_nexus
+
+CSPEC_DIR = os.path.join(os.path.dirname(__file__), '..', 'cspec')
+
+
+@pytest.fixture(scope='module')
+def table():
+    return load_voxel_table()
+
+
+def test_voxel_vertices(table):
+    geometry = create_geometry(table)
+    number_of_voxels = NUMBER_OF_GRIDS * len(table.location)
+    assert geometry.vertices.shape == (8 * number_of_voxels, 3)
+    assert geometry.pixel_ids.tolist() == list(range(1, number_of_voxels + 1))
+    voxel = len(table.location) * 3 + 5
+    x, y, z = table.location[5]
+    y += Y_SIZE * 3
+    expected = [[x - X_SIZE, y, z + Z_SIZE],
+                [x, y, z + Z_SIZE],
+                [x - X_SIZE, y + Y_SIZE, z + Z_SIZE],
+                [x, y + Y_SIZE, z + Z_SIZE],
+                [x - X_SIZE, y + Y_SIZE, z],
+                [x, y + Y_SIZE, z],
+                [x - X_SIZE, y, z],
+                [x, y, z]]
+    assert np.array_equal(geometry.vertices[8 * voxel:8 * voxel + 8],
+                          expected)
+    assert np.array_equal(geometry.locations[voxel], [x, y, z])
+
+
+def test_xlsx_table_matches_csv_table(table, tmp_path):
+    pytest.importorskip('openpyxl')
+    xlsx_file = os.path.join(CSPEC_DIR, 'CSPEC_LET_Geometry.xlsx')
+    xlsx_table = load_voxel_table(xlsx_file, cache_dir=str(tmp_path))
+    assert list(tmp_path.iterdir())
+    first_grid = xlsx_table.grid == 'Grid_1'
+    assert np.array_equal(xlsx_table.origin, table.origin)
+    assert np.array_equal(xlsx_table.location[first_grid], table.location)
+    assert np.array_equal(xlsx_table.voxel[first_grid], table.voxel)
+
+
+def test_nexus_geometry_matches_arrays(table):
+    geometry = create_geometry(table, number_of_grids=2)
+    with h5py.File('cspec.nxs', 'w', driver='core',
+                   backing_store=False) as nexus_file:
+        detector_group = nexus_file.create_group('detector')
+        write_geometry_to_nexus(detector_group, geometry)
+        assert np.array_equal(detector_group['y_pixel_offset'][()],
+                              geometry.locations[:, 1])
+        shape_group = detector_group['detector_shape']
+        winding_order = shape_group['winding_order'][()]
+        faces = shape_group['faces'][()]
+        vertices = shape_group['vertices'][()]
+        detector_faces = shape_group['detector_faces'][()]
+        assert len(faces) == len(VOXEL_FACES) * len(geometry.pixel_ids)
+        # Every face of a pixel only uses the vertices of that pixel
+        for face, pixel_id in detector_faces[::7]:
+            face_vertices = winding_order[faces[face]:faces[face] + 4]
+            assert np.all(face_vertices // 8 == pixel_id - 1)
+            assert np.allclose(vertices[face_vertices] -
+                               geometry.locations[pixel_id - 1],
+                               VOXEL_VERTEX_OFFSETS[face_vertices % 8])
@@ -0,0 +1,93 @@
+#
+# The DREAM mantle IDF generator against the line-by-line reader and
+# per-voxel writer it replaced, on a small synthetic OFF file.
+
+import io
+
+import numpy as np
+import pytest
+
+from examples.dream.DREAMMantle_generateIDF import GenerateDREAMIDF, read_off
+from examples.dream.load_dream_off import read_off_with_vstack
+
+NUMBER_OF_VOXELS = 5
+VERTICES_PER_VOXEL = 8
+
+
+def write_segment_by_row(file, vertices, centers):
+    """
+    The previous GenerateDREAMIDF._write_segment, which formats one value at
+    a time
+    """
+    num_vert = VERTICES_PER_VOXEL
+    xi = np.round(vertices[:, 0], 3)
+    yi = np.round(vertices[:, 1], 3)
+    zi = np.round(vertices[:, 2], 3)
+    points = (('left-back-bottom-point ', 4), ('left-front-bottom-point  ', 0),
+              ('right-front-bottom-point  ', 1), ('right-back-bottom-point  ', 5),
+              ('left-back-top-point ', 6), ('left-front-top-point  ', 2),
+              ('right-front-top-point  ', 3), ('right-back-top-point  ', 7))
+    for count_vox, ii in enumerate(range(0, vertices.size // 3, num_vert), 1):
+        file.write("<type name=\"Voxel" + str(count_vox) +
+                   "\" is=\"detector\">\n")
+        file.write("\t<hexahedron id=\"shape\">\n")
+        for point, index in points:
+            file.write("\t\t<" + point + "x=\"" + str(xi[ii + index]) +
+                       "\" y=\"" + str(yi[ii + index]) +
+                       "\" z=\"" + str(zi[ii + index]) + "\"  />\n")
+        file.write("\t</hexahedron>\n")
+        file.write("\t<algebra val=\"shape\" />\n")
+        file.write("\t<bounding-box>\n")
+        for axis, values in (('x', xi), ('y', yi), ('z', zi)):
+            file.write("\t\t<" + axis + "-min val=\"" +
+                       str(np.min(values[ii:ii + 7])) + "\" />\n")
+            file.write("\t\t<" + axis + "-max val=\"" +
+                       str(np.max(values[ii:ii + 7])) + "\" />\n")
+        file.write("\t</bounding-box>\n")
+        file.write("</type>\n\n")
+
+    file.write("<type name=\"Segment\">\n")
+    for jj in range(len(centers)):
+        file.write("\t<component type=\"Voxel" + str(jj + 1) + "\">\n")
+        file.write("\t\t<location x=\"" + str(centers[jj, 0]) +
+                   "\" y=\"" + str(centers[jj, 1]) +
+                   "\" z=\"" + str(centers[jj, 2]) +
+                   "\" name=\"Voxel" + str(jj + 1) + "\" ></location>\n")
+        file.write("\t</component>\n")
+    file.write("</type>\n\n")
+
+
+@pytest.fixture
+def off_file(tmp_path):
+    rng = np.random.default_rng(7)
+    vertices = rng.normal(scale=0.5, size=(NUMBER_OF_VOXELS * VERTICES_PER_VOXEL, 3))
+    centers = np.column_stack((rng.normal(scale=0.5, size=(NUMBER_OF_VOXELS, 3)),
+                               np.arange(NUMBER_OF_VOXELS)))
+    file_name = tmp_path / 'mantle.off'
+    with open(file_name, 'w') as f:
+        f.write('OFF\n# synthetic DREAM mantle voxels\n')
+        f.write(f'{len(vertices)} {len(centers)} 0\n')
+        for row in vertices:
+            f.write(' '.join(repr(value) for value in row.tolist()) + '\n')
+        for row in centers:
+            f.write(' '.join(repr(value) for value in row.tolist()) + '\n')
+    return str(file_name)
+
+
+def test_read_off_matches_vstack_parser(off_file):
+    vertices, centers = read_off(off_file)
+    previous_vertices, previous_centers = read_off_with_vstack(off_file)
+    assert vertices.shape == (NUMBER_OF_VOXELS * VERTICES_PER_VOXEL, 3)
+    assert np.array_equal(vertices, previous_vertices)
+    assert np.array_equal(centers, previous_centers)
+
+
+def test_segment_matches_per_row_formatter(off_file):
+    vertices, centers = read_off(off_file)
+    generator = GenerateDREAMIDF('unused.xml', vertices, centers, 1)
+    generator._voxels_per_write = 2  # exercise more than one chunk
+    generator.fileHandle = io.StringIO()
+    generator._write_segment()
+    expected = io.StringIO()
+    write_segment_by_row(expected, vertices, centers)
+    assert generator.fileHandle.getvalue() == expected.getvalue()
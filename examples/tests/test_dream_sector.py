@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from examples.dream.dream import create_sector, find_voxel_vertices, \
+    sumo_number_to_angle, sumo_number_to_translation
+
+LOOKUP_TABLE = os.path.join(os.path.dirname(__file__), '..', 'dream',
+                            'LookupTableDreamEndCap_noRRT.txt')
+COLUMNS = ['sumo', 'sect-seg', 'strip', 'wire', 'counter', 'x_centre',
+           'y_centre', 'z_centre', 'x1', 'x2', 'y1', 'y2', 'z']
+
+
+def _rotation(axis, angle_degrees):
+    angle = np.deg2rad(angle_degrees)
+    cos, sin = np.cos(angle), np.sin(angle)
+    return {'x': np.array([[1, 0, 0], [0, cos, -sin], [0, sin, cos]]),
+            'y': np.array([[cos, 0, sin], [0, 1, 0], [-sin, 0, cos]]),
+            'z': np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]])}[axis]
+
+
+def _reference_sector(geant_df, z_rotation_angle):
+    # The vertex by vertex construction that create_sector replaces
+    vertices, centres = [], []
+    for voxel in range(len(geant_df.index)):
+        row = geant_df.iloc[voxel]
+        voxel_position = row[['x_centre', 'y_centre', 'z_centre']].to_numpy(
+            dtype=float)
+        voxel_vertices = []
+        for vertex in find_voxel_vertices(row['z'] / 2, 0.0, 0.0,
+                                          row['y2'] / 2, row['x1'] / 2,
+                                          row['x1'] / 2, 0.0, row['y1'] / 2,
+                                          row['x2'] / 2, row['x2'] / 2, 0.0):
+            vertex = _rotation('y', -10).dot(vertex + voxel_position)
+            vertex = _rotation('x', sumo_number_to_angle[row['sumo']]).dot(
+                vertex)
+            vertex = vertex + sumo_number_to_translation[row['sumo']]
+            voxel_vertices.append(_rotation('z', z_rotation_angle).dot(vertex))
+        voxel_vertices = np.array(voxel_vertices)
+        vertices.extend(voxel_vertices)
+        centres.append([np.mean(voxel_vertices[:, axis].copy())
+                        for axis in range(3)])
+    return np.array(vertices), np.array(centres)
+
+
+@pytest.mark.parametrize('z_rotation_angle', [-138.0, 0.0, 25.09])
+def test_sector_matches_voxel_by_voxel_reference(z_rotation_angle):
+    geant_df = pd.read_csv(LOOKUP_TABLE, sep=r'\s+', header=None,
+                           names=COLUMNS)
+    # A few voxels of every SUMO
+    geant_df = geant_df.groupby('sumo').head(5).reset_index(drop=True)
+    vertices, x_centres, y_centres, z_centres = create_sector(
+        geant_df, z_rotation_angle)
+    expected, centres = _reference_sector(geant_df, z_rotation_angle)
+    assert vertices.shape == (8 * len(geant_df.index), 3)
+    assert np.array_equal(vertices, expected)
+    assert np.array_equal(np.column_stack((x_centres, y_centres, z_centres)),
+                          centres)
@@ -0,0 +1,55 @@
+import pytest
+
+from examples.utils.json_subtree import SubtreeTemplate
+
+
+@pytest.fixture
+def component():
+    return {
+        "name": "analyzer_2",
+        "type": "group",
+        "children": [
+            {"module": "dataset",
+             "config": {"name": "depends_on",
+                        "values": "/entry/instrument/analyzer_2/"
+                                  "transformations/rotation"}},
+            {"name": "transformations",
+             "type": "group",
+             "children": [
+                 {"module": "dataset",
+                  "config": {"name": "rotation", "values": -30.0},
+                  "attributes": [
+                      {"name": "depends_on",
+                       "values": "/entry/instrument/analyzer_1/"
+                                 "transformations/distance"},
+                      {"name": "vector", "values": [0.0, 1.0, 0.0]}]},
+                 {"module": "dataset",
+                  "config": {"name": "distance", "values": -30}}]}]}
+
+
+def test_clone_rewrites_only_the_sites(component):
+    template = SubtreeTemplate(
+        component,
+        substrings={"path": "/entry/instrument/analyzer_2",
+                    "depends_on": "/entry/instrument/analyzer_1/"},
+        values={"rotation": -30.0})
+    clone = template.clone(path="/entry/instrument/analyzer_7",
+                           depends_on="/entry/instrument/analyzer_6/",
+                           rotation=12.5)
+    assert clone["children"][0]["config"]["values"] == \
+        "/entry/instrument/analyzer_7/transformations/rotation"
+    rotation, distance = clone["children"][1]["children"]
+    assert rotation["config"]["values"] == 12.5
+    assert rotation["attributes"][0]["values"] == \
+        "/entry/instrument/analyzer_6/transformations/distance"
+    # Only values of the same type are rewritten
+    assert distance["config"]["values"] == -30
+    # The template and its source are left unchanged
+    assert template.clone() == component
+    assert clone["children"][1]["children"][0]["attributes"][1] is not \
+        component["children"][1]["children"][0]["attributes"][1]
+
+
+def test_unknown_parameter(component):
+    with pytest.raises(ValueError):
+        SubtreeTemplate(component, values={"rotation": -30.0}).clone(angle=1.0)
@@ -10,11 +10,17 @@
 #    BE AWARE that 2) doesn't appear to be entirely precise and that not
 #    all relevant parameters are defined there
 
+import h5py
+import json
 import numpy as np
 import os
 import pytest
 
-from examples.loki.LOKI_geometry import run_create_geometry
+from examples.loki.LOKI_geometry import run_create_geometry, \
+    write_geometry_files, GEOMETRY_DTYPE, GEOMETRY_COLUMNS, NexusFileBuilder, \
+    DatasetPolicy, LOKI_DATASET_POLICIES, JsonConfigTranslator, Tube, \
+    DetectorAlignment, expand_compact_pixel_geometry, get_first_ids, \
+    GeometryCache, StreamedGroups, imap_banks, Bank
 from examples.loki.detector_banks_geo import STRAW_RESOLUTION, \
     NUM_STRAWS_PER_TUBE, TUBE_DEPTH, det_banks_data, NUM_BANKS
 from examples.utils.detector_geometry_from_json import BaseDetectorGeometry
@@ -88,12 +94,16 @@ class LokiGeometry(BaseDetectorGeometry):
 
 # TODO: create geometry
 @pytest.fixture(scope='session')
-def geom():  # formerly known as loki_geometry
+def geom(tmp_path_factory):  # formerly known as loki_geometry
     json_file_name = 'config_loki.json'
     file_dir = os.path.dirname(os.path.abspath(__file__))
     script_dir = os.path.join(file_dir, '..', 'loki')
     json_file_path = os.path.join(script_dir, json_file_name)
-    run_create_geometry()
+    # LOKI_GEOMETRY_CACHE_DIR keeps the geometry cache between sessions, its
+    # keys change with the geometry code so stale banks are never reused.
+    cache_dir = os.environ.get('LOKI_GEOMETRY_CACHE_DIR') or \
+        str(tmp_path_factory.mktemp('loki_geometry'))
+    run_create_geometry(cache_dir)
     return LokiGeometry(json_file_path)
 
 
@@ -275,3 +285,250 @@ def test_angle_of_tubes(geom, bank = 0):
             c2 = geom.p2c(pix2)
             dz = np.abs(c2 - c1)[2]
             assert geom.expect(dz, tt_z_dist, tt_z_precision)
+
+
+# Detector numbers of all banks form one contiguous range starting at 1
+def test_detector_numbers_contiguous(geom):
+    num_pixels = sum(det_banks_data[bank]['num_tubes']
+                     for bank in range(NUM_BANKS)) \
+                 * NUM_STRAWS_PER_TUBE * STRAW_RESOLUTION
+    assert sorted(geom.id_dict) == list(range(1, num_pixels + 1))
+
+
+def test_write_geometry_files(tmp_path):
+    data = np.zeros(3, dtype=GEOMETRY_DTYPE)
+    data['pixel_id'] = [1, 2, 3]
+    data['x'] = [0.1, 0.2, 0.3]
+    file_name = str(tmp_path / 'detector_geometry')
+    write_geometry_files(data, file_name, file_formats=('csv', 'npy'))
+    assert np.array_equal(np.load(file_name + '.npy'), data)
+    with open(file_name + '.csv') as csv_file:
+        lines = csv_file.read().splitlines()
+    assert lines[0] == ','.join(GEOMETRY_COLUMNS)
+    assert lines[1] == '0,0,0,0,1,0.1,0.0,0.0'
+    with pytest.raises(ValueError):
+        write_geometry_files(data, file_name, file_formats=('xlsx',))
+
+
+def test_nexus_file_builder_streamed_group(tmp_path):
+    file_name = str(tmp_path / 'streamed.nxs')
+    detector = {'values': {'x_pixel_offset': {'values': np.arange(10.),
+                                              'attributes': {'units': 'm'}}},
+                'attributes': {'NX_class': 'NXdetector'}}
+    data = {'entry': {'values': {'instrument': {
+        'values': {'detectors': StreamedGroups()},
+        'attributes': {'NX_class': 'NXinstrument'}}},
+        'attributes': {'NX_class': 'NXentry'}}}
+    builder = NexusFileBuilder(filename=file_name)
+    builder.write_group('/entry/instrument', 'detector_0', detector)
+    with pytest.raises(ValueError):
+        builder.write_group('/entry/instrument', 'detector_0', detector)
+    builder.data_struct = data
+    builder.construct_nxs_file()
+    with h5py.File(file_name, 'r') as nxs_file:
+        offsets = nxs_file['entry/instrument/detector_0/x_pixel_offset']
+        assert offsets.compression is None
+        assert np.array_equal(offsets[()], np.arange(10.))
+        assert offsets.attrs['units'] == 'm'
+        assert nxs_file['entry'].attrs['NX_class'] == 'NXentry'
+
+
+def test_nexus_file_builder_creates_groups_once(tmp_path):
+    detector = {'values': {'x_pixel_offset': {'values': np.arange(10.),
+                                              'attributes': {}}},
+                'attributes': {}}
+    builder = NexusFileBuilder(filename=str(tmp_path / 'twice.nxs'))
+    builder.write_group('/entry/instrument', 'detector_0', detector)
+    builder.data_struct = {'entry': {'values': {'instrument': {
+        'values': {'detector_0': detector}, 'attributes': {}}},
+        'attributes': {}}}
+    with pytest.raises(ValueError):
+        builder.construct_nxs_file()
+    builder.hf5_file.close()
+
+
+def test_dataset_policy_narrowing(tmp_path):
+    policy = DatasetPolicy('*/detector_number', dtype=np.uint32)
+    assert policy.matches('/entry/detector_0/detector_number', np.arange(3))
+    assert not policy.matches('/entry/detector_0/x_pixel_offset', np.arange(3))
+    assert policy.get_dtype(np.arange(3)) == np.uint32
+    assert policy.get_dtype(np.arange(-1, 2, dtype=np.int64)) == np.int64
+    assert policy.get_dtype(np.array([2 ** 32], dtype=np.int64)) == np.int64
+
+    file_name = str(tmp_path / 'policies.nxs')
+    offsets = np.linspace(0, 1, 100)
+    data = {'detector_0': {
+        'values': {'detector_number': {'values': np.arange(1, 101),
+                                       'attributes': None},
+                   'x_pixel_offset': {'values': offsets,
+                                      'attributes': None}},
+        'attributes': None}}
+    builder = NexusFileBuilder(data, filename=file_name,
+                               dataset_policies=LOKI_DATASET_POLICIES,
+                               time_plain_writes=True)
+    builder.construct_nxs_file()
+    assert len(builder.dataset_reports) == 2
+    for report in builder.dataset_reports:
+        assert report.saved_write_time == \
+            report.plain_write_time - report.write_time
+    with h5py.File(file_name, 'r') as nxs_file:
+        assert nxs_file['detector_0/detector_number'].dtype == np.uint32
+        assert nxs_file['detector_0/x_pixel_offset'].dtype == np.float32
+        assert nxs_file['detector_0/x_pixel_offset'].shuffle
+        assert np.allclose(nxs_file['detector_0/x_pixel_offset'][()], offsets)
+
+
+def test_json_translator_streams_arrays(tmp_path):
+    json_file_name = str(tmp_path / 'config.json')
+    offsets = np.random.default_rng(1).random(100_000) - 0.5
+    offsets[3] = np.nan
+    entry = {'entry': {'values': {
+        'detector_number': {'values': np.arange(1, 100_001),
+                            'attributes': None},
+        'x_pixel_offset': {'values': offsets, 'attributes': {'units': 'm'}},
+        'name': {'values': 'loki', 'attributes': None}},
+        'attributes': {'NX_class': 'NXentry'}}}
+    translator = JsonConfigTranslator(entry, json_filename=json_file_name)
+    translator.translate()
+    translator.save_to_json()
+    with open(json_file_name) as json_file:
+        content = json_file.read()
+    expected = json.loads(content)
+    datasets = {child['config']['name']: child['config']
+                for child in expected['children'][0]['children']}
+    assert datasets['detector_number']['type'] == 'int32'
+    assert datasets['detector_number']['values'] == list(range(1, 100_001))
+    assert datasets['x_pixel_offset']['type'] == 'float'
+    assert np.array_equal(datasets['x_pixel_offset']['values'], offsets,
+                          equal_nan=True)
+    assert content == json.dumps(expected, separators=(',', ':'))
+
+
+def test_streamed_groups_are_written_one_at_a_time(tmp_path):
+    def detector(number):
+        return {'values': {'detector_number': {'values': np.arange(number, 9),
+                                               'attributes': None}},
+                'attributes': {'NX_class': 'NXdetector'}}
+
+    def get_instrument(detectors):
+        return {'instrument': {'values': dict(detectors, source={
+            'values': 'source', 'attributes': None}),
+            'attributes': {'NX_class': 'NXinstrument'}}}
+
+    streamed = get_instrument({'detectors': StreamedGroups()})
+    translator = JsonConfigTranslator(
+        streamed, json_filename=str(tmp_path / 'streamed.json'))
+    translator.translate()
+    with translator.open_json() as json_writer:
+        for number in range(3):
+            json_writer.write_group(f'detector_{number}', detector(number))
+    translator = JsonConfigTranslator(
+        get_instrument({f'detector_{number}': detector(number)
+                        for number in range(3)}),
+        json_filename=str(tmp_path / 'config.json'))
+    translator.translate()
+    translator.save_to_json()
+    assert (tmp_path / 'streamed.json').read_text() == \
+        (tmp_path / 'config.json').read_text()
+
+    # Streamed groups are left to write_group in the nexus file
+    builder = NexusFileBuilder(streamed, filename=str(tmp_path / 'streamed'))
+    builder.construct_nxs_file()
+    with h5py.File(tmp_path / 'streamed.nxs', 'r') as nxs_file:
+        assert list(nxs_file['instrument']) == ['source']
+
+
+def test_imap_banks_keeps_order():
+    assert list(imap_banks(abs, [-3, 1, -2], max_workers=2)) == [3, 1, 2]
+    assert list(imap_banks(abs, [-3, 1, -2], max_workers=1)) == [3, 1, 2]
+
+
+def test_compact_pixel_geometry_expands_to_full(tmp_path):
+    tube = Tube((0., 0., 0.), (1., 0., 0.), DetectorAlignment.HORIZONTAL)
+    tube.set_xyz_offsets([np.array([0., tt_il_dist * i, 0.])
+                          for i in range(3)])
+    tube.populate_with_uniform_straws(0, np.array([0., 0., tt_z_dist]),
+                                      np.array([0., tt_il_dist, 0.]))
+    full = tube.get_geometry_data(first_pixel_id=1)
+    compact = tube.get_geometry_data(first_pixel_id=1, compact=True)
+
+    json_file_name = str(tmp_path / 'compact.json')
+    translator = JsonConfigTranslator(
+        {'detector': {'values': compact,
+                      'attributes': {'NX_class': 'NXdetector'}}},
+        json_filename=json_file_name)
+    translator.translate()
+    translator.save_to_json()
+    with open(json_file_name) as json_file:
+        detector_json = json.load(json_file)['children'][0]
+    # Only NeXus fields are in the detector group itself
+    assert [child['name'] for child in detector_json['children']] == \
+        ['pixel_shape', 'compact_pixel_geometry']
+    assert detector_json['children'][1]['attributes'] == \
+        [{'name': 'NX_class', 'values': 'NXcollection'}]
+    expanded = expand_compact_pixel_geometry(detector_json)
+
+    assert np.array_equal(expanded['detector_number'],
+                          full['detector_number']['values'])
+    for axis in 'xyz':
+        name = f'{axis}_pixel_offset'
+        assert np.array_equal(expanded[name], full[name]['values'])
+
+
+# Pixel and straw id ranges are computed up front so banks can be built
+# independently, they have to agree with the ICD numbering
+def test_first_ids_follow_icd():
+    icd = ICDGeometry(det_banks_data)
+    first_ids = get_first_ids(det_banks_data)
+    for bank in range(NUM_BANKS):
+        first_pixel_id, first_straw_id = first_ids[bank]
+        assert first_pixel_id == icd.pixel(bank, 0, 0, 0)
+        assert first_straw_id == icd.straw(bank, 0, 0)
+
+
+def test_geometry_cache_eviction(tmp_path):
+    cache = GeometryCache(str(tmp_path), max_size=3000)
+    key_0 = GeometryCache.get_key(det_banks_data[0], 0)
+    key_1 = GeometryCache.get_key(det_banks_data[1], 1)
+    assert key_0 != key_1
+    assert key_0 == GeometryCache.get_key(dict(det_banks_data[0]), 0)
+    assert cache.load(key_0) is None
+    offsets = np.arange(300.)
+    cache.store(key_0, {'pixel_offsets': offsets})
+    assert np.array_equal(cache.load(key_0)['pixel_offsets'], offsets)
+    os.utime(tmp_path / f'{key_0}.npz', (0, 0))
+    # Exceeding max_size evicts the least recently used bank
+    cache.store(key_1, {'pixel_offsets': offsets})
+    assert cache.load(key_0) is None
+    assert cache.load(key_1) is not None
+
+
+def assert_geometry_data_equal(data, expected):
+    if isinstance(expected, dict):
+        assert data.keys() == expected.keys()
+        for key in expected:
+            assert_geometry_data_equal(data[key], expected[key])
+    else:
+        assert np.array_equal(data, expected)
+
+
+def test_geometry_cache_restores_bank(tmp_path, monkeypatch):
+    cache = GeometryCache(str(tmp_path))
+    built_bank = Bank(det_banks_data[1], 1, geometry_cache=cache)
+    built_bank.build_detector_bank()
+    monkeypatch.setattr(Tube, 'populate_with_uniform_straws', None)
+    restored_bank = Bank(det_banks_data[1], 1, geometry_cache=cache)
+    restored_bank.build_detector_bank()
+    assert np.array_equal(restored_bank.compound_data_in_array(),
+                          built_bank.compound_data_in_array())
+    for compact in (False, True):
+        assert_geometry_data_equal(restored_bank.get_geometry_data(compact),
+                                   built_bank.get_geometry_data(compact))
+
+
+def test_geometry_cache_key_follows_code(monkeypatch):
+    key = GeometryCache.get_key(det_banks_data[0], 0)
+    monkeypatch.setattr(
+        'examples.loki.LOKI_geometry.get_geometry_code_hash',
+        lambda: 'changed')
+    assert GeometryCache.get_key(det_banks_data[0], 0) != key
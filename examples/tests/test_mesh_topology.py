@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from examples.utils.mesh_topology import HEXAHEDRON_FACES, OCTAHEDRON_FACES, \
+    OCTAHEDRON_VERTEX_STRIDE, cell_winding_order, detector_faces, \
+    face_starts, grid_quad_winding_order, off_faces
+
+
+@pytest.mark.parametrize('vertex_start_index', [0, 800])
+def test_hexahedron_winding_order(vertex_start_index):
+    number_of_cells = 5
+    winding_order = cell_winding_order(number_of_cells, HEXAHEDRON_FACES,
+                                       vertex_start_index=vertex_start_index)
+    assert winding_order.shape == (6 * number_of_cells, 4)
+    assert winding_order.dtype == np.int32
+    for cell in range(number_of_cells):
+        first_vertex = 8 * cell + vertex_start_index
+        assert np.array_equal(winding_order[6 * cell:6 * cell + 6],
+                              HEXAHEDRON_FACES + first_vertex)
+
+
+def test_octahedra_share_vertices():
+    winding_order = cell_winding_order(3, OCTAHEDRON_FACES,
+                                       OCTAHEDRON_VERTEX_STRIDE)
+    # The bottom vertex of one octahedron is the top vertex of the next one
+    assert winding_order[4:8, 1].tolist() == [5] * 4
+    assert winding_order[8:12, 1].tolist() == [5] * 4
+    assert winding_order.max() == 3 * OCTAHEDRON_VERTEX_STRIDE
+
+
+def test_grid_quad_winding_order():
+    rows, columns = 3, 4
+    winding_order = grid_quad_winding_order(rows, columns)
+    for row in range(rows):
+        for column in range(columns):
+            first_vertex = row * (columns + 1) + column
+            assert winding_order[column + row * columns].tolist() == [
+                first_vertex, first_vertex + columns + 1,
+                first_vertex + columns + 2, first_vertex + 1]
+
+
+def test_faces_and_detector_faces():
+    winding_order = cell_winding_order(2, HEXAHEDRON_FACES)
+    assert face_starts(winding_order).tolist() == list(range(0, 48, 4))
+    off = off_faces(winding_order)
+    assert np.all(off[:, 0] == 4)
+    assert np.array_equal(off[:, 1:], winding_order)
+    face_map = detector_faces(2, 6, first_face_index=12,
+                              detector_numbers=np.array([7, 9]))
+    assert face_map[:, 0].tolist() == list(range(12, 24))
+    assert face_map[:, 1].tolist() == [7] * 6 + [9] * 6
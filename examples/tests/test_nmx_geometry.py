@@ -1,16 +1,23 @@
+import io
 import json
 from pathlib import PurePosixPath
 from itertools import zip_longest
 from math import isclose
 import os
 
+import jinja2
+import numpy as np
 import pytest
 
+from examples.nmx.json_stream import JSONArrays, format_json_array, \
+    iter_json_array
 from examples.nmx.nx_detector import BoxNXDetector
 from examples.nmx.main import render
+from examples.nmx import templates
 
 
 TOLERANCE = 0.00001  # relative tolerance (e.g. 0.00001 = 0.001%)
+NMX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nmx")
 
 
 def assert_all_are_close(iterable_a, iterable_b):
@@ -408,6 +415,97 @@ def test_pixel_offsets_simple_4x2_example_with_gaps(
     assert_all_are_close(expected_z_offsets, detector.get_z_pixel_offsets())
 
 
+def test_pixel_coordinates_match_single_pixel_coordinates():
+    detector = BoxNXDetector(
+        parent=PurePosixPath("/entry/instrument"),
+        name="Detector",
+        instrument_name="nmx",
+        number_of_pixels_x=6,
+        number_of_pixels_y=4,
+        size_z=1.0,
+        channel_pitch_x=1.0,
+        channel_pitch_y=2.1,
+        gap_every_x_pixels=3,
+        gap_every_y_pixels=2,
+        gap_width_x=0.7,
+        gap_width_y=0.5,
+        first_pixel_id=5,
+    )
+    coordinates = detector.pixel_coordinates(detector.get_detector_numbers())
+    assert coordinates.shape == (4, 6, 3)
+    for pixel_id, pixel_coordinates in zip(
+        detector.pixel_ids, coordinates.reshape((-1, 3))
+    ):
+        assert_all_are_close(
+            detector.get_pixel_coordinates(pixel_id), pixel_coordinates
+        )
+    assert_all_are_close(detector.get_x_pixel_offsets(), coordinates[0, :, 0])
+    assert_all_are_close(detector.get_y_pixel_offsets(), coordinates[:, 0, 1])
+    with pytest.raises(AssertionError):
+        detector.pixel_coordinates(np.array([5, detector.last_pixel_id + 1]))
+
+
+def test_format_json_array_matches_jinja_rendering():
+    environment = jinja2.Environment()
+    numbers = np.arange(12).reshape((3, 4))
+    assert format_json_array(numbers) == environment.from_string(
+        "{{ values }}"
+    ).render(values=numbers.tolist())
+    offsets = np.array([-1.25, 0.0, 3.5])
+    assert format_json_array(offsets, "%.6f") == environment.from_string(
+        '[{% for value in values %}{{ "%.6f" | format(value) }}'
+        '{% if not loop.last %}, {% endif %}{% endfor %}]'
+    ).render(values=offsets.tolist())
+
+
+@pytest.mark.parametrize("chunk_values", [1, 5, 2**16])
+def test_chunked_json_array_matches_whole_array(chunk_values):
+    numbers = np.arange(24).reshape((4, 6))
+    offsets = np.linspace(-1.0, 1.0, 7)
+    assert "".join(iter_json_array(numbers, "%d", chunk_values)) == \
+        format_json_array(numbers)
+    assert "".join(iter_json_array(offsets, "%.6f", chunk_values)) == \
+        format_json_array(offsets, "%.6f")
+
+
+def test_streamed_detector_matches_rendered_detector():
+    detector = BoxNXDetector(
+        parent=PurePosixPath("/entry/instrument"),
+        name="Detector",
+        instrument_name="nmx",
+        number_of_pixels_x=6,
+        number_of_pixels_y=4,
+        size_z=1.0,
+        channel_pitch_x=1.0,
+        channel_pitch_y=2.1,
+        gap_every_x_pixels=3,
+        gap_every_y_pixels=2,
+        gap_width_x=0.7,
+        gap_width_y=0.5,
+    ).rotate("orientation", y=90)
+    arrays = JSONArrays()
+    skeleton = detector.to_json(arrays)
+    arrays.validate(skeleton)
+    output = io.StringIO()
+    arrays.write(skeleton, output)
+    assert output.getvalue() == detector.to_json()
+    with pytest.raises(ValueError):
+        arrays.validate(skeleton + skeleton)
+
+
+def test_templates_are_compiled_once(tmp_path):
+    templates.set_bytecode_cache_dir(str(tmp_path))
+    try:
+        environment = templates.get_environment(NMX_DIR)
+        assert templates.get_environment(NMX_DIR + "/") is environment
+        template = environment.get_template("template_NXsample.json.j2")
+        assert environment.get_template("template_NXsample.json.j2") is template
+        assert list(tmp_path.iterdir())
+    finally:
+        templates.set_bytecode_cache_dir(None)
+    assert templates.get_environment(NMX_DIR) is not environment
+
+
 # Test uses a file generated with FACTOR=80, so it is skipped by default
 # Change the factor in main.py if you want to test this.
 @pytest.mark.skip
@@ -0,0 +1,71 @@
+import h5py
+import numpy as np
+import pytest
+
+from examples.common.nxlog_query import NXlogQuery
+from examples.common.nxloghelper import write_example_nxlog
+
+WINDOWS = [(0.0, 0.0), (5.0, 17.5), (3.0, 9.0), (16.0, 40.0), (-5.0, 2.0),
+           (250.0, 10000.0), (12.0, 11.0)]
+
+
+@pytest.fixture
+def nexus_file():
+    with h5py.File('logs.nxs', 'w', driver='core',
+                   backing_store=False) as nexus_file:
+        for seed, name in enumerate(['with_cues', 'without_cues']):
+            write_example_nxlog(nexus_file.create_group(name),
+                                number_of_cues=4, seed=seed, block_size=16)
+        del nexus_file['without_cues/cue_timestamp_zero']
+        del nexus_file['without_cues/cue_index']
+        yield nexus_file
+
+
+def _expected(nexus_file, log_path, start, end):
+    times = nexus_file[log_path]['time'][...]
+    in_window = (start <= times) & (times <= end)
+    return times[in_window], nexus_file[log_path]['value'][...][in_window]
+
+
+@pytest.mark.parametrize('log_path', ['with_cues', 'without_cues'])
+def test_read_window(nexus_file, log_path):
+    query = NXlogQuery(nexus_file)
+    for start, end in WINDOWS:
+        times, values = query.read_window(log_path, start, end)
+        expected_times, expected_values = _expected(nexus_file, log_path,
+                                                    start, end)
+        assert np.array_equal(times, expected_times)
+        assert np.array_equal(values, expected_values)
+
+
+def test_candidate_range_from_cues_contains_window(nexus_file):
+    query = NXlogQuery(nexus_file)
+    times = nexus_file['with_cues/time'][...]
+    cue_indices = query.cues('with_cues')[1]
+    first, stop = query.candidate_range('with_cues', 5.0, 17.5)
+    assert first in cue_indices
+    assert np.all(times[:first] < 5.0)
+    assert np.all(times[stop:] > 17.5)
+    assert query.cues('without_cues') is None
+
+
+def test_read_windows_across_logs(nexus_file):
+    query = NXlogQuery(nexus_file)
+    windows = [(log_path, start, end) for start, end in WINDOWS
+               for log_path in ['with_cues', 'without_cues']]
+    for window, (times, values) in zip(windows, query.read_windows(windows)):
+        expected_times, expected_values = _expected(nexus_file, *window)
+        assert np.array_equal(times, expected_times)
+        assert np.array_equal(values, expected_values)
+
+
+def test_window_starting_on_cue_timestamp(nexus_file):
+    # The last samples of the first cue share the timestamp of the second
+    log = nexus_file.create_group('repeated')
+    log['time'] = np.array([0, 1, 2, 2, 2, 3, 4], dtype='float32')
+    log['value'] = np.arange(7, dtype='float32')
+    log['cue_timestamp_zero'] = np.array([0, 2], dtype='float32')
+    log['cue_index'] = np.array([0, 4], dtype='int32')
+    times, values = NXlogQuery(nexus_file).read_window('repeated', 2.0, 2.5)
+    assert times.tolist() == [2, 2, 2]
+    assert values.tolist() == [2, 3, 4]
@@ -0,0 +1,41 @@
+import h5py
+import numpy as np
+import pytest
+
+from examples.common.nxloghelper import write_example_nxlog
+
+
+def _write_log(file_name, **kwargs):
+    nexus_file = h5py.File(file_name, 'w', driver='core', backing_store=False)
+    write_example_nxlog(nexus_file.create_group('log'), start='2024-01-01',
+                        **kwargs)
+    return nexus_file
+
+
+@pytest.mark.parametrize('block_size', [97, 2**20])
+def test_example_nxlog_is_consistent(block_size):
+    number_of_cues = 12
+    with _write_log('log.nxs', number_of_cues=number_of_cues, seed=3,
+                    block_size=block_size) as nexus_file:
+        log = nexus_file['log']
+        times = log['time'][()]
+        values = log['value'][()]
+        cue_timestamps = log['cue_timestamp_zero'][()]
+        cue_indices = log['cue_index'][()]
+        assert log['time'].maxshape == (None,)
+        assert log['value'].attrs['units'] == b'cubits'
+    assert len(times) == len(values)
+    assert len(cue_indices) == number_of_cues
+    assert cue_indices[0] == 0
+    assert np.all(np.diff(cue_indices) >= number_of_cues * 10)
+    assert np.all(np.diff(times) >= 0)
+    assert np.all(np.diff(values) >= 0)
+    assert np.all(times[cue_indices] >= cue_timestamps)
+    assert values[0] >= np.float32(0.21)
+
+
+def test_example_nxlog_does_not_depend_on_block_size():
+    with _write_log('a.nxs', number_of_cues=5, seed=7, block_size=10) as a, \
+            _write_log('b.nxs', number_of_cues=5, seed=7) as b:
+        for name in ('time', 'value', 'cue_timestamp_zero', 'cue_index'):
+            assert np.array_equal(a['log'][name][()], b['log'][name][()])
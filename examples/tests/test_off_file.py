@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from examples.utils.mesh_topology import HEXAHEDRON_FACES, cell_winding_order, \
+    off_faces
+from examples.utils.off_file import write_off_file
+
+
+@pytest.fixture
+def mesh():
+    vertices = np.random.default_rng(3).normal(scale=1e3, size=(40, 3))
+    faces = off_faces(cell_winding_order(5, HEXAHEDRON_FACES))
+    return vertices, faces
+
+
+@pytest.mark.parametrize('chunk_rows', [7, 2**16])
+def test_ascii_off_file(mesh, tmp_path, chunk_rows):
+    vertices, faces = mesh
+    filename = tmp_path / 'mesh.off'
+    write_off_file(str(filename), vertices, faces, comment='test mesh',
+                   chunk_rows=chunk_rows)
+    lines = filename.read_text().splitlines()
+    assert lines[:3] == ['OFF', '# test mesh', f'{len(vertices)} {len(faces)} 0']
+    assert np.array_equal(np.loadtxt(lines[3:3 + len(vertices)]), vertices)
+    assert np.array_equal(np.loadtxt(lines[3 + len(vertices):], dtype=int),
+                          faces)
+
+
+def test_binary_off_file(mesh, tmp_path):
+    vertices, faces = mesh
+    filename = tmp_path / 'mesh.off'
+    write_off_file(str(filename), vertices, faces, binary=True, chunk_rows=7)
+    with open(filename, 'rb') as f:
+        assert f.readline() == b'OFF BINARY\n'
+        counts = np.fromfile(f, dtype='>i4', count=3)
+        read_vertices = np.fromfile(f, dtype='>f4', count=3 * len(vertices))
+        read_faces = np.fromfile(f, dtype='>i4')
+    assert counts.tolist() == [len(vertices), len(faces), 0]
+    assert np.allclose(read_vertices.reshape((-1, 3)), vertices, rtol=1e-6)
+    read_faces = read_faces.reshape((len(faces), -1))
+    assert np.array_equal(read_faces[:, :-1], faces)
+    assert np.all(read_faces[:, -1] == 0)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from examples.utils.transformations import apply_transform, \
+    compose_transforms, rotate, rotation_matrix, rotation_transform, \
+    translation_transform
+
+
+@pytest.mark.parametrize('axis', ['x', 'y', 'z'])
+def test_batched_rotation_matches_single_rotations(axis):
+    vectors = np.random.default_rng(1).normal(size=(20, 3))
+    angles = np.array([-138.0, -10.0, 0.0, 23.0, 90.0])
+    rotated = rotate(vectors, rotation_matrix(axis, angles))
+    assert rotated.shape == (len(angles), len(vectors), 3)
+    for angle, rotated_vectors in zip(angles, rotated):
+        matrix = rotation_matrix(axis, angle)
+        for vector, rotated_vector in zip(vectors, rotated_vectors):
+            assert np.allclose(matrix.dot(vector), rotated_vector)
+
+
+def test_composed_transforms_apply_in_order():
+    vectors = np.random.default_rng(2).normal(size=(20, 3))
+    transform = compose_transforms(rotation_transform('x', -5.0),
+                                   translation_transform([0.0, 0.0, 4.0]),
+                                   rotation_transform('z', 30.0))
+    expected = rotate(rotate(vectors, rotation_matrix('x', -5.0)) +
+                      [0.0, 0.0, 4.0], rotation_matrix('z', 30.0))
+    assert np.allclose(apply_transform(transform, vectors), expected)
+    assert np.allclose(apply_transform(transform, vectors[0]), expected[0])
+
+
+def test_unknown_rotation_axis():
+    with pytest.raises(ValueError):
+        rotation_matrix('w', 10.0)
+
+
+def test_stacked_transforms_compose_per_angle():
+    vectors = np.random.default_rng(3).normal(size=(10, 3))
+    angles = np.array([0.0, 0.1448, 0.2896])
+    transforms = compose_transforms(translation_transform([0.0, 0.0, 4.0]),
+                                    rotation_transform('x', angles))
+    positioned = apply_transform(transforms, vectors)
+    assert positioned.shape == (len(angles), len(vectors), 3)
+    for angle, positioned_vectors in zip(angles, positioned):
+        transform = compose_transforms(translation_transform([0.0, 0.0, 4.0]),
+                                       rotation_transform('x', angle))
+        assert np.allclose(apply_transform(transform, vectors),
+                           positioned_vectors)
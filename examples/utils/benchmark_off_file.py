@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from examples.utils.mesh_topology import HEXAHEDRON_FACES, cell_winding_order, \
+    off_faces
+from examples.utils.off_file import write_off_file
+
+"""
+Compares the throughput of the OFF writers on a mesh of hexahedral voxels
+the size of the DREAM endcap
+"""
+
+
+def write_off_file_with_pandas(filename: str, vertices: np.ndarray,
+                               faces: np.ndarray):
+    # The writer the geometry scripts used before examples.utils.off_file
+    with open(filename, "w") as f:
+        f.writelines(("OFF\n", f"{vertices.shape[0]} {faces.shape[0]} 0\n"))
+    with open(filename, "a") as f:
+        pd.DataFrame(vertices).to_csv(f, sep=" ", header=None, index=False)
+    with open(filename, "a") as f:
+        pd.DataFrame(faces).to_csv(f, sep=" ", header=None, index=False)
+
+
+def time_writing_file(name, write_function, filename):
+    start = time.time()
+    write_function(filename)
+    end = time.time()
+    size_mb = os.path.getsize(filename) / 2**20
+    print(f"{name}: {end - start:.2f} s, {size_mb:.1f} MB, "
+          f"{size_mb / (end - start):.1f} MB/s")
+
+
+if __name__ == '__main__':
+    number_of_voxels = 23 * 14336
+    vertices = np.random.default_rng(0).uniform(-1500.0, 1500.0,
+                                                (8 * number_of_voxels, 3))
+    faces = off_faces(cell_winding_order(number_of_voxels, HEXAHEDRON_FACES))
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.off")
+        time_writing_file(
+            "pandas to_csv",
+            lambda name: write_off_file_with_pandas(name, vertices, faces),
+            filename)
+        time_writing_file(
+            "streamed ASCII",
+            lambda name: write_off_file(name, vertices, faces),
+            filename)
+        time_writing_file(
+            "binary",
+            lambda name: write_off_file(name, vertices, faces, binary=True),
+            filename)
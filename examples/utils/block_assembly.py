@@ -0,0 +1,93 @@
+"""
+Assembly of geometry built block by block (detector sectors, blades, ...)
+into preallocated arrays.
+
+Every block contributes arrays of the same shape, so the final arrays can be
+allocated once up front and each block written into its own slice, instead
+of growing the result with np.vstack after every block.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class BlockAssembler:
+    """
+    Preallocates arrays for number_of_blocks blocks, where block_shapes maps
+    the name of each array to the shape it has in a single block. Blocks are
+    stacked along the first axis.
+
+    With a directory given, the arrays are memory-mapped .npy files in it,
+    which keeps full size detectors out of memory.
+    """
+
+    def __init__(self, number_of_blocks: int,
+                 block_shapes: Dict[str, Sequence[int]],
+                 dtypes: Optional[Dict[str, Any]] = None,
+                 directory: Optional[str] = None):
+        self.number_of_blocks = number_of_blocks
+        self.block_shapes = {name: tuple(shape)
+                             for name, shape in block_shapes.items()}
+        dtypes = dtypes if dtypes else {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, block_shape in self.block_shapes.items():
+            shape = (number_of_blocks * block_shape[0],) + block_shape[1:]
+            dtype = dtypes.get(name, np.float64)
+            if directory is None:
+                self.arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                self.arrays[name] = np.lib.format.open_memmap(
+                    os.path.join(directory, f'{name}.npy'), mode='w+',
+                    dtype=dtype, shape=shape)
+
+    def get_block_start(self, name: str, block_index: int) -> int:
+        return block_index * self.block_shapes[name][0]
+
+    def get_block(self, block_index: int) -> Dict[str, np.ndarray]:
+        """
+        Views of the slices of each array that belong to the block.
+        """
+        block = {}
+        for name, block_shape in self.block_shapes.items():
+            start = self.get_block_start(name, block_index)
+            block[name] = self.arrays[name][start:start + block_shape[0]]
+        return block
+
+    def set_block(self, block_index: int, block_arrays: Dict[str, Any]):
+        block = self.get_block(block_index)
+        for name, values in block_arrays.items():
+            block[name][...] = values
+
+    def assemble(self, build_block: Callable[[int, Any], Dict[str, Any]],
+                 block_arguments: Iterable[Any],
+                 max_workers: Optional[int] = 1,
+                 callback: Optional[Callable[[], None]] = None) \
+            -> Dict[str, np.ndarray]:
+        """
+        Calls build_block(block_index, argument) for each block argument and
+        writes the arrays it returns into the slices of that block.
+        With max_workers other than 1 the blocks are built by a thread pool,
+        each worker writing its own slices in place. The optional callback is
+        called once every block is written, e.g. to advance a progress bar.
+        """
+        def write_block(indexed_argument: Tuple[int, Any]):
+            block_index, argument = indexed_argument
+            self.set_block(block_index, build_block(block_index, argument))
+
+        indexed_arguments = list(enumerate(block_arguments))
+        if len(indexed_arguments) != self.number_of_blocks:
+            raise ValueError(f'Expected {self.number_of_blocks} blocks, got '
+                             f'{len(indexed_arguments)}.')
+        if max_workers == 1:
+            for indexed_argument in indexed_arguments:
+                write_block(indexed_argument)
+                if callback:
+                    callback()
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for _ in executor.map(write_block, indexed_arguments):
+                    if callback:
+                        callback()
+        return self.arrays
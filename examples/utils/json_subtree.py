@@ -0,0 +1,90 @@
+"""
+Clone a subtree of a JSON structure many times with some of its strings and
+values rewritten, e.g. to repeat a component of a NeXus baseline N times.
+
+The subtree is copied and searched for its rewrite sites once: the strings
+that contain one of the given substrings (such as the component path in its
+depends_on values) and the value entries equal to one of the given values.
+Each clone then copies the tree and rewrites only those sites, without
+serialising and re-parsing the subtree.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+JSONPath = Tuple[Union[str, int], ...]
+
+
+def _copy_tree(node):
+    if isinstance(node, dict):
+        return {key: _copy_tree(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_copy_tree(value) for value in node]
+    return node
+
+
+def _leaves(node, path: JSONPath = ()) -> Iterator[Tuple[JSONPath, Any]]:
+    if isinstance(node, dict):
+        children = node.items()
+    elif isinstance(node, list):
+        children = enumerate(node)
+    else:
+        yield path, node
+        return
+    for key, child in children:
+        yield from _leaves(child, path + (key,))
+
+
+def _set_leaf(tree, path: JSONPath, value):
+    for key in path[:-1]:
+        tree = tree[key]
+    tree[path[-1]] = value
+
+
+class SubtreeTemplate:
+    def __init__(self, subtree: Dict[str, Any],
+                 substrings: Optional[Dict[str, str]] = None,
+                 values: Optional[Dict[str, Any]] = None,
+                 value_key: str = "values"):
+        """
+        substrings maps a parameter name to a substring to rewrite in every
+        string of the subtree; several substrings in one string are replaced
+        in the order given. values maps a parameter name to a value to
+        rewrite wherever it is the value of a value_key entry.
+        """
+        substrings = substrings or {}
+        values = values or {}
+        self._parameters = set(substrings) | set(values)
+        self._subtree = _copy_tree(subtree)
+        self._string_sites: List[Tuple[JSONPath, str, List[Tuple[str, str]]]] = []
+        self._value_sites: List[Tuple[JSONPath, str]] = []
+        for path, leaf in _leaves(self._subtree):
+            if isinstance(leaf, str):
+                rewrites = [(substring, parameter)
+                            for parameter, substring in substrings.items()
+                            if substring in leaf]
+                if rewrites:
+                    self._string_sites.append((path, leaf, rewrites))
+            elif path and path[-1] == value_key:
+                for parameter, value in values.items():
+                    if type(leaf) is type(value) and leaf == value:
+                        self._value_sites.append((path, parameter))
+                        break
+
+    def clone(self, **parameters) -> Dict[str, Any]:
+        """
+        Return a copy of the subtree with the sites of the given parameters
+        rewritten to their new substring or value. Sites of parameters left
+        out keep their original content.
+        """
+        unknown = set(parameters) - self._parameters
+        if unknown:
+            raise ValueError(f"Unknown subtree parameters: {sorted(unknown)}")
+        clone = _copy_tree(self._subtree)
+        for path, string, rewrites in self._string_sites:
+            for substring, parameter in rewrites:
+                if parameter in parameters:
+                    string = string.replace(substring, parameters[parameter])
+            _set_leaf(clone, path, string)
+        for path, parameter in self._value_sites:
+            if parameter in parameters:
+                _set_leaf(clone, path, parameters[parameter])
+        return clone
@@ -0,0 +1,108 @@
+"""
+Closed form mesh topology for detectors made of many identical cells.
+
+Generates the winding order, the faces dataset and the face to detector
+number map of an NXoff_geometry for N cells at once, by broadcasting a
+per-cell template over np.arange. Cell templates list the vertex indices of
+each face of one cell, counted from the first vertex of that cell.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Hexahedral voxel with vertices ordered as in G4Trap (DREAM)
+HEXAHEDRON_FACES = np.array([[0, 2, 3, 1],
+                             [0, 4, 6, 2],
+                             [0, 1, 5, 4],
+                             [1, 3, 7, 5],
+                             [2, 6, 7, 3],
+                             [4, 5, 7, 6]])
+
+# Regular octahedron with vertices ordered top, the four around the middle,
+# bottom. Stacked octahedra share the bottom and top vertex, so consecutive
+# cells are 5 vertices apart.
+OCTAHEDRON_FACES = np.array([[1, 0, 4],
+                             [4, 0, 3],
+                             [3, 0, 2],
+                             [2, 0, 1],
+                             [1, 5, 2],
+                             [2, 5, 3],
+                             [3, 5, 4],
+                             [4, 5, 1]])
+OCTAHEDRON_VERTEX_STRIDE = 5
+
+QUAD_FACES = np.array([[0, 1, 2, 3]])
+
+
+def cell_winding_order(number_of_cells: int, cell_faces: np.ndarray,
+                       vertex_stride: Optional[int] = None,
+                       vertex_start_index: int = 0,
+                       dtype=np.int32) -> np.ndarray:
+    """
+    Vertex indices of every face of number_of_cells cells, with shape
+    (number_of_cells * faces_per_cell, vertices_per_face). Cell n uses the
+    vertices from vertex_start_index + n * vertex_stride on, the stride
+    defaults to the number of vertices in the cell template.
+    """
+    cell_faces = np.asarray(cell_faces)
+    if vertex_stride is None:
+        vertex_stride = int(cell_faces.max()) + 1
+    first_vertices = np.arange(number_of_cells) * vertex_stride + \
+        vertex_start_index
+    winding_order = first_vertices[:, np.newaxis, np.newaxis] + cell_faces
+    return winding_order.reshape((-1, cell_faces.shape[1])).astype(dtype)
+
+
+def grid_quad_winding_order(number_of_rows: int, number_of_columns: int,
+                            vertex_start_index: int = 0,
+                            dtype=np.int32) -> np.ndarray:
+    """
+    Winding order of a grid of quads sharing the vertices of a
+    (number_of_rows + 1, number_of_columns + 1) grid of vertices, with the
+    quad in row r and column c at index c + r * number_of_columns.
+    """
+    vertices_per_row = number_of_columns + 1
+    rows = np.arange(number_of_rows)[:, np.newaxis] * vertices_per_row
+    columns = np.arange(number_of_columns)[np.newaxis, :]
+    first_vertices = (rows + columns).reshape(-1) + vertex_start_index
+    corners = np.array([0, vertices_per_row, vertices_per_row + 1, 1])
+    return (first_vertices[:, np.newaxis] + corners).astype(dtype)
+
+
+def face_starts(winding_order: np.ndarray, dtype=np.int32) -> np.ndarray:
+    """
+    The NXoff_geometry faces dataset, the index in the flattened winding
+    order where each face starts.
+    """
+    return np.arange(0, winding_order.size, winding_order.shape[1],
+                     dtype=dtype)
+
+
+def off_faces(winding_order: np.ndarray) -> np.ndarray:
+    """
+    Winding order in the OFF format, with each face prepended by the number
+    of vertices in it.
+    """
+    number_of_faces, vertices_per_face = winding_order.shape
+    off = np.empty((number_of_faces, vertices_per_face + 1),
+                   dtype=winding_order.dtype)
+    off[:, 0] = vertices_per_face
+    off[:, 1:] = winding_order
+    return off
+
+
+def detector_faces(number_of_cells: int, faces_per_cell: int,
+                   first_face_index: int = 0,
+                   detector_numbers: Optional[np.ndarray] = None) \
+        -> np.ndarray:
+    """
+    The NXoff_geometry detector_faces dataset, mapping each face index to
+    the detector number of its cell. Detector numbers default to the cell
+    index.
+    """
+    if detector_numbers is None:
+        detector_numbers = np.arange(number_of_cells)
+    face_indices = np.arange(number_of_cells * faces_per_cell) + \
+        first_face_index
+    return np.column_stack(
+        (face_indices, np.repeat(detector_numbers, faces_per_cell)))
@@ -0,0 +1,67 @@
+"""
+Write mesh geometry to a file in the OFF format
+https://en.wikipedia.org/wiki/OFF_(file_format)
+
+Vertices and faces are streamed in chunks of rows, each chunk formatted by a
+single string operation. Values are written in the shortest form that reads
+back to the same number, as with pandas to_csv.
+
+The binary variant follows the Geomview OFF BINARY layout: big-endian 32 bit
+counts, vertex coordinates as 32 bit floats and each face as its number of
+vertices, the vertex indices and a zero colour count.
+"""
+from typing import Optional
+
+import numpy as np
+
+OFF_CHUNK_ROWS = 2**16
+
+
+def _format_rows(rows: np.ndarray) -> str:
+    conversion = "%d" if rows.dtype.kind in "iub" else "%r"
+    line = " ".join([conversion] * rows.shape[1]) + "\n"
+    return (line * rows.shape[0]) % tuple(rows.ravel().tolist())
+
+
+def _write_ascii_off_file(filename: str, vertices: np.ndarray,
+                          faces: np.ndarray, comment: Optional[str],
+                          chunk_rows: int):
+    with open(filename, "w") as f:
+        f.write("OFF\n")
+        if comment is not None:
+            f.write(f"# {comment}\n")
+        f.write(f"{vertices.shape[0]} {faces.shape[0]} 0\n")
+        for rows in (vertices, faces):
+            for start in range(0, rows.shape[0], chunk_rows):
+                f.write(_format_rows(rows[start:start + chunk_rows]))
+
+
+def _write_binary_off_file(filename: str, vertices: np.ndarray,
+                           faces: np.ndarray, chunk_rows: int):
+    with open(filename, "wb") as f:
+        f.write(b"OFF BINARY\n")
+        np.array([vertices.shape[0], faces.shape[0], 0], dtype=">i4").tofile(f)
+        for start in range(0, vertices.shape[0], chunk_rows):
+            vertices[start:start + chunk_rows].astype(">f4").tofile(f)
+        for start in range(0, faces.shape[0], chunk_rows):
+            chunk = faces[start:start + chunk_rows]
+            binary_faces = np.zeros((chunk.shape[0], chunk.shape[1] + 1),
+                                    dtype=">i4")
+            binary_faces[:, :-1] = chunk
+            binary_faces.tofile(f)
+
+
+def write_off_file(filename: str, vertices: np.ndarray, faces: np.ndarray,
+                   comment: Optional[str] = None, binary: bool = False,
+                   chunk_rows: int = OFF_CHUNK_ROWS):
+    """
+    Writes (N, 3) vertices and faces given in the OFF layout, the number of
+    vertices in the face followed by its vertex indices (see
+    mesh_topology.off_faces). The comment is only written to ASCII files.
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    if binary:
+        _write_binary_off_file(filename, vertices, faces, chunk_rows)
+    else:
+        _write_ascii_off_file(filename, vertices, faces, comment, chunk_rows)
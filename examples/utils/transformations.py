@@ -0,0 +1,85 @@
+"""
+Batched rotations and translations of vectors shared by the instrument
+geometry generators.
+
+Vectors are given as (N, 3) arrays, or as a single (3,) vector. Transforms are
+4x4 affine matrices which can be chained with compose_transforms and applied
+to all vectors at once with apply_transform.
+"""
+from typing import Union
+
+import numpy as np
+
+AXES = ('x', 'y', 'z')
+
+
+def rotation_matrix(axis: str, angle: Union[float, np.ndarray],
+                    degrees: bool = True) -> np.ndarray:
+    """
+    Right-handed rotation matrix around the x, y or z axis.
+    For an array of angles a stack of matrices with shape angle.shape + (3, 3)
+    is returned.
+    """
+    angle = np.deg2rad(angle) if degrees else np.asarray(angle, dtype=float)
+    cos, sin = np.cos(angle), np.sin(angle)
+    one, zero = np.ones_like(cos), np.zeros_like(cos)
+    if axis == 'x':
+        rows = [[one, zero, zero], [zero, cos, -sin], [zero, sin, cos]]
+    elif axis == 'y':
+        rows = [[cos, zero, sin], [zero, one, zero], [-sin, zero, cos]]
+    elif axis == 'z':
+        rows = [[cos, -sin, zero], [sin, cos, zero], [zero, zero, one]]
+    else:
+        raise ValueError(f'Unknown rotation axis {axis}, expected one of '
+                         f'{AXES}')
+    return np.moveaxis(np.array(rows), (0, 1), (-2, -1))
+
+
+def rotate(vectors: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Rotates (N, 3) vectors by a (3, 3) matrix. A (K, 3, 3) stack of matrices
+    returns the vectors rotated by each of them, with shape (K, N, 3).
+    """
+    return np.asarray(vectors, dtype=float) @ np.swapaxes(matrix, -1, -2)
+
+
+def rotation_transform(axis: str, angle: Union[float, np.ndarray],
+                       degrees: bool = True) -> np.ndarray:
+    """
+    Affine rotation around the x, y or z axis, a stack of them with shape
+    angle.shape + (4, 4) for an array of angles.
+    """
+    matrix = rotation_matrix(axis, angle, degrees)
+    transform = np.zeros(matrix.shape[:-2] + (4, 4))
+    transform[..., :3, :3] = matrix
+    transform[..., 3, 3] = 1.0
+    return transform
+
+
+def translation_transform(translation) -> np.ndarray:
+    transform = np.identity(4)
+    transform[:3, 3] = translation
+    return transform
+
+
+def compose_transforms(*transforms: np.ndarray) -> np.ndarray:
+    """
+    Chains affine transforms into one, the first transform given is the
+    first one applied to the vectors. Stacks of transforms are composed
+    element-wise, broadcasting against single transforms.
+    """
+    composed = np.identity(4)
+    for transform in transforms:
+        composed = transform @ composed
+    return composed
+
+
+def apply_transform(transform: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    Applies a (4, 4) affine transform, or a (K, 4, 4) stack of them, to
+    (N, 3) vectors.
+    """
+    rotated = rotate(vectors, transform[..., :3, :3])
+    if rotated.ndim > transform.ndim - 1:
+        return rotated + transform[..., np.newaxis, :3, 3]
+    return rotated + transform[..., :3, 3]
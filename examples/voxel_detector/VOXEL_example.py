@@ -1,7 +1,9 @@
 from nexusutils.nexusbuilder import NexusBuilder
 import numpy as np
 import datetime
-import pandas as pd
+
+from examples.utils import mesh_topology
+from examples.utils.off_file import write_off_file
 
 """
 Small example with detector described by an NXoff_geometry group where
@@ -15,9 +17,7 @@ def add_voxel_detector(nexus_builder: NexusBuilder, n_voxels: int = 3):
     detector_group = nexus_builder.add_detector_minimal("voxel geometry detector", 1)
 
     vertices = np.array([[0.0, 0.0, 0.0]])
-    off_faces = np.empty((0, 4), dtype=int)
     detector_numbers = np.arange(n_voxels)
-    detector_faces = np.empty((0, 2), dtype=int)
     for voxel_number in range(n_voxels):
         # Each voxel is a regular octahedron
         new_vertices = np.array(
@@ -32,37 +32,20 @@ def add_voxel_detector(nexus_builder: NexusBuilder, n_voxels: int = 3):
         )
         vertices = np.append(vertices[:-1, :], new_vertices, axis=0)
 
-        # Number of vertices followed by vertex indices for each face
-        # the first column doesn't end up in the NeXus file dataset
-        new_off_faces = np.array(
-            [
-                [3, 1 + 5 * voxel_number, 5 * voxel_number, 4 + 5 * voxel_number],
-                [3, 4 + 5 * voxel_number, 5 * voxel_number, 3 + 5 * voxel_number],
-                [3, 3 + 5 * voxel_number, 5 * voxel_number, 2 + 5 * voxel_number],
-                [3, 2 + 5 * voxel_number, 5 * voxel_number, 1 + 5 * voxel_number],
-                [3, 1 + 5 * voxel_number, 5 + 5 * voxel_number, 2 + 5 * voxel_number],
-                [3, 2 + 5 * voxel_number, 5 + 5 * voxel_number, 3 + 5 * voxel_number],
-                [3, 3 + 5 * voxel_number, 5 + 5 * voxel_number, 4 + 5 * voxel_number],
-                [3, 4 + 5 * voxel_number, 5 + 5 * voxel_number, 1 + 5 * voxel_number],
-            ]
-        )
-        off_faces = np.append(off_faces, new_off_faces, axis=0)
-
-        detector_number = detector_numbers[voxel_number]
-        # Map 8 faces to each detector number
-        new_detector_faces = np.array(
-            [
-                [detector_number * 8, detector_number],
-                [1 + detector_number * 8, detector_number],
-                [2 + detector_number * 8, detector_number],
-                [3 + detector_number * 8, detector_number],
-                [4 + detector_number * 8, detector_number],
-                [5 + detector_number * 8, detector_number],
-                [6 + detector_number * 8, detector_number],
-                [7 + detector_number * 8, detector_number],
-            ]
+    # Number of vertices followed by vertex indices for each face
+    # the first column doesn't end up in the NeXus file dataset
+    off_faces = mesh_topology.off_faces(
+        mesh_topology.cell_winding_order(
+            n_voxels,
+            mesh_topology.OCTAHEDRON_FACES,
+            mesh_topology.OCTAHEDRON_VERTEX_STRIDE,
+            dtype=int,
         )
-        detector_faces = np.append(detector_faces, new_detector_faces, axis=0)
+    )
+    # Map 8 faces to each detector number
+    detector_faces = mesh_topology.detector_faces(
+        n_voxels, len(mesh_topology.OCTAHEDRON_FACES), detector_numbers=detector_numbers
+    )
 
     nexus_builder.add_shape(
         detector_group, "detector_shape", vertices, off_faces, detector_faces
@@ -90,36 +73,11 @@ def add_voxel_detector(nexus_builder: NexusBuilder, n_voxels: int = 3):
     nexus_builder.add_dataset(detector_group, "y_pixel_offset", y_offsets)
     nexus_builder.add_dataset(detector_group, "z_pixel_offset", z_offsets)
 
-    write_to_off_file(
-        f"{n_voxels}_voxels.off", vertices.shape[0], off_faces.shape[0], vertices, off_faces
+    write_off_file(
+        f"{n_voxels}_voxels.off", vertices, off_faces, comment="Example VOXEL detector"
     )
 
 
-def write_to_off_file(
-    filename: str,
-    number_of_vertices: int,
-    number_of_faces: int,
-    vertices: np.ndarray,
-    voxels: np.ndarray,
-):
-    """
-    Write mesh geometry to a file in the OFF format
-    https://en.wikipedia.org/wiki/OFF_(file_format)
-    """
-    with open(filename, "w") as f:
-        f.writelines(
-            (
-                "OFF\n",
-                "# Example VOXEL detector\n",
-                f"{number_of_vertices} {number_of_faces} 0\n",
-            )
-        )
-    with open(filename, "a") as f:
-        pd.DataFrame(vertices).to_csv(f, sep=" ", header=None, index=False)
-    with open(filename, "a") as f:
-        pd.DataFrame(voxels).to_csv(f, sep=" ", header=None, index=False)
-
-
 if __name__ == "__main__":
     for n_vox in [2]:
         output_filename = f"VOXEL_example_{n_vox}.nxs"